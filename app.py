@@ -1,16 +1,26 @@
 import streamlit as st
-from drive_store import load_db, save_db, list_trip_names
+import drive_metrics
+import storage
+from storage import load_db_or_stop, save_db, list_trip_names, save_status, save_status_label
 
 st.set_page_config(page_title="가족 여행 플래너", page_icon="🧳", layout="centered")
+drive_metrics.start_rerun()
 
-ROOT_FOLDER_ID = st.secrets["drive"]["root_folder_id"]
+ROOT_FOLDER_ID = storage.root_id()
 
 st.title("🧳 가족 여행 플래너")
 st.caption("Streamlit Cloud + Google Drive 저장(OAuth) · v3_15")
 
-db = load_db(ROOT_FOLDER_ID)
+db = load_db_or_stop(ROOT_FOLDER_ID)
+storage.show_save_conflicts()
 names = list_trip_names(db)
 
+_save_st = save_status(ROOT_FOLDER_ID)
+if _save_st["enabled"]:
+    st.caption(save_status_label(_save_st))
+drive_metrics.render_debug_panel(storage.debug_stats())
+storage.watch_changes()
+
 col1, col2 = st.columns([2, 1])
 with col1:
     st.subheader("여행 목록")
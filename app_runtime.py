@@ -0,0 +1,57 @@
+"""
+여러 모듈이 함께 쓰는 실행 환경 도우미: 캐시 폴더, secrets.toml 숫자 설정, 프로세스 공용 객체.
+
+- CACHE_DIR: 프로세스/세션이 함께 쓰는 디스크 캐시 폴더(TRIP_PLANNER_CACHE_DIR로 바꿀 수 있음).
+- secret_section / secret_num: st.secrets의 한 섹션을 dict로(없거나 읽을 수 없으면 빈 dict), 숫자 값은 잘못되면 기본값.
+- process_singleton: st.cache_resource 싱글턴. Streamlit 밖(유지보수 스크립트/테스트)에서 캐시를 못 쓰면
+  모듈에 하나만 만들어 둡니다.
+"""
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, TypeVar
+
+import streamlit as st
+
+CACHE_DIR = os.environ.get("TRIP_PLANNER_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "family-trip-planner")
+
+T = TypeVar("T")
+
+
+def secret_section(name: str) -> Dict[str, Any]:
+    try:
+        return dict(st.secrets.get(name, {}))
+    except Exception:
+        return {}
+
+
+def secret_num(cfg: Dict[str, Any], key: str, default: float) -> float:
+    try:
+        return float(cfg.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def process_singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """factory()로 만든 프로세스 공용 객체를 돌려주는 함수. .clear()로 다시 만들게 할 수 있어요."""
+    cached = st.cache_resource(show_spinner=False)(factory)
+    fallback: Dict[str, T] = {}
+    lock = threading.Lock()
+
+    def get() -> T:
+        try:
+            return cached()
+        except Exception:
+            with lock:
+                if "default" not in fallback:
+                    fallback["default"] = factory()
+                return fallback["default"]
+
+    def clear() -> None:
+        cached.clear()
+        with lock:
+            fallback.clear()
+
+    get.clear = clear  # type: ignore[attr-defined]
+    get.__doc__ = factory.__doc__
+    return get
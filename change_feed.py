@@ -0,0 +1,170 @@
+"""
+Drive 변경 피드(changes API) 감시.
+
+백그라운드 스레드 하나가 주기적으로 changes.list(pageToken)를 호출하고(프로세스당 1개),
+바뀐 파일 목록을 콜백으로 넘깁니다. pageToken은 디스크에 저장해서 재시작 후에도 이어서 받습니다.
+
+FakeChangeFeed는 같은 인터페이스의 메모리 구현이에요(Drive 없이 테스트/로컬 백엔드용).
+변경 항목 형식: {"file_id", "removed": bool, "parents": [...], "name"}
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Change = Dict[str, Any]
+
+
+class ChangeFeed:
+    def start_token(self) -> str:
+        raise NotImplementedError
+
+    def poll(self, token: str) -> Tuple[List[Change], str]:
+        """token 이후의 변경들과 다음 token."""
+        raise NotImplementedError
+
+
+class DriveChangeFeed(ChangeFeed):
+    """Drive changes API. execute: drive_store._execute (재시도/속도 제한/계측 포함)."""
+
+    FIELDS = "nextPageToken,newStartPageToken,changes(fileId,removed,file(name,parents,trashed))"
+
+    def __init__(self, service_fn: Callable[[], Any], execute: Callable[[Any], Dict[str, Any]]):
+        self._service_fn = service_fn
+        self._execute = execute
+
+    def start_token(self) -> str:
+        return self._execute(self._service_fn().changes().getStartPageToken())["startPageToken"]
+
+    def poll(self, token: str) -> Tuple[List[Change], str]:
+        service = self._service_fn()
+        changes: List[Change] = []
+        while True:
+            res = self._execute(service.changes().list(
+                pageToken=token, fields=self.FIELDS, pageSize=1000, spaces="drive",
+            ))
+            for c in res.get("changes", []):
+                f = c.get("file") or {}
+                changes.append({
+                    "file_id": c.get("fileId"),
+                    "removed": bool(c.get("removed") or f.get("trashed")),
+                    "parents": f.get("parents") or [],
+                    "name": f.get("name") or "",
+                })
+            if res.get("newStartPageToken"):
+                return changes, res["newStartPageToken"]
+            token = res["nextPageToken"]
+
+
+class FakeChangeFeed(ChangeFeed):
+    """메모리 변경 피드. push()로 변경을 넣으면 다음 poll에서 나옵니다. token = 지금까지의 변경 수."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._log: List[Change] = []
+
+    def push(self, file_id: str, parents: Optional[List[str]] = None, removed: bool = False, name: str = "") -> None:
+        with self._lock:
+            self._log.append({"file_id": file_id, "removed": removed, "parents": list(parents or []), "name": name})
+
+    def start_token(self) -> str:
+        with self._lock:
+            return str(len(self._log))
+
+    def poll(self, token: str) -> Tuple[List[Change], str]:
+        with self._lock:
+            start = min(int(token or 0), len(self._log))
+            return list(self._log[start:]), str(len(self._log))
+
+
+class ChangeWatcher:
+    """
+    변경 피드를 interval_s마다 확인해서 on_changes(changes)를 부릅니다.
+
+    healthy(): 최근 poll이 성공했는지. 감시가 멈췄거나 실패 중이면 호출 쪽은 캐시를 믿지 말고
+    평소처럼 재검증해야 합니다. generation은 관련 변경이 있을 때마다 1씩 늘어요(세션 새로고침 신호).
+    """
+
+    def __init__(self, feed: ChangeFeed, on_changes: Callable[[List[Change]], bool], interval_s: float = 10.0,
+                 token_path: Optional[str] = None):
+        self.feed = feed
+        self.on_changes = on_changes
+        self.interval_s = max(0.1, float(interval_s))
+        self.token_path = token_path
+        self.generation = 0
+        self.stats = {"polls": 0, "changes": 0, "relevant": 0, "errors": 0}
+        self.last_error: Optional[str] = None
+        self._token: Optional[str] = None
+        self._last_ok = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_token(self) -> Optional[str]:
+        if not self.token_path:
+            return None
+        try:
+            with open(self.token_path, "r", encoding="utf-8") as f:
+                return (json.load(f) or {}).get("token")
+        except (OSError, ValueError):
+            return None
+
+    def _save_token(self, token: str) -> None:
+        if not self.token_path:
+            return
+        tmp = f"{self.token_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"token": token, "saved": time.time()}, f)
+            os.replace(tmp, self.token_path)
+        except OSError:
+            pass
+
+    def poll_once(self) -> int:
+        """한 번 확인하고 받은 변경 수를 돌려줍니다(실패하면 예외)."""
+        with self._lock:
+            if self._token is None:
+                # 저장된 token이 있으면 재시작 사이의 변경도 받아서 반영
+                self._token = self._load_token() or self.feed.start_token()
+                self._save_token(self._token)
+            token = self._token
+        changes, new_token = self.feed.poll(token)
+        relevant = bool(changes) and self.on_changes(changes)
+        with self._lock:
+            self._token = new_token
+            self._last_ok = time.monotonic()
+            self.stats["polls"] += 1
+            self.stats["changes"] += len(changes)
+            if relevant:
+                self.stats["relevant"] += 1
+                self.generation += 1
+        if new_token != token:
+            self._save_token(new_token)
+        return len(changes)
+
+    def healthy(self) -> bool:
+        running = self._thread is not None and self._thread.is_alive()
+        return running and (time.monotonic() - self._last_ok) <= self.interval_s * 3
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                self.last_error = None
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.last_error = str(e)
+            self._stop.wait(self.interval_s)
+
+    def start(self) -> "ChangeWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="drive-change-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {**self.stats, "generation": self.generation, "healthy": self.healthy(), "last_error": self.last_error}
@@ -0,0 +1,221 @@
+"""
+DB 변경 연산(op) 계산/적용.
+
+저장할 때 DB 전체를 다시 쓰는 대신, 세션이 불러온 상태(base)와 지금 상태의 차이를
+일정(item) 단위 op 목록으로 만들어 저널에 덧붙입니다.
+
+op 종류:
+  - {"op": "trip_add", "trip": {...}}                      (일정 포함 전체)
+  - {"op": "trip_update", "trip_id", "set": {...}, "unset": [...]}  (items 제외 필드)
+  - {"op": "trip_delete", "trip_id"}
+  - {"op": "item_add", "trip_id", "item": {...}}
+  - {"op": "item_update", "trip_id", "item_id", "set": {...}, "unset": [...]}
+  - {"op": "item_delete", "trip_id", "item_id"}
+"""
+import copy
+import hashlib
+import json
+import uuid
+from typing import Any, Dict, List
+
+
+def _stable_id(*parts: Any) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_ids(db: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    id 없는 여행/일정에 id를 붙입니다. 일정 id는 내용 기반이라 다시 불러와도 같은 값이에요
+    (op는 id로 대상을 찾기 때문에, 재실행마다 바뀌는 임시 id는 쓰면 안 됨).
+    """
+    for t in db.get("trips", []) or []:
+        if not t.get("id"):
+            t["id"] = uuid.uuid4().hex[:12]
+        for idx, it in enumerate(t.get("items", []) or []):
+            if not it.get("id"):
+                it["id"] = "legacy_" + _stable_id(t["id"], idx, it.get("date"), it.get("time"), it.get("title"), it.get("ts"))
+    return db
+
+
+class TripDB(dict):
+    """
+    load_db 결과. 평범한 dict처럼 쓰면 되고, 불러온 시점의 상태(base)를 따로 들고 있어서
+    save_db가 바뀐 부분만 op로 기록할 수 있어요.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        self.base: Dict[str, Any] = copy.deepcopy(dict(data))
+        self.head = ""  # 불러온 시점의 저장소 리비전(낙관적 동시성 검사용)
+        # 내용 식별자(trip_index 캐시 키). 저장소의 한 리비전을 그대로 불러왔으면 저장소가
+        # 세션 간 공유되는 값으로 바꿔 주고, 저장/병합으로 내용이 바뀌면 새 값이 됩니다.
+        self.rev = _session_rev()
+
+    def rebase(self) -> None:
+        self.base = copy.deepcopy(dict(self))
+        self.rev = _session_rev()
+
+
+SESSION_REV_PREFIX = "session-"
+
+
+def _session_rev() -> str:
+    return f"{SESSION_REV_PREFIX}{uuid.uuid4().hex}"
+
+
+_MISSING = object()
+
+
+def _field_diff(old: Dict[str, Any], new: Dict[str, Any], skip=()) -> tuple:
+    set_ = {k: copy.deepcopy(v) for k, v in new.items() if k not in skip and old.get(k, _MISSING) != v}
+    unset = [k for k in old if k not in skip and k not in new]
+    return set_, unset
+
+
+def diff_db(base: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """base -> new 로 가는 op 목록. (new에 id 없는 여행/일정이 있으면 id를 붙입니다)"""
+    ensure_ids(new)
+    ops: List[Dict[str, Any]] = []
+    base_trips = {t["id"]: t for t in base.get("trips", []) or [] if t.get("id")}
+    new_trips = {t["id"]: t for t in new.get("trips", []) or []}
+
+    for tid, t in new_trips.items():
+        old = base_trips.get(tid)
+        if old is None:
+            ops.append({"op": "trip_add", "trip": copy.deepcopy(t)})
+            continue
+        set_, unset = _field_diff(old, t, skip=("items",))
+        if set_ or unset:
+            ops.append({"op": "trip_update", "trip_id": tid, "set": set_, "unset": unset})
+
+        old_items = {it["id"]: it for it in old.get("items", []) or [] if it.get("id")}
+        new_items = {it["id"]: it for it in t.get("items", []) or []}
+        for iid, it in new_items.items():
+            before = old_items.get(iid)
+            if before is None:
+                ops.append({"op": "item_add", "trip_id": tid, "item": copy.deepcopy(it)})
+                continue
+            set_, unset = _field_diff(before, it)
+            if set_ or unset:
+                ops.append({"op": "item_update", "trip_id": tid, "item_id": iid, "set": set_, "unset": unset})
+        for iid in old_items:
+            if iid not in new_items:
+                ops.append({"op": "item_delete", "trip_id": tid, "item_id": iid})
+
+    for tid in base_trips:
+        if tid not in new_trips:
+            ops.append({"op": "trip_delete", "trip_id": tid})
+    return ops
+
+
+def _find_trip(db: Dict[str, Any], trip_id: str):
+    for t in db.get("trips", []) or []:
+        if t.get("id") == trip_id:
+            return t
+    return None
+
+
+def apply_ops(db: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """op 목록을 db에 그대로 적용합니다(제자리 변경). 대상이 이미 없으면 건너뜁니다."""
+    db.setdefault("trips", [])
+    for op in ops:
+        kind = op.get("op")
+        if kind == "trip_add":
+            trip = copy.deepcopy(op["trip"])
+            existing = _find_trip(db, trip.get("id"))
+            if existing is not None:
+                existing.clear()
+                existing.update(trip)
+            else:
+                db["trips"].append(trip)
+            continue
+        if kind == "trip_delete":
+            db["trips"] = [t for t in db["trips"] if t.get("id") != op["trip_id"]]
+            continue
+
+        trip = _find_trip(db, op.get("trip_id"))
+        if trip is None:
+            continue
+        if kind == "trip_update":
+            trip.update(copy.deepcopy(op.get("set") or {}))
+            for k in op.get("unset") or []:
+                trip.pop(k, None)
+        elif kind == "item_add":
+            item = copy.deepcopy(op["item"])
+            items = trip.setdefault("items", [])
+            for i, it in enumerate(items):
+                if it.get("id") == item.get("id"):
+                    items[i] = item
+                    break
+            else:
+                items.append(item)
+        elif kind == "item_update":
+            for it in trip.get("items", []) or []:
+                if it.get("id") == op["item_id"]:
+                    it.update(copy.deepcopy(op.get("set") or {}))
+                    for k in op.get("unset") or []:
+                        it.pop(k, None)
+                    break
+        elif kind == "item_delete":
+            trip["items"] = [it for it in trip.get("items", []) or [] if it.get("id") != op["item_id"]]
+    return db
+
+
+def merge_onto(base: Dict[str, Any], current: Dict[str, Any], ops: List[Dict[str, Any]],
+               concurrent: bool = True) -> tuple:
+    """
+    내 op(base 기준)를 저장소의 최신 상태(current)에 얹습니다(3-way merge).
+
+    Returns: (merged, theirs, conflicts) — theirs는 base 이후 다른 세션이 바꾼 op들.
+    concurrent=False(그 사이 아무도 저장 안 함)면 비교를 건너뜁니다.
+    """
+    theirs = diff_db(base, copy.deepcopy(current)) if concurrent else []
+    conflicts = find_conflicts(theirs, ops) if theirs else []
+    return apply_ops(copy.deepcopy(current), ops), theirs, conflicts
+
+
+def _op_target(op: Dict[str, Any]) -> tuple:
+    trip_id = op.get("trip_id") or (op.get("trip") or {}).get("id")
+    item_id = op.get("item_id") or (op.get("item") or {}).get("id")
+    return trip_id, item_id
+
+
+def find_conflicts(theirs: List[Dict[str, Any]], ours: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    같은 base에서 출발한 두 op 목록 중 서로 겹치는 변경을 찾습니다(3-way merge 보고용).
+
+    - 같은 일정/여행의 같은 필드를 서로 다른 값으로 바꿈 -> 나중에 기록된 쪽(ours)이 이깁니다
+    - 한쪽은 삭제, 다른 쪽은 수정 -> 삭제가 이깁니다(수정은 적용되지 않음)
+    서로 다른 일정, 같은 일정의 다른 필드 변경은 충돌이 아니며 둘 다 반영됩니다.
+    """
+    by_target: Dict[tuple, List[Dict[str, Any]]] = {}
+    deleted_trips = set()
+    for op in theirs:
+        by_target.setdefault(_op_target(op), []).append(op)
+        if op.get("op") == "trip_delete":
+            deleted_trips.add(op["trip_id"])
+    our_deleted_trips = {op["trip_id"] for op in ours if op.get("op") == "trip_delete"}
+
+    conflicts = []
+    for op in ours:
+        trip_id, item_id = _op_target(op)
+        if op.get("op") != "trip_delete" and trip_id in deleted_trips:
+            conflicts.append({"trip_id": trip_id, "item_id": item_id, "kind": "trip_deleted"})
+            continue
+        for other in by_target.get((trip_id, item_id), []):
+            kinds = {op.get("op"), other.get("op")}
+            if kinds & {"item_delete", "trip_delete"} and len(kinds) > 1:
+                conflicts.append({"trip_id": trip_id, "item_id": item_id, "kind": "delete_vs_update"})
+            elif op.get("op") == other.get("op") and op.get("op") in ("item_update", "trip_update"):
+                fields = sorted(
+                    k for k in set(op.get("set") or {}) & set(other.get("set") or {})
+                    if op["set"][k] != other["set"][k]
+                )
+                if fields:
+                    conflicts.append({"trip_id": trip_id, "item_id": item_id, "kind": "same_field", "fields": fields})
+    for op in theirs:
+        trip_id, item_id = _op_target(op)
+        if op.get("op") != "trip_delete" and trip_id in our_deleted_trips:
+            conflicts.append({"trip_id": trip_id, "item_id": item_id, "kind": "trip_deleted"})
+    return conflicts
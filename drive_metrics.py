@@ -0,0 +1,313 @@
+"""
+Drive 호출 계측: 작업(op)별 횟수/지연/바이트를 재실행(세션별)과 프로세스 전체로 집계합니다.
+
+DriveClient의 HTTP 전송을 MeteredHttp로 감싸서 list/get/get_media/create/update/delete/batch 등
+모든 요청이 자동으로 기록되고, 토큰 갱신은 DriveClient.ensure_fresh에서 기록합니다.
+속도 제한/재시도 대기(throttle_wait, retry_wait)는 요청이 아니므로 요청 집계와 따로 record_wait로 셉니다.
+
+디버그 패널은 secrets.toml [debug] drive_metrics = true 이거나 URL에 ?debug=1 일 때 사이드바에 보입니다.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 지연 시간 히스토그램 구간(초). Prometheus 내보내기용
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+MAX_EVENTS = 5000  # JSONL 내보내기용 최근 호출 기록
+MAX_SESSIONS = 200
+
+
+def classify(uri: str, method: str) -> str:
+    """요청 URI/메서드 -> op 이름(list, get, get_media, create, update, delete, batch, ...)."""
+    u = urlparse(uri)
+    path = u.path
+    method = (method or "GET").upper()
+    if path.endswith("/batch") or "/batch/" in path:
+        return "batch"
+    if "/files" not in path:
+        return f"{method.lower()}:{path.rsplit('/', 1)[-1] or 'other'}"
+    has_id = not path.rstrip("/").endswith("/files")
+    if method == "GET":
+        if not has_id:
+            return "list"
+        return "get_media" if parse_qs(u.query).get("alt") == ["media"] else "get"
+    if method == "POST":
+        return "create_upload" if path.startswith("/upload/") else "create"
+    if method in ("PATCH", "PUT"):
+        return "update_upload" if path.startswith("/upload/") else "update"
+    if method == "DELETE":
+        return "delete"
+    return method.lower()
+
+
+def _new_op() -> Dict[str, Any]:
+    return {"count": 0, "errors": 0, "seconds": 0.0, "max_s": 0.0, "bytes_in": 0, "bytes_out": 0,
+            "buckets": [0] * len(LATENCY_BUCKETS)}
+
+
+def _add(agg: Dict[str, Dict[str, Any]], op: str, seconds: float, bytes_in: int, bytes_out: int, error: bool) -> None:
+    e = agg.setdefault(op, _new_op())
+    e["count"] += 1
+    e["errors"] += int(error)
+    e["seconds"] += seconds
+    e["max_s"] = max(e["max_s"], seconds)
+    e["bytes_in"] += bytes_in
+    e["bytes_out"] += bytes_out
+    for i, le in enumerate(LATENCY_BUCKETS):
+        if seconds <= le:
+            e["buckets"][i] += 1
+
+
+def _new_wait() -> Dict[str, Any]:
+    return {"count": 0, "seconds": 0.0, "max_s": 0.0, "buckets": [0] * len(WAIT_BUCKETS)}
+
+
+def _add_wait(agg: Dict[str, Dict[str, Any]], kind: str, seconds: float) -> None:
+    w = agg.setdefault(kind, _new_wait())
+    w["count"] += 1
+    w["seconds"] += seconds
+    w["max_s"] = max(w["max_s"], seconds)
+    for i, le in enumerate(WAIT_BUCKETS):
+        if seconds <= le:
+            w["buckets"][i] += 1
+
+
+def _plain(agg: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {op: {k: v for k, v in e.items() if k != "buckets"} for op, e in sorted(agg.items())}
+
+
+def _session_id() -> str:
+    ctx = get_script_run_ctx()
+    return getattr(ctx, "session_id", None) or "-"
+
+
+class DriveMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process: Dict[str, Dict[str, Any]] = {}
+        self._waits: Dict[str, Dict[str, Any]] = {}  # 대기 종류 -> 집계(요청 수에는 포함하지 않음)
+        # session -> {"seq", "current", "last", "current_waits", "last_waits"}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._events: deque = deque(maxlen=MAX_EVENTS)
+        self.started = time.time()
+
+    def _session(self, sid: str) -> Dict[str, Any]:
+        s = self._sessions.get(sid)
+        if s is None:
+            s = self._sessions[sid] = {"seq": 0, "current": {}, "last": {}, "current_waits": {}, "last_waits": {}}
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(sid)
+        return s
+
+    def record(self, op: str, seconds: float, bytes_in: int = 0, bytes_out: int = 0, error: bool = False,
+               status: Optional[int] = None) -> None:
+        sid = _session_id()
+        with self._lock:
+            _add(self._process, op, seconds, bytes_in, bytes_out, error)
+            _add(self._session(sid)["current"], op, seconds, bytes_in, bytes_out, error)
+            self._events.append({
+                "ts": round(time.time(), 3), "session": sid, "op": op, "status": status,
+                "latency_s": round(seconds, 4), "bytes_in": bytes_in, "bytes_out": bytes_out, "error": error,
+            })
+
+    def record_wait(self, kind: str, seconds: float) -> None:
+        """속도 제한(throttle_wait)/재시도 백오프(retry_wait)로 기다린 시간."""
+        sid = _session_id()
+        with self._lock:
+            _add_wait(self._waits, kind, seconds)
+            _add_wait(self._session(sid)["current_waits"], kind, seconds)
+
+    def start_rerun(self) -> None:
+        """이 세션의 새 재실행 시작: 지금까지의 집계는 '직전 재실행'으로 넘깁니다."""
+        with self._lock:
+            s = self._session(_session_id())
+            s["seq"] += 1
+            s["last"], s["current"] = s["current"], {}
+            s["last_waits"], s["current_waits"] = s["current_waits"], {}
+
+    def rerun_summary(self) -> Dict[str, Any]:
+        with self._lock:
+            s = self._session(_session_id())
+            return {"seq": s["seq"], "current": _plain(s["current"]), "last": _plain(s["last"]),
+                    "current_waits": _plain(s["current_waits"]), "last_waits": _plain(s["last_waits"])}
+
+    def process_summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return _plain(self._process)
+
+    def wait_summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return _plain(self._waits)
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            agg = {op: dict(e, buckets=list(e["buckets"])) for op, e in self._process.items()}
+            waits = {kind: dict(w, buckets=list(w["buckets"])) for kind, w in self._waits.items()}
+        lines = [
+            "# HELP trip_drive_requests_total Drive API 요청 수",
+            "# TYPE trip_drive_requests_total counter",
+        ]
+        lines += [f'trip_drive_requests_total{{op="{op}"}} {e["count"]}' for op, e in sorted(agg.items())]
+        lines += ["# HELP trip_drive_request_errors_total 실패한 Drive API 요청 수",
+                  "# TYPE trip_drive_request_errors_total counter"]
+        lines += [f'trip_drive_request_errors_total{{op="{op}"}} {e["errors"]}' for op, e in sorted(agg.items())]
+        for direction in ("in", "out"):
+            name = f"trip_drive_bytes_{direction}_total"
+            lines += [f"# HELP {name} Drive API {'수신' if direction == 'in' else '송신'} 바이트",
+                      f"# TYPE {name} counter"]
+            lines += [f'{name}{{op="{op}"}} {e["bytes_" + direction]}' for op, e in sorted(agg.items())]
+        lines += ["# HELP trip_drive_request_seconds Drive API 요청 지연(초)",
+                  "# TYPE trip_drive_request_seconds histogram"]
+        for op, e in sorted(agg.items()):
+            for le, n in zip(LATENCY_BUCKETS, e["buckets"]):
+                lines.append(f'trip_drive_request_seconds_bucket{{op="{op}",le="{le}"}} {n}')
+            lines.append(f'trip_drive_request_seconds_bucket{{op="{op}",le="+Inf"}} {e["count"]}')
+            lines.append(f'trip_drive_request_seconds_sum{{op="{op}"}} {e["seconds"]:.6f}')
+            lines.append(f'trip_drive_request_seconds_count{{op="{op}"}} {e["count"]}')
+        lines += ["# HELP trip_drive_wait_seconds 속도 제한/재시도로 기다린 시간(초, 요청 수와 별개)",
+                  "# TYPE trip_drive_wait_seconds histogram"]
+        for kind, w in sorted(waits.items()):
+            for le, n in zip(WAIT_BUCKETS, w["buckets"]):
+                lines.append(f'trip_drive_wait_seconds_bucket{{kind="{kind}",le="{le}"}} {n}')
+            lines.append(f'trip_drive_wait_seconds_bucket{{kind="{kind}",le="+Inf"}} {w["count"]}')
+            lines.append(f'trip_drive_wait_seconds_sum{{kind="{kind}"}} {w["seconds"]:.6f}')
+            lines.append(f'trip_drive_wait_seconds_count{{kind="{kind}"}} {w["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def jsonl(self) -> str:
+        with self._lock:
+            events = list(self._events)
+        return "".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in events)
+
+
+@st.cache_resource(show_spinner=False)
+def metrics() -> DriveMetrics:
+    return DriveMetrics()
+
+
+def _body_len(body: Any) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    return 0
+
+
+class MeteredHttp:
+    """httplib2.Http/AuthorizedHttp 래퍼: request()마다 op/지연/바이트를 기록합니다."""
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        op = classify(uri, method)
+        t0 = time.perf_counter()
+        try:
+            resp, content = self._inner.request(uri, method, body, headers, *args, **kwargs)
+        except Exception:
+            metrics().record(op, time.perf_counter() - t0, 0, _body_len(body), error=True)
+            raise
+        status = getattr(resp, "status", None)
+        metrics().record(op, time.perf_counter() - t0, len(content or b""), _body_len(body),
+                         error=bool(status and status >= 400), status=status)
+        return resp, content
+
+
+def start_rerun() -> None:
+    """각 페이지 맨 위에서 호출(재실행 단위 집계 경계)."""
+    try:
+        metrics().start_rerun()
+    except Exception:
+        pass
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def summary_line(agg: Dict[str, Dict[str, Any]]) -> str:
+    """예: 'token_refresh 1 · list 2 · get_media 3 · ↓400 KB ↑0 B · 1.20s'"""
+    if not agg:
+        return "Drive 호출 없음"
+    parts = [f"{op} {e['count']}" for op, e in agg.items()]
+    bin_ = sum(e["bytes_in"] for e in agg.values())
+    bout = sum(e["bytes_out"] for e in agg.values())
+    secs = sum(e["seconds"] for e in agg.values())
+    return " · ".join(parts) + f" · ↓{_fmt_bytes(bin_)} ↑{_fmt_bytes(bout)} · {secs:.2f}s"
+
+
+def wait_line(waits: Dict[str, Dict[str, Any]]) -> str:
+    """예: '대기: throttle_wait 3회 0.40s · retry_wait 1회 1.20s' (대기가 없으면 '')"""
+    if not waits:
+        return ""
+    return "대기: " + " · ".join(f"{kind} {w['count']}회 {w['seconds']:.2f}s" for kind, w in waits.items())
+
+
+def debug_enabled() -> bool:
+    try:
+        if st.query_params.get("debug") in ("1", "true"):
+            return True
+    except Exception:
+        pass
+    try:
+        return bool(dict(st.secrets.get("debug", {})).get("drive_metrics", False))
+    except Exception:
+        return False
+
+
+def render_debug_panel(extra: Optional[Dict[str, Any]] = None) -> None:
+    """사이드바 디버그 패널(직전 재실행 / 프로세스 누적 / 내보내기). extra: 함께 보여줄 통계들."""
+    if not debug_enabled():
+        return
+    m = metrics()
+    rerun = m.rerun_summary()
+    proc = m.process_summary()
+    with st.sidebar.expander("🔧 Drive 호출 통계", expanded=False):
+        for label, key in (("직전 재실행", "last"), ("이번 재실행(지금까지)", "current")):
+            waits = wait_line(rerun[f"{key}_waits"])
+            st.caption(f"{label}: {summary_line(rerun[key])}" + (f" · {waits}" if waits else ""))
+        if proc:
+            st.dataframe(
+                [{"op": op, "횟수": e["count"], "오류": e["errors"], "평균 ms": round(1000 * e["seconds"] / e["count"]),
+                  "최대 ms": round(1000 * e["max_s"]), "수신": _fmt_bytes(e["bytes_in"]), "송신": _fmt_bytes(e["bytes_out"])}
+                 for op, e in proc.items()],
+                hide_index=True, use_container_width=True,
+            )
+        waits = wait_line(m.wait_summary())
+        if waits:
+            st.caption(f"프로세스 누적 {waits}")
+        for title, stats in (extra or {}).items():
+            st.caption(title)
+            st.json(stats, expanded=False)
+        c1, c2 = st.columns(2)
+        c1.download_button("Prometheus", m.prometheus_text(), file_name="drive_metrics.prom", mime="text/plain")
+        c2.download_button("JSONL", m.jsonl(), file_name="drive_calls.jsonl", mime="application/x-ndjson")
+
+
+def export_snapshot() -> Dict[str, Any]:
+    """프로세스 누적 + 이 세션 재실행 집계(dict). 유지보수/테스트용."""
+    m = metrics()
+    return {"started": m.started, "process": m.process_summary(), "waits": m.wait_summary(),
+            "rerun": m.rerun_summary()}
+
+
+def record_token_refresh(seconds: float, error: bool = False) -> None:
+    metrics().record("token_refresh", seconds, error=error)
+
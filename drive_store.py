@@ -1,63 +1,744 @@
+import atexit
+import copy
+import hashlib
 import io
 import json
-from typing import Optional, Dict, Any, List
+import os
+import random
+import ssl
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Iterator, List
 
+try:
+    import fcntl
+except ImportError:  # Windows: 잠금 없이 동작(다른 프로세스가 남긴 대기 op는 복구하지 않음)
+    fcntl = None  # type: ignore
+
+import httplib2
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
+from google.auth.exceptions import TransportError
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 
+import db_ops
+import drive_metrics
+from app_runtime import CACHE_DIR  # 로컬 캐시 위치(프로세스 재시작 후에도 유지). 환경변수로 변경 가능.
+from change_feed import ChangeWatcher, DriveChangeFeed
+from db_ops import TripDB
+import image_pipeline
+
 SCOPES = ["https://www.googleapis.com/auth/drive"]
-DB_FILENAME = "trips.json"
+DB_FILENAME = "trips.json"  # 구버전(단일 파일) DB. 있으면 샤드 구조로 자동 이전합니다.
+INDEX_FILENAME = "trips_index.json"  # 여행 목록 + 여행별 샤드 md5
+TRIPS_FOLDER_NAME = "trips"  # 여행별 문서(trip_<id>.json)
+JOURNAL_FOLDER_NAME = "journal"  # 저장 1회 = op 파일 1개(op_<ms>_<rand>.json)
+JOURNAL_ARCHIVE_FOLDER_NAME = "archive"  # 스냅샷에 반영된 op(이력 재생용으로 보관)
 IMAGES_FOLDER_NAME = "images"
+INDEX_FORMAT = 2
+
+# 저장 충돌(스냅샷/인덱스 동시 갱신) 시 재시도 횟수
+SAVE_MAX_RETRIES = 5
+
+# write-behind 모드: 마지막 수정 후 이만큼 조용하면 한 번에 저장(계속 수정 중이어도 최대 대기 시간 후 저장)
+WRITE_BEHIND_DELAY_S = 1.5
+WRITE_BEHIND_MAX_WAIT_S = 10.0
+WRITE_BEHIND_RETRY_S = 5.0
+PENDING_SAVES_DIR = "pending_saves"  # 프로세스마다 pending_<pid>_<rand>.json + .lock
+
+# 저널 op가 이만큼 쌓이면 스냅샷(샤드)으로 압축
+JOURNAL_COMPACT_EVERY = 20
+# 막 쓰이는 중인 op와 경합하지 않도록, 이 시간보다 오래된 op만 압축
+JOURNAL_COMPACT_MIN_AGE_S = 30
+
+
+# 토큰 만료 이 시간 전이면 미리 갱신(google-auth 기본 임계값보다 넉넉하게)
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+HTTP_TIMEOUT_S = 60
+
+# 변경 여부 판단에 쓰는 Drive 메타데이터 필드
+DB_META_FIELDS = "id,version,md5Checksum,modifiedTime"
+WATCH_INTERVAL_S = 10.0  # 변경 피드 확인 주기(프로세스당 changes.list 1회)
+
+# 사진 일괄 업로드/다운로드 동시 실행 수(Drive 쿼터를 고려해 작게)
+IMAGE_MAX_WORKERS = 4
+
+# 다운로드한 사진을 보관하는 디스크 캐시 용량(secrets.toml [images] cache_mb 로 변경)
+IMAGE_CACHE_MB = 256
+
+# 사진 GC: 어떤 일정도 참조하지 않는 사진 파일 정리. 최근 파일은 저장 전일 수 있어서 유예 기간 동안 남김
+IMAGE_GC_GRACE_S = 7 * 24 * 3600
+IMAGE_GC_BATCH = 100  # Drive batch 요청 1개에 넣을 수 있는 최대 호출 수
+IMAGE_GC_FIELDS = "id,name,size,createdTime,appProperties"
+
+# 일시 오류(429/5xx/rateLimit/네트워크) 재시도: 지수 백오프 + full jitter
+RETRY_MAX_ATTEMPTS = 6
+RETRY_BASE_S = 0.5
+RETRY_MAX_S = 32.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+FILE_ID_BATCH = 50  # files().generateIds 1회로 미리 받아 두는 새 파일 id 수
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+# 우리 쪽에서 내보내는 Drive 요청 속도 상한(토큰 버킷). secrets.toml [drive] qps / burst 로 변경
+DRIVE_QPS = 8.0
+DRIVE_BURST = 16
+
+
+class ConcurrentUpdateError(RuntimeError):
+    """읽은 뒤 Drive의 DB 인덱스가 다른 세션에 의해 바뀌어 조건부 쓰기를 할 수 없음."""
+
+
+class StorageUnavailableError(RuntimeError):
+    """DB를 읽지 못함(재시도 후에도 실패). '여행이 하나도 없음'과 구분하려고 빈 DB 대신 올립니다."""
+
+
+class TokenBucket:
+    """
+    초당 요청 수 제한. 속도 제한 오류를 받으면 속도를 절반으로 줄이고, 성공할 때마다 조금씩 되돌립니다(AIMD).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = max(0.1, float(rate))
+        self.rate = self.max_rate
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """토큰 1개를 얻을 때까지 기다리고, 기다린 시간(초)을 돌려줍니다."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self) -> None:
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def reward(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def _retry_decision(e: Exception) -> tuple:
+    """(재시도할지, 속도 제한 오류인지, 서버가 알려준 대기 시간|None)"""
+    if isinstance(e, HttpError):
+        status = getattr(e.resp, "status", None)
+        body = (e.content or b"").decode("utf-8", errors="ignore")
+        rate_limited = status == 429 or (status == 403 and any(r in body for r in RATE_LIMIT_REASONS))
+        retry_after = None
+        try:
+            retry_after = float(e.resp.get("retry-after"))
+        except (TypeError, ValueError, AttributeError):
+            pass
+        return rate_limited or status in RETRYABLE_STATUS, rate_limited, retry_after
+    if isinstance(e, (TimeoutError, ConnectionError, ssl.SSLError, httplib2.HttpLib2Error, TransportError)):
+        return True, False, None
+    return False, False, None
+
+
+class DriveClient:
+    """
+    프로세스 전체에서 공유하는 Drive 클라이언트.
+
+    - 자격증명은 1개만 만들고, 만료가 가까울 때만 refresh 합니다.
+    - discovery build는 1회만 합니다.
+    - HTTP 전송(keep-alive)은 스레드별로 1개씩 재사용합니다(httplib2는 thread-safe가 아님).
+    - 모든 요청은 call()을 거칩니다: 토큰 버킷으로 속도를 제한하고, 일시 오류는 백오프 후 재시도.
+      files().create는 그대로 재시도하면 첫 시도가 이미 반영됐을 때 파일이 두 개 생기므로,
+      _create_file로 id를 미리 정해서 만듭니다(재시도가 409면 이미 만들어진 그 파일).
+    """
+
+    def __init__(self, oauth: Dict[str, Any], limits: Optional[Dict[str, Any]] = None):
+        self._creds = Credentials(
+            token=None,
+            refresh_token=oauth["refresh_token"],
+            token_uri=oauth.get("token_uri", "https://oauth2.googleapis.com/token"),
+            client_id=oauth["client_id"],
+            client_secret=oauth["client_secret"],
+            scopes=SCOPES,
+        )
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._service = None
+        limits = limits or {}
+        self.max_attempts = max(1, int(limits.get("max_attempts", RETRY_MAX_ATTEMPTS)))
+        self.bucket = TokenBucket(limits.get("qps", DRIVE_QPS), limits.get("burst", DRIVE_BURST))
+        self.stats = {"token_refreshes": 0, "service_builds": 0, "http_transports": 0, "retries": 0, "rate_limited": 0}
+
+    def _needs_refresh(self) -> bool:
+        creds = self._creds
+        if not creds.token or creds.expiry is None:
+            return True
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # creds.expiry는 naive UTC
+        return creds.expiry - now <= TOKEN_REFRESH_MARGIN
+
+    def ensure_fresh(self) -> None:
+        if not self._needs_refresh():
+            return
+        with self._lock:
+            if self._needs_refresh():
+                t0 = time.perf_counter()
+                try:
+                    self._creds.refresh(Request())
+                except Exception:
+                    drive_metrics.record_token_refresh(time.perf_counter() - t0, error=True)
+                    raise
+                drive_metrics.record_token_refresh(time.perf_counter() - t0)
+                self.stats["token_refreshes"] += 1
+
+    def http(self) -> drive_metrics.MeteredHttp:
+        """현재 스레드용 인증 HTTP 전송(토큰 신선도 보장, 요청마다 drive_metrics에 기록)."""
+        self.ensure_fresh()
+        authed = getattr(self._local, "http", None)
+        if authed is None:
+            authed = drive_metrics.MeteredHttp(
+                AuthorizedHttp(self._creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_S))
+            )
+            self._local.http = authed
+            with self._lock:
+                self.stats["http_transports"] += 1
+        return authed
+
+    def service(self):
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = build("drive", "v3", http=self.http(), cache_discovery=False)
+                    self.stats["service_builds"] += 1
+        return self._service
+
+    def call(self, fn):
+        """fn()을 속도 제한 + 재시도(지수 백오프, full jitter, Retry-After 존중)로 실행합니다."""
+        for attempt in range(self.max_attempts):
+            waited = self.bucket.acquire()
+            if waited:
+                drive_metrics.metrics().record_wait("throttle_wait", waited)
+            try:
+                result = fn()
+            except Exception as e:
+                retry, rate_limited, retry_after = _retry_decision(e)
+                if not retry or attempt == self.max_attempts - 1:
+                    raise
+                if rate_limited:
+                    self.bucket.penalize()
+                delay = retry_after if retry_after is not None else random.uniform(
+                    0, min(RETRY_MAX_S, RETRY_BASE_S * (2 ** attempt))
+                )
+                with self._lock:
+                    self.stats["retries"] += 1
+                    self.stats["rate_limited"] += int(rate_limited)
+                drive_metrics.metrics().record_wait("retry_wait", delay)
+                time.sleep(delay)
+                continue
+            self.bucket.reward()
+            return result
+
+    def execute(self, req):
+        return self.call(lambda: req.execute(http=self.http()))
+
+    def media_download(self, req, fh) -> MediaIoBaseDownload:
+        req.http = self.http()
+        return MediaIoBaseDownload(fh, req)
+
+
+@st.cache_resource(show_spinner=False)
+def _drive_client() -> DriveClient:
+    try:
+        limits = dict(st.secrets.get("drive", {}))
+    except Exception:
+        limits = {}
+    return DriveClient(dict(st.secrets["oauth"]), limits)
 
 
 def _drive_service():
-    oauth = st.secrets["oauth"]
-    creds = Credentials(
-        token=None,
-        refresh_token=oauth["refresh_token"],
-        token_uri=oauth.get("token_uri", "https://oauth2.googleapis.com/token"),
-        client_id=oauth["client_id"],
-        client_secret=oauth["client_secret"],
-        scopes=SCOPES,
-    )
-    creds.refresh(Request())
-    return build("drive", "v3", credentials=creds)
+    return _drive_client().service()
+
+
+def _execute(req):
+    return _drive_client().execute(req)
+
+
+def drive_client_stats() -> Dict[str, int]:
+    """토큰 refresh / discovery build / HTTP 전송 생성 횟수(프로세스 누적)."""
+    return dict(_drive_client().stats)
+
+
+def _cache_path(name: str) -> str:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _meta_signature(meta: Dict[str, Any]) -> tuple:
+    return (meta.get("id"), meta.get("version"), meta.get("md5Checksum"), meta.get("modifiedTime"))
+
+
+class DBCache:
+    """
+    DB 문서(인덱스/여행 샤드/구버전 trips.json) 재검증 캐시(메모리 + 디스크).
+
+    Drive 메타데이터(version/md5Checksum/modifiedTime)가 같으면 다운로드 없이 파싱된 사본을 돌려줍니다.
+
+    변경 감시(ChangeWatcher)가 켜져 있으면, 이 프로세스에서 확인한 뒤 변경 알림이 없었던 항목(fresh)은
+    메타데이터 재확인 없이 바로 씁니다(trusted). 알림이 오면 해당 파일/폴더 항목만 fresh에서 빠져요.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # key -> {"meta":..., "data":...}
+        self._fresh: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.trusted_hits = 0
+
+    def _disk_path(self, key: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+        return _cache_path(f"db_{safe}.json")
+
+    def _entry(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _read_json(self._disk_path(key))
+            if isinstance(entry, dict) and "meta" in entry and "data" in entry:
+                self._entries[key] = entry
+            else:
+                entry = None
+        return entry
+
+    def get(self, key: str, meta: Dict[str, Any]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entry(key)
+            if entry and _meta_signature(entry["meta"]) == _meta_signature(meta):
+                self.hits += 1
+                self._fresh.add(key)
+                return copy.deepcopy(entry["data"])
+            self.misses += 1
+            return None
+
+    def peek(self, key: str) -> Optional[tuple]:
+        """재검증 없이 마지막으로 알던 (meta, data). 통계에는 넣지 않아요."""
+        with self._lock:
+            entry = self._entry(key)
+            return (dict(entry["meta"]), copy.deepcopy(entry["data"])) if entry else None
+
+    def put(self, key: str, meta: Dict[str, Any], data: Any) -> None:
+        entry = {"meta": dict(meta), "data": copy.deepcopy(data)}
+        with self._lock:
+            self._entries[key] = entry
+            self._fresh.add(key)
+        try:
+            _write_json_atomic(self._disk_path(key), entry)
+        except OSError:
+            pass  # 디스크 캐시는 best-effort
+
+    def trusted(self, key: str) -> Optional[tuple]:
+        """변경 알림 없이 fresh로 남아 있는 항목이면 (data, meta), 아니면 None."""
+        with self._lock:
+            if key not in self._fresh:
+                return None
+            entry = self._entry(key)
+            if not entry:
+                return None
+            self.trusted_hits += 1
+            return copy.deepcopy(entry["data"]), dict(entry["meta"])
+
+    def invalidate_ids(self, file_ids, listings: bool = False) -> None:
+        """meta의 id가 file_ids에 있는 항목(폴더 id면 그 폴더 목록)을 fresh에서 뺍니다."""
+        ids = set(file_ids)
+        with self._lock:
+            for key in list(self._fresh):
+                entry = self._entries.get(key)
+                if (listings and key.startswith("list_")) or (entry and entry["meta"].get("id") in ids):
+                    self._fresh.discard(key)
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._fresh.clear()
+
+    def ids(self) -> set:
+        """메모리에 있는 항목들의 Drive file/folder id."""
+        with self._lock:
+            return {e["meta"]["id"] for e in self._entries.values() if e["meta"].get("id")}
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": (self.hits / total) if total else 0.0,
+                "trusted_hits": self.trusted_hits}
+
+
+@st.cache_resource(show_spinner=False)
+def _db_cache() -> DBCache:
+    return DBCache()
+
+
+def db_cache_stats() -> Dict[str, Any]:
+    """load_db 캐시 적중률(프로세스 누적)."""
+    return _db_cache().stats()
+
+
+class IdRegistry:
+    """
+    (부모 폴더, 이름) -> Drive ID 등록부. 한 번 찾은 ID는 디스크에 저장해 재사용하고,
+    호출이 404를 돌려줄 때만 무효화합니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = _cache_path("drive_ids.json")
+        data = _read_json(self._path)
+        self._ids: Dict[str, str] = data if isinstance(data, dict) else {}
+
+    def _save(self) -> None:
+        try:
+            _write_json_atomic(self._path, self._ids)
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._ids.get(key)
+
+    def set(self, key: str, file_id: str) -> None:
+        with self._lock:
+            if self._ids.get(key) == file_id:
+                return
+            self._ids[key] = file_id
+            self._save()
+
+    def known_ids(self) -> Dict[str, str]:
+        """등록된 id와 그 부모 폴더 id -> 용도("folder:<이름>", "file:<이름>", "parent")."""
+        with self._lock:
+            out: Dict[str, str] = {}
+            for key, fid in self._ids.items():
+                kind, _, rest = key.partition(":")
+                parent, _, name = rest.rpartition("/")
+                out[fid] = f"{kind}:{name}"
+                out.setdefault(parent, "parent")
+            return out
+
+    def forget_id(self, file_id: str) -> None:
+        with self._lock:
+            stale = [k for k, v in self._ids.items() if v == file_id]
+            for k in stale:
+                del self._ids[k]
+            if stale:
+                self._save()
+
+
+@st.cache_resource(show_spinner=False)
+def _id_registry() -> IdRegistry:
+    return IdRegistry()
+
+
+class FileIdPool:
+    """files().generateIds로 새 파일 id를 FILE_ID_BATCH개씩 미리 받아 둡니다(프로세스 공용)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+
+    def take(self, service) -> str:
+        with self._lock:
+            if not self._ids:
+                res = _execute(service.files().generateIds(count=FILE_ID_BATCH, space="drive", fields="ids"))
+                self._ids = list(res.get("ids") or [])
+                if not self._ids:
+                    raise RuntimeError("Drive가 새 파일 id를 주지 않았어요")
+            return self._ids.pop()
+
+
+@st.cache_resource(show_spinner=False)
+def _file_ids() -> FileIdPool:
+    return FileIdPool()
+
+
+def _create_file(service, body: Dict[str, Any], media_body=None, fields: str = "id") -> Dict[str, Any]:
+    """
+    재시도해도 파일이 하나만 생기는 files().create. id를 미리 정해서 만들고, 첫 시도가 (오류 응답과 달리)
+    실제로 반영돼서 재시도가 409(같은 id가 이미 있음)로 끝나면 그 파일을 돌려줍니다.
+    """
+    file_id = _file_ids().take(service)
+    try:
+        return _execute(service.files().create(body={**body, "id": file_id}, media_body=media_body, fields=fields))
+    except HttpError as e:
+        if getattr(e.resp, "status", None) != 409:
+            raise
+        return _execute(service.files().get(fileId=file_id, fields=fields))
+
+
+def _is_not_found(e: Exception) -> bool:
+    return isinstance(e, HttpError) and getattr(e.resp, "status", None) == 404
+
+
+class ImageIndex:
+    """
+    내용 해시(sha256) -> Drive 이미지 파일 등록부(디스크에 저장).
+
+    같은 사진은 Drive에 한 번만 올리고 여러 일정이 같은 file id를 공유합니다.
+    Drive 파일에도 appProperties.sha256을 남겨서, 로컬 등록부가 없는 다른 인스턴스도 찾을 수 있어요.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = _cache_path("image_index.json")
+        data = _read_json(self._path)
+        self._by_hash: Dict[str, Dict[str, Any]] = data if isinstance(data, dict) else {}
+
+    def _save(self) -> None:
+        try:
+            _write_json_atomic(self._path, self._by_hash)
+        except OSError:
+            pass
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._by_hash.get(digest)
+            return dict(entry) if entry else None
+
+    def put(self, digest: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._by_hash[digest] = dict(entry)
+            self._save()
+
+    def forget_id(self, file_id: str) -> None:
+        with self._lock:
+            stale = [h for h, e in self._by_hash.items() if e.get("id") == file_id]
+            for h in stale:
+                del self._by_hash[h]
+            if stale:
+                self._save()
+
+    def touch(self, digest: str) -> None:
+        """기존 파일을 재사용했다고 기록(GC가 아직 저장 전인 재사용 사진을 지우지 않게)."""
+        with self._lock:
+            entry = self._by_hash.get(digest)
+            if entry is not None:
+                entry["used"] = time.time()
+                self._save()
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {h: dict(e) for h, e in self._by_hash.items()}
+
+
+@st.cache_resource(show_spinner=False)
+def _image_index() -> ImageIndex:
+    return ImageIndex()
+
+
+def image_digest(img_bytes: bytes) -> str:
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+class ImageCache:
+    """
+    Drive 사진 바이트 디스크 캐시(모든 세션/탭이 공유). file id 기준, 용량 초과 시 오래 안 본 것부터 삭제.
+
+    Drive에 올린 사진은 내용이 바뀌지 않으므로(새 사진 = 새 file id) 재검증 없이 씁니다.
+    파일 이름에 sha256을 같이 적어두고 읽을 때 확인해서, 깨진 파일은 버리고 다시 받습니다.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # file id -> {"path", "size", "atime"}
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self.corrupt = 0
+        os.makedirs(root, exist_ok=True)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            fid, sep, _digest = name.partition("__")
+            if not sep or name.endswith(".tmp"):
+                continue
+            try:
+                st_ = os.stat(path)
+            except OSError:
+                continue
+            self._entries[fid] = {"path": path, "size": st_.st_size, "atime": st_.st_mtime}
+            self._total += st_.st_size
+
+    @staticmethod
+    def _safe(file_id: str) -> str:
+        return "".join(c if c.isalnum() or c in "-_" else "_" for c in file_id)
+
+    def _drop(self, file_id: str) -> None:
+        entry = self._entries.pop(file_id, None)
+        if entry:
+            self._total -= entry["size"]
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def get(self, file_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            path = entry["path"]
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+        with self._lock:
+            if data is None or hashlib.sha256(data).hexdigest() != path.rsplit("__", 1)[-1]:
+                self.corrupt += data is not None
+                self.misses += 1
+                self._drop(file_id)
+                return None
+            now = time.time()
+            entry["atime"] = now
+            self.hits += 1
+            self.bytes_saved += len(data)
+        try:
+            os.utime(path, (now, now))  # 재시작 후에도 LRU 순서 유지
+        except OSError:
+            pass
+        return data
+
+    def put(self, file_id: str, data: bytes) -> None:
+        if not data or len(data) > self.max_bytes:
+            return
+        path = os.path.join(self.root, f"{self._safe(file_id)}__{hashlib.sha256(data).hexdigest()}")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return  # 디스크 캐시는 best-effort
+        with self._lock:
+            old = self._entries.get(file_id)
+            if old and old["path"] != path:
+                self._drop(file_id)
+            elif old:
+                self._total -= old["size"]
+            self._entries[file_id] = {"path": path, "size": len(data), "atime": time.time()}
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                for fid in sorted(self._entries, key=lambda k: self._entries[k]["atime"]):
+                    if self._total <= self.max_bytes:
+                        break
+                    if fid != file_id:
+                        self._drop(fid)
+                        self.evictions += 1
+
+    def forget(self, file_id: str) -> None:
+        with self._lock:
+            self._drop(file_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "hit_ratio": (self.hits / total) if total else 0.0,
+                "bytes_saved": self.bytes_saved, "evictions": self.evictions, "corrupt": self.corrupt,
+                "entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def _image_cache() -> ImageCache:
+    try:
+        mb = float(_image_config().get("cache_mb", IMAGE_CACHE_MB))
+    except (TypeError, ValueError):
+        mb = IMAGE_CACHE_MB
+    return ImageCache(_cache_path("image_bytes"), int(mb * 1024 * 1024))
+
+
+def image_cache_stats() -> Dict[str, Any]:
+    """사진 디스크 캐시 적중/절약 바이트/축출 수(프로세스 누적)."""
+    return _image_cache().stats()
 
 
 def find_file_in_folder(service, folder_id: str, name: str) -> Optional[str]:
+    key = f"file:{folder_id}/{name}"
+    cached = _id_registry().get(key)
+    if cached:
+        return cached
+
     q = f"'{folder_id}' in parents and name='{name}' and trashed=false"
-    res = service.files().list(q=q, fields="files(id,name)").execute()
+    res = _execute(service.files().list(q=q, fields="files(id,name)"))
     files = res.get("files", [])
-    return files[0]["id"] if files else None
+    if not files:
+        return None
+    _id_registry().set(key, files[0]["id"])
+    return files[0]["id"]
 
 
 def ensure_subfolder(service, parent_id: str, name: str) -> str:
+    key = f"folder:{parent_id}/{name}"
+    cached = _id_registry().get(key)
+    if cached:
+        return cached
+
     q = (
         f"'{parent_id}' in parents and name='{name}' "
         f"and mimeType='application/vnd.google-apps.folder' and trashed=false"
     )
-    res = service.files().list(q=q, fields="files(id,name)").execute()
+    res = _execute(service.files().list(q=q, fields="files(id,name)"))
     files = res.get("files", [])
     if files:
+        _id_registry().set(key, files[0]["id"])
         return files[0]["id"]
 
     meta = {"name": name, "mimeType": "application/vnd.google-apps.folder", "parents": [parent_id]}
-    created = service.files().create(body=meta, fields="id").execute()
+    created = _create_file(service, meta)
+    _id_registry().set(key, created["id"])
     return created["id"]
 
 
 def download_bytes(service, file_id: str) -> bytes:
     req = service.files().get_media(fileId=file_id)
     fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, req)
+    client = _drive_client()
+    downloader = client.media_download(req, fh)
     done = False
     while not done:
-        _, done = downloader.next_chunk()
+        _, done = client.call(downloader.next_chunk)
     fh.seek(0)
     return fh.read()
 
@@ -67,53 +748,1286 @@ def download_json(service, file_id: str) -> Dict[str, Any]:
     return json.loads(raw.decode("utf-8"))
 
 
-def upload_json(service, folder_id: str, name: str, data: Dict[str, Any]) -> str:
-    content = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+def _dump_json(data: Any) -> bytes:
+    """샤드/인덱스 직렬화(공백 없이). 같은 내용이면 항상 같은 바이트 -> md5 비교에 사용."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _upload_json_meta(service, folder_id: str, name: str, data: Any, content: Optional[bytes] = None) -> Dict[str, Any]:
+    """upload_json과 같지만, 업로드 후 Drive 메타데이터(DB_META_FIELDS)를 돌려줍니다."""
+    if content is None:
+        content = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
     media = MediaIoBaseUpload(io.BytesIO(content), mimetype="application/json", resumable=False)
 
     existing = find_file_in_folder(service, folder_id, name)
     if existing:
-        service.files().update(fileId=existing, media_body=media).execute()
-        return existing
+        try:
+            return _execute(service.files().update(fileId=existing, media_body=media, fields=DB_META_FIELDS))
+        except HttpError as e:
+            if not _is_not_found(e):
+                raise
+            # 캐시된 ID가 더 이상 없음 -> 다시 찾아보고 없으면 새로 생성
+            _id_registry().forget_id(existing)
+            existing = find_file_in_folder(service, folder_id, name)
+            if existing:
+                return _execute(service.files().update(fileId=existing, media_body=media, fields=DB_META_FIELDS))
 
     meta = {"name": name, "parents": [folder_id]}
-    created = service.files().create(body=meta, media_body=media, fields="id").execute()
-    return created["id"]
+    created = _create_file(service, meta, media, DB_META_FIELDS)
+    _id_registry().set(f"file:{folder_id}/{name}", created["id"])
+    return created
+
+
+def upload_json(service, folder_id: str, name: str, data: Dict[str, Any]) -> str:
+    return _upload_json_meta(service, folder_id, name, data)["id"]
 
 
-def upload_image_bytes(service, folder_id: str, filename: str, img_bytes: bytes, mime: str) -> str:
+def upload_image_bytes(service, folder_id: str, filename: str, img_bytes: bytes, mime: str,
+                       app_properties: Optional[Dict[str, str]] = None) -> str:
     media = MediaIoBaseUpload(io.BytesIO(img_bytes), mimetype=mime, resumable=False)
     meta = {"name": filename, "parents": [folder_id]}
-    created = service.files().create(body=meta, media_body=media, fields="id").execute()
+    if app_properties:
+        meta["appProperties"] = app_properties
+    try:
+        created = _create_file(service, meta, media)
+    except HttpError as e:
+        if _is_not_found(e):
+            _id_registry().forget_id(folder_id)  # 폴더가 사라짐 -> 다음 ensure_subfolder에서 다시 찾기
+        raise
+    _image_cache().put(created["id"], img_bytes)  # 방금 올린 사진은 바로 보여줄 일이 많음
     return created["id"]
 
 
-def load_db(root_folder_id: str) -> Dict[str, Any]:
-    service = _drive_service()
-    fid = find_file_in_folder(service, root_folder_id, DB_FILENAME)
+class _WorkerPool(ThreadPoolExecutor):
+    def submit(self, fn, *args, **kwargs) -> Future:
+        try:
+            return super().submit(fn, *args, **kwargs)
+        except RuntimeError:
+            # 인터프리터 종료 중(atexit flush 등)에는 새 스레드를 못 띄우므로 그 자리에서 실행
+            fut: Future = Future()
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+
+
+def _worker_pool(max_workers: int) -> ThreadPoolExecutor:
+    """현재 스크립트 컨텍스트를 물려받는 스레드 풀(워커에서도 st.cache_resource 사용 가능)."""
+    ctx = get_script_run_ctx()
+
+    def _init():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    return _WorkerPool(max_workers=max_workers, initializer=_init)
+
+
+def _image_config() -> Dict[str, Any]:
+    try:
+        return dict(st.secrets.get("images", {}))
+    except Exception:
+        return {}
+
+
+def make_image_filename(trip_name: str, date_str: str, mime: str) -> str:
+    ts = int(time.time() * 1000)
+    ext = image_pipeline.ext_for_mime(mime)
+    safe_trip = trip_name.replace(" ", "_")
+    return f"{safe_trip}_{date_str}_{ts}_{uuid.uuid4().hex[:6]}.{ext}"
+
+
+def _find_images_by_digest(service, folder_id: str, digests: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    로컬 등록부에 없는 해시를 Drive appProperties로 한 번에 조회합니다(원본 + 그 썸네일).
+    Returns: {digest: {"id": 원본 id|None, "thumbs": {"s": id, "m": id}}}
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(digests), 10):  # 쿼리 길이 제한 때문에 10개씩(해시당 조건 2개)
+        chunk = digests[start:start + 10]
+        cond = " or ".join(
+            f"appProperties has {{ key='sha256' and value='{d}' }} or appProperties has {{ key='thumb_of' and value='{d}' }}"
+            for d in chunk
+        )
+        q = f"'{folder_id}' in parents and trashed=false and ({cond})"
+        token = None
+        while True:
+            res = _execute(service.files().list(q=q, fields="nextPageToken,files(id,appProperties)",
+                                                pageSize=100, pageToken=token))
+            for f in res.get("files", []):
+                props = f.get("appProperties") or {}
+                if props.get("sha256"):
+                    entry = found.setdefault(props["sha256"], {"id": None, "thumbs": {}})
+                    entry["id"] = entry["id"] or f["id"]
+                elif props.get("thumb_of") and props.get("thumb"):
+                    entry = found.setdefault(props["thumb_of"], {"id": None, "thumbs": {}})
+                    entry["thumbs"].setdefault(props["thumb"], f["id"])
+            token = res.get("nextPageToken")
+            if not token:
+                break
+    return {d: e for d, e in found.items() if e["id"]}
+
+
+def _upload_thumbnails(service, folder_id: str, filename: str, img_bytes: bytes, digest: str) -> Dict[str, str]:
+    """썸네일(s/m)을 만들어 올리고 {"s": id, "m": id}를 돌려줍니다. 실패해도 원본 저장은 유지."""
+    thumbs: Dict[str, str] = {}
+    for key, (tb, tmime) in image_pipeline.make_thumbnails(img_bytes).items():
+        try:
+            thumbs[key] = upload_image_bytes(
+                service, folder_id, image_pipeline.thumb_filename(filename, key), tb, tmime,
+                app_properties={"thumb_of": digest, "thumb": key},
+            )
+        except Exception:
+            continue
+    return thumbs
+
+
+def upload_images_bytes(service, folder_id: str, files: List[tuple], max_workers: int = IMAGE_MAX_WORKERS) -> Dict[str, Any]:
+    """
+    여러 이미지를 동시에 업로드합니다. files: [(filename, bytes, mime), ...]
+
+    같은 내용(sha256)의 이미지는 이미 올라간 file id를 재사용하므로 업로드 바이트가 0이에요.
+    새 이미지는 image_pipeline.normalize_image(회전/축소/포맷 선택/메타데이터 제거)를 거쳐 올라갑니다.
+
+    Returns:
+      - ids: 입력 순서대로 file id (실패한 항목은 None)
+      - thumbs_by_id: 원본 file id -> 썸네일 id들
+      - failed: [(index, 오류 메시지), ...]  (성공한 항목은 그대로 유지)
+      - deduped: 업로드를 건너뛴 항목 수, bytes_skipped: 건너뛴 바이트 수
+      - orig_bytes / stored_bytes: 새로 올린 이미지의 정규화 전/후 크기
+      - elapsed_s: 전체 소요 시간
+    """
+    ids: List[Optional[str]] = [None] * len(files)
+    failed = []
+    index = _image_index()
+    t_start = time.perf_counter()
+
+    digests = [image_digest(b) for (_, b, _) in files]
+    known: Dict[str, str] = {}
+    thumbs_by_digest: Dict[str, Dict[str, str]] = {}
+    no_thumbs = set()  # 재사용하지만 썸네일을 아직 모르는 사진("thumbs" 키가 없는 등록부 항목)
+    for d in set(digests):
+        entry = index.get(d)
+        if entry:
+            known[d] = entry["id"]
+            thumbs_by_digest[d] = entry.get("thumbs") or {}
+            if "thumbs" not in entry:
+                no_thumbs.add(d)
+            index.touch(d)
+    missing = sorted(set(digests) - set(known))
+    if missing or no_thumbs:
+        try:
+            remote = _find_images_by_digest(service, folder_id, sorted(set(missing) | no_thumbs))
+        except Exception:
+            remote = {}  # 조회 실패 시 그냥 업로드(썸네일은 아래에서 다시 만듦)
+        for d, found in remote.items():
+            if d in known and found["id"] != known[d]:
+                continue
+            known[d] = found["id"]
+            if found["thumbs"]:
+                thumbs_by_digest[d] = found["thumbs"]
+                no_thumbs.discard(d)
+                index.put(d, {**(index.get(d) or {}), "id": found["id"], "used": time.time(), "thumbs": found["thumbs"]})
+            else:
+                no_thumbs.add(d)
+                index.put(d, {**(index.get(d) or {}), "id": found["id"], "used": time.time()})
+
+    # 같은 배치 안의 중복도 한 번만 업로드
+    first_idx: Dict[str, int] = {}
+    for i, d in enumerate(digests):
+        if d not in known and d not in first_idx:
+            first_idx[d] = i
+
+    config = _image_config()
+    sizes: Dict[str, tuple] = {}  # digest -> (원본 바이트, 저장 바이트)
+
+    def _one(idx: int):
+        filename, raw, mime = files[idx]
+        norm = image_pipeline.normalize_image(raw, mime or "image/png", config)
+        filename = f"{filename.rsplit('.', 1)[0]}.{norm['ext']}"
+        fid = upload_image_bytes(service, folder_id, filename, norm["bytes"], norm["mime"],
+                                 app_properties={"sha256": digests[idx]})
+        thumbs = _upload_thumbnails(service, folder_id, filename, norm["bytes"], digests[idx])
+        thumbs_by_digest[digests[idx]] = thumbs
+        sizes[digests[idx]] = (norm["orig_bytes"], norm["stored_bytes"])
+        index.put(digests[idx], {
+            "id": fid, "size": norm["stored_bytes"], "orig_size": norm["orig_bytes"],
+            "mime": norm["mime"], "thumbs": thumbs,
+        })
+        return fid
+
+    def _thumbs_for_existing(idx: int) -> None:
+        # 이미 있는 원본을 재사용하지만 썸네일이 없음 -> 가진 바이트로 썸네일만 만들어 올림
+        filename, raw, mime = files[idx]
+        d = digests[idx]
+        norm = image_pipeline.normalize_image(raw, mime or "image/png", config)
+        thumbs = _upload_thumbnails(service, folder_id, f"{filename.rsplit('.', 1)[0]}.{norm['ext']}", norm["bytes"], d)
+        thumbs_by_digest[d] = thumbs
+        index.put(d, {**(index.get(d) or {}), "id": known[d], "thumbs": thumbs})
+
+    thumb_idx = {d: digests.index(d) for d in no_thumbs if d in known}
+    if first_idx or thumb_idx:
+        jobs = len(first_idx) + len(thumb_idx)
+        with _worker_pool(max(1, min(max_workers, jobs))) as pool:
+            futures = {d: pool.submit(_one, i) for d, i in first_idx.items()}
+            thumb_futures = [pool.submit(_thumbs_for_existing, i) for i in thumb_idx.values()]
+            for d, fut in futures.items():
+                try:
+                    known[d] = fut.result()
+                except Exception as e:
+                    failed.append((first_idx[d], str(e)))
+            for fut in thumb_futures:
+                try:
+                    fut.result()
+                except Exception:
+                    pass  # 썸네일 없이도 원본은 재사용(다음 업로드나 backfill-thumbs에서 다시 시도)
+
+    failed_digests = {digests[i] for i, _ in failed}
+    deduped = 0
+    bytes_skipped = 0
+    for i, d in enumerate(digests):
+        if d in failed_digests:
+            if first_idx.get(d) != i:
+                failed.append((i, "duplicate of failed upload"))
+            continue
+        ids[i] = known.get(d)
+        if first_idx.get(d) != i:
+            deduped += 1
+            bytes_skipped += len(files[i][1])
+    failed.sort()
+    return {
+        "ids": ids,
+        # 원본 file id -> {"s": id, "m": id} (일정의 image_thumbs에 그대로 합쳐 저장)
+        "thumbs_by_id": {known[d]: thumbs_by_digest[d] for d in set(digests)
+                         if d in known and thumbs_by_digest.get(d)},
+        "failed": failed,
+        "deduped": deduped,
+        "bytes_skipped": bytes_skipped,
+        "orig_bytes": sum(o for o, _ in sizes.values()),
+        "stored_bytes": sum(b for _, b in sizes.values()),
+        "elapsed_s": time.perf_counter() - t_start,
+    }
+
+
+def image_savings_report() -> Dict[str, Any]:
+    """이미지 등록부 기준 정규화 절감량(원본 크기를 아는 항목만 집계)."""
+    count = orig = stored = 0
+    for e in _image_index().entries().values():
+        if e.get("orig_size") is None or e.get("size") is None:
+            continue
+        count += 1
+        orig += int(e["orig_size"])
+        stored += int(e["size"])
+    return {
+        "images": count,
+        "orig_bytes": orig,
+        "stored_bytes": stored,
+        "saved_bytes": orig - stored,
+        "saved_ratio": (1 - stored / orig) if orig else 0.0,
+    }
+
+
+def referenced_image_ids(db: Dict[str, Any]) -> set:
+    """db가 참조하는 모든 사진 file id(원본 + 썸네일 + 구버전 image_file_id)."""
+    refs = set()
+    for t in db.get("trips", []) or []:
+        for it in t.get("items", []) or []:
+            refs.update(it.get("image_file_ids") or [])
+            if it.get("image_file_id"):
+                refs.add(it["image_file_id"])
+            for thumbs in (it.get("image_thumbs") or {}).values():
+                refs.update((thumbs or {}).values())
+    refs.discard(None)
+    refs.discard("")
+    return refs
+
+
+def _load_json_cached(service, folder_id: str, name: str, cache_key: str, trust: bool = False) -> Optional[tuple]:
+    """
+    폴더 안의 JSON 문서를 재검증 캐시로 읽습니다. 파일이 없으면 None, 있으면 (data, meta).
+    메타데이터만 먼저 확인하고, 바뀐 경우에만 다운로드합니다.
+    trust=True이고 변경 감시가 정상이면, 변경 알림이 없었던 사본은 확인 없이 씁니다.
+    """
+    if trust and _watch_trusted():
+        hit = _db_cache().trusted(cache_key)
+        if hit is not None:
+            return hit
+    fid = find_file_in_folder(service, folder_id, name)
+    if not fid:
+        return None
+    try:
+        meta = _execute(service.files().get(fileId=fid, fields=DB_META_FIELDS))
+    except HttpError as e:
+        if not _is_not_found(e):
+            raise
+        _id_registry().forget_id(fid)
+        fid = find_file_in_folder(service, folder_id, name)
+        if not fid:
+            return None
+        meta = _execute(service.files().get(fileId=fid, fields=DB_META_FIELDS))
+    cache = _db_cache()
+    data = cache.get(cache_key, meta)
+    if data is None:
+        data = download_json(service, fid)
+        cache.put(cache_key, meta, data)
+    return data, meta
+
+
+def _shard_name(trip_id: str) -> str:
+    return f"trip_{trip_id}.json"
+
+
+def _load_shards(service, root_folder_id: str, index: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """인덱스의 md5와 로컬 사본이 다른 샤드만 (동시에) 다운로드합니다."""
+    cache = _db_cache()
+    entries = index.get("trips") or []
+    trips: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+    stale = []
+    for i, e in enumerate(entries):
+        trips[i] = cache.get(f"shard_{e['id']}", {"md5Checksum": e.get("md5")})
+        if trips[i] is None:
+            stale.append(i)
+
+    def _fetch(i: int) -> Dict[str, Any]:
+        e = entries[i]
+        fid = e.get("file_id")
+        try:
+            if not fid:
+                raise LookupError(e["id"])
+            return download_json(service, fid)
+        except (HttpError, LookupError) as err:
+            if isinstance(err, HttpError) and not _is_not_found(err):
+                raise
+            folder_id = ensure_subfolder(service, root_folder_id, TRIPS_FOLDER_NAME)
+            fid = find_file_in_folder(service, folder_id, _shard_name(e["id"]))
+            if not fid:
+                raise
+            return download_json(service, fid)
+
+    if stale:
+        with _worker_pool(max(1, min(IMAGE_MAX_WORKERS, len(stale)))) as pool:
+            futures = {i: pool.submit(_fetch, i) for i in stale}
+            for i, fut in futures.items():
+                trip = fut.result()
+                trips[i] = trip
+                cache.put(f"shard_{entries[i]['id']}", {"md5Checksum": hashlib.md5(_dump_json(trip)).hexdigest()}, trip)
+    return [t for t in trips if t is not None]
+
+
+_KEEP = object()
+
+
+def _index_meta_now(service, root_folder_id: str) -> Optional[Dict[str, Any]]:
+    fid = find_file_in_folder(service, root_folder_id, INDEX_FILENAME)
     if not fid:
-        return {"trips": []}
+        return None
+    try:
+        return _execute(service.files().get(fileId=fid, fields=DB_META_FIELDS))
+    except HttpError as e:
+        if not _is_not_found(e):
+            raise
+        _id_registry().forget_id(fid)
+        return _index_meta_now(service, root_folder_id)
+
+
+def _save_sharded(service, root_folder_id: str, db: Dict[str, Any], index: Optional[Dict[str, Any]],
+                  journal_upto: Optional[str] = None, journal_folded: Optional[List[str]] = None,
+                  expected_meta: Any = _KEEP) -> Dict[str, Any]:
+    """
+    내용(md5)이 바뀐 여행 샤드만 올리고, 목록이 바뀌었을 때만 인덱스를 갱신합니다.
+    journal_upto: 이 스냅샷에 반영된 마지막 저널 op 이름(없으면 기존 값 유지. 이력 표시용).
+    journal_folded: 이 스냅샷에 반영됐지만 아직 저널 폴더에 남아 있는 op 파일 id들(없으면 기존 값 유지).
+    expected_meta: 주면 인덱스를 쓰기 직전 Drive 인덱스 메타데이터가 이것과 같은지 확인합니다
+      (None = 아직 인덱스가 없어야 함). 다르면 ConcurrentUpdateError.
+      Drive에는 조건부 update가 없어서 '확인 후 쓰기' 방식이며, 샤드는 이미 올라갔을 수 있지만
+      저널 op는 같은 순서로 다시 적용해도 결과가 같으므로 상태가 깨지지는 않아요.
+    """
+
+    cache = _db_cache()
+    old_entries = {e["id"]: e for e in ((index or {}).get("trips") or [])}
+    new_entries = []
+    uploads = []  # (entry, content, trip)
+    for trip in db.get("trips", []) or []:
+        if not trip.get("id"):
+            trip["id"] = uuid.uuid4().hex[:12]
+        content = _dump_json(trip)
+        md5 = hashlib.md5(content).hexdigest()
+        old = old_entries.get(trip["id"]) or {}
+        entry = {"id": trip["id"], "name": trip.get("name", ""), "md5": md5, "file_id": old.get("file_id")}
+        new_entries.append(entry)
+        if old.get("md5") != md5 or not old.get("file_id"):
+            uploads.append((entry, content, trip))
+
+    if uploads:
+        folder_id = ensure_subfolder(service, root_folder_id, TRIPS_FOLDER_NAME)
+        with _worker_pool(max(1, min(IMAGE_MAX_WORKERS, len(uploads)))) as pool:
+            futures = [
+                (entry, trip, pool.submit(_upload_json_meta, service, folder_id, _shard_name(entry["id"]), None, content))
+                for entry, content, trip in uploads
+            ]
+            for entry, trip, fut in futures:
+                entry["file_id"] = fut.result()["id"]
+                cache.put(f"shard_{entry['id']}", {"md5Checksum": entry["md5"]}, trip)
+
+    new_index = {"format": INDEX_FORMAT, "trips": new_entries,
+                 "journal_upto": journal_upto or (index or {}).get("journal_upto", "")}
+    if journal_folded is None:
+        journal_folded = (index or {}).get("journal_folded")
+    if journal_folded is not None:
+        new_index["journal_folded"] = sorted(journal_folded)
+    if expected_meta is not _KEEP:
+        current = _index_meta_now(service, root_folder_id)
+        if (current is None) != (expected_meta is None) or (
+            current is not None and _meta_signature(current) != _meta_signature(expected_meta)
+        ):
+            raise ConcurrentUpdateError(INDEX_FILENAME)
+    if index is None or index != new_index:
+        meta = _upload_json_meta(service, root_folder_id, INDEX_FILENAME, new_index, _dump_json(new_index))
+        cache.put(f"index_{root_folder_id}", meta, new_index)
+    return new_index
+
+
+_journal_clock = {"last_ms": 0}
+_journal_clock_lock = threading.Lock()
+
+
+def _journal_name() -> str:
+    # 같은 프로세스에서 연속 저장해도 이름(=적용 순서)이 항상 증가하도록
+    with _journal_clock_lock:
+        ms = max(int(time.time() * 1000), _journal_clock["last_ms"] + 1)
+        _journal_clock["last_ms"] = ms
+    return f"op_{ms:013d}_{uuid.uuid4().hex[:8]}.json"
+
+
+def _journal_ts(name: str) -> float:
     try:
-        return download_json(service, fid)
+        return int(name.split("_")[1]) / 1000.0
+    except (IndexError, ValueError):
+        return 0.0
+
+
+def _list_folder(service, folder_id: str, fields: str = "id,name") -> Iterator[Dict[str, Any]]:
+    """폴더의 파일 목록(페이지 단위로 이어서 조회)."""
+    token = None
+    while True:
+        res = _execute(service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            fields=f"nextPageToken,files({fields})",
+            orderBy="name",
+            pageSize=1000,
+            pageToken=token,
+        ))
+        yield from res.get("files", [])
+        token = res.get("nextPageToken")
+        if not token:
+            return
+
+
+def _journal_files(service, folder_id: str, trust: bool) -> List[Dict[str, Any]]:
+    """저널 폴더 목록. 변경 감시가 정상이고 그 폴더에 변경 알림이 없었으면 목록 조회를 건너뜁니다."""
+    cache = _db_cache()
+    key = f"list_{folder_id}"
+    if trust and _watch_trusted():
+        hit = cache.trusted(key)
+        if hit is not None:
+            return hit[0]
+    files = list(_list_folder(service, folder_id))
+    cache.put(key, {"id": folder_id}, files)
+    return files
+
+
+def _folded_ids(index: Dict[str, Any], files: List[Dict[str, Any]]) -> set:
+    """
+    저널 폴더 목록 중 이미 스냅샷에 반영된 op 파일 id.
+
+    op 이름은 쓴 쪽의 시계로 정해지고 생성 요청은 재시도로 늦게 도착할 수 있어서, 이름 순서로
+    '여기까지 반영'을 판단하면 늦게 보인 op가 영영 빠집니다. 그래서 반영한 파일을 id로 기록해요.
+    (journal_folded가 없는 이전 형식 인덱스만 이름(journal_upto) 비교로 판단)
+    """
+    folded = index.get("journal_folded")
+    if folded is not None:
+        folded = set(folded)
+        return {f["id"] for f in files if f["id"] in folded}
+    upto = index.get("journal_upto") or ""
+    return {f["id"] for f in files if f["name"] <= upto}
+
+
+def _journal_head(index: Dict[str, Any], tail: List[Dict[str, Any]]) -> str:
+    """저장 시 비교하는 리비전: 마지막 op 이름 + tail 길이(이름이 더 이른 op가 늦게 보여도 달라지게)."""
+    if not tail:
+        return index.get("journal_upto") or ""
+    return f"{tail[-1]['name']}+{len(tail)}"
+
+
+def _journal_tail(service, root_folder_id: str, index: Dict[str, Any], trust: bool = False) -> List[Dict[str, Any]]:
+    """스냅샷에 아직 반영되지 않은 저널 op들(이름순). [{"id", "name", "ops"}...]"""
+    folder_id = ensure_subfolder(service, root_folder_id, JOURNAL_FOLDER_NAME)
+    listed = [f for f in _journal_files(service, folder_id, trust) if f["name"].startswith("op_")]
+    folded = _folded_ids(index, listed)
+    files = sorted((f for f in listed if f["id"] not in folded), key=lambda f: f["name"])
+
+    cache = _db_cache()
+    entries: List[Optional[Dict[str, Any]]] = []
+    missing = []
+    for i, f in enumerate(files):
+        data = cache.get(f"op_{f['id']}", {"id": f["id"]})  # op 파일은 불변
+        entries.append(data)
+        if data is None:
+            missing.append(i)
+    if missing:
+        with _worker_pool(max(1, min(IMAGE_MAX_WORKERS, len(missing)))) as pool:
+            futures = {i: pool.submit(download_json, service, files[i]["id"]) for i in missing}
+            for i, fut in futures.items():
+                entries[i] = fut.result()
+                cache.put(f"op_{files[i]['id']}", {"id": files[i]["id"]}, entries[i])
+    return [{"id": f["id"], "name": f["name"], "ops": (e or {}).get("ops") or []} for f, e in zip(files, entries)]
+
+
+def _load_state(service, root_folder_id: str, trust: bool = False) -> Dict[str, Any]:
+    """
+    현재 DB 상태. 인덱스가 없으면 구버전 trips.json을 이전합니다.
+    Returns: {"db": 스냅샷+저널 tail, "snapshot", "tail", "index", "index_meta", "head"}
+    head는 반영된 마지막 op 이름(저장 시 '내가 본 리비전'으로 사용).
+    trust=True면 변경 감시로 확인된 캐시를 재검증 없이 씁니다(읽기 전용 경로만. 저장은 항상 재확인).
+    """
+    loaded = _load_json_cached(service, root_folder_id, INDEX_FILENAME, f"index_{root_folder_id}", trust=trust)
+    if loaded is None:
+        # 인덱스가 없으면 구버전 trips.json -> 샤드 구조로 이전(원본 trips.json은 백업으로 남김)
+        legacy = _load_json_cached(service, root_folder_id, DB_FILENAME, f"legacy_{root_folder_id}")
+        if legacy is None:
+            empty = {"trips": []}
+            return {"db": empty, "snapshot": copy.deepcopy(empty), "tail": [], "index": None, "index_meta": None, "head": ""}
+        db = db_ops.ensure_ids(legacy[0])
+        if db.get("trips"):
+            try:
+                _save_sharded(service, root_folder_id, db, None, expected_meta=None)
+            except ConcurrentUpdateError:
+                pass  # 다른 세션이 먼저 이전함 -> 그 결과를 읽음
+            return _load_state(service, root_folder_id, trust=trust)
+        return {"db": db, "snapshot": copy.deepcopy(db), "tail": [], "index": None, "index_meta": None, "head": ""}
+
+    index, index_meta = loaded
+    snapshot = db_ops.ensure_ids({"trips": _load_shards(service, root_folder_id, index)})
+    tail = _journal_tail(service, root_folder_id, index, trust=trust)
+    db = copy.deepcopy(snapshot)
+    for entry in tail:
+        db_ops.apply_ops(db, entry["ops"])
+    return {
+        "db": db, "snapshot": snapshot, "tail": tail, "index": index, "index_meta": index_meta,
+        "head": _journal_head(index, tail),
+    }
+
+
+def _append_journal(service, root_folder_id: str, ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    folder_id = ensure_subfolder(service, root_folder_id, JOURNAL_FOLDER_NAME)
+    name = _journal_name()
+    entry = {"ts": int(time.time() * 1000), "ops": ops}
+    media = MediaIoBaseUpload(io.BytesIO(_dump_json(entry)), mimetype="application/json", resumable=False)
+    created = _create_file(service, {"name": name, "parents": [folder_id]}, media, "id,name")
+    cache = _db_cache()
+    cache.put(f"op_{created['id']}", {"id": created["id"]}, entry)
+    cache.invalidate_ids([folder_id])  # 저널 폴더 목록이 바뀜
+    return created
+
+
+def _compact_journal(service, root_folder_id: str, state: Dict[str, Any]) -> int:
+    """
+    오래된 저널 op를 스냅샷 샤드에 반영하고 archive 폴더로 옮깁니다. 반영한 op 수를 돌려줍니다.
+    인덱스가 state를 읽은 뒤 바뀌었으면 ConcurrentUpdateError.
+    """
+    cutoff = time.time() - JOURNAL_COMPACT_MIN_AGE_S
+    fold = []
+    for entry in state["tail"]:
+        if _journal_ts(entry["name"]) > cutoff:
+            break
+        fold.append(entry)
+    if not fold:
+        return 0
+
+    db = copy.deepcopy(state["snapshot"])
+    for entry in fold:
+        db_ops.apply_ops(db, entry["ops"])
+
+    journal_id = ensure_subfolder(service, root_folder_id, JOURNAL_FOLDER_NAME)
+    archive_id = ensure_subfolder(service, journal_id, JOURNAL_ARCHIVE_FOLDER_NAME)
+    # 예전에 반영했지만 옮기지 못한 op 파일도 계속 반영됨으로 기록하고 이번에 다시 옮겨 봄
+    listed = [f for f in _list_folder(service, journal_id) if f["name"].startswith("op_")]
+    leftover = _folded_ids(state["index"], listed)
+    folded = leftover | {e["id"] for e in fold}
+    _save_sharded(service, root_folder_id, db, state["index"], journal_upto=max([e["name"] for e in fold] + [state["index"].get("journal_upto") or ""]),
+                  journal_folded=sorted(folded), expected_meta=state["index_meta"])
+
+    def _move(fid: str):
+        _execute(service.files().update(fileId=fid, addParents=archive_id, removeParents=journal_id, fields="id"))
+
+    # 이동 실패는 무시(인덱스의 journal_folded 때문에 다시 적용되지는 않고, 다음 압축 때 다시 옮김)
+    with _worker_pool(max(1, min(IMAGE_MAX_WORKERS, len(folded)))) as pool:
+        for fut in [pool.submit(_move, fid) for fid in sorted(folded)]:
+            try:
+                fut.result()
+            except Exception:
+                pass
+    return len(fold)
+
+
+def _storage_config() -> Dict[str, Any]:
+    try:
+        return dict(st.secrets.get("storage", {}))
     except Exception:
-        return {"trips": []}
+        return {}
+
+
+def write_behind_enabled() -> bool:
+    """secrets.toml [storage] write_behind = true 이면 저장을 큐에 넣고 백그라운드에서 모아서 씁니다."""
+    return bool(_storage_config().get("write_behind", False))
+
+
+def watch_config() -> Dict[str, Any]:
+    """
+    secrets.toml [storage] watch_changes = true 이면 Drive 변경 피드를 감시해서 캐시를 무효화합니다.
+    그동안 load_db는 변경 알림이 없었던 인덱스/저널 목록을 재확인하지 않아요(재실행당 Drive 호출 0).
+    """
+    cfg = _storage_config()
+    try:
+        interval = float(cfg.get("watch_interval_s", WATCH_INTERVAL_S))
+    except (TypeError, ValueError):
+        interval = WATCH_INTERVAL_S
+    return {"enabled": bool(cfg.get("watch_changes", False)), "interval_s": max(1.0, interval)}
+
+
+def _apply_changes(changes: List[Dict[str, Any]]) -> bool:
+    """
+    변경 피드 콜백: 우리 폴더/파일에 관한 변경이면 해당 캐시 항목을 무효화합니다.
+    사진 폴더 밖(DB 인덱스/샤드/저널)에 관한 변경이 있었으면 True(세션 새로고침 신호).
+    """
+    cache = _db_cache()
+    known = _id_registry().known_ids()
+    known.update({fid: "cache" for fid in cache.ids()})
+    image_folders = {fid for fid, use in known.items() if use == f"folder:{IMAGES_FOLDER_NAME}"}
+    touched: set = set()
+    db_changed = False
+    for c in changes:
+        fid = c.get("file_id")
+        parents = set(c.get("parents") or [])
+        if c.get("removed"):
+            # 지운 파일은 부모를 알 수 없을 때가 많음 -> 관련 캐시를 모두 잊고, 폴더 목록은 전부 다시 확인
+            _image_cache().forget(fid)
+            _image_index().forget_id(fid)
+            if fid in known:
+                _id_registry().forget_id(fid)
+            touched.add(fid)
+            cache.invalidate_ids([fid], listings=True)
+            db_changed = db_changed or fid in known
+            continue
+        if fid not in known and not (parents & set(known)):
+            continue
+        touched.add(fid)
+        touched |= parents
+        if not (parents and parents <= image_folders):
+            db_changed = True
+    if touched:
+        cache.invalidate_ids(touched)
+    return db_changed
+
+
+@st.cache_resource(show_spinner=False)
+def _change_watcher() -> Optional[ChangeWatcher]:
+    """프로세스당 변경 감시 1개(설정이 꺼져 있으면 None)."""
+    cfg = watch_config()
+    if not cfg["enabled"]:
+        return None
+    feed = DriveChangeFeed(_drive_service, _execute)
+    return ChangeWatcher(feed, _apply_changes, cfg["interval_s"], _cache_path("changes_token.json")).start()
+
+
+def _watch_trusted() -> bool:
+    try:
+        watcher = _change_watcher()
+    except Exception:
+        return False
+    return watcher is not None and watcher.healthy()
+
+
+def change_generation() -> Optional[int]:
+    """DB 관련 변경이 감지될 때마다 늘어나는 번호. 변경 감시가 꺼져 있으면 None."""
+    watcher = _change_watcher()
+    return watcher.generation if watcher is not None else None
+
+
+def change_watcher_status() -> Dict[str, Any]:
+    watcher = _change_watcher()
+    return watcher.status() if watcher is not None else {"enabled": False}
 
 
-def save_db(root_folder_id: str, db: Dict[str, Any]) -> None:
+def _try_lock(path: str):
+    """path를 배타 잠금으로 열어 돌려줍니다. 다른 살아 있는 프로세스가 잡고 있으면 None."""
+    try:
+        f = open(path, "a+")
+    except OSError:
+        return None
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SaveQueue:
+    """
+    write-behind 저장 큐(프로세스 공용).
+
+    save_db는 op를 큐에 넣고 바로 돌아가고, 백그라운드 워커가 수정이 잠잠해지면(debounce)
+    모인 op를 한 번에 저장합니다. 대기 중인 op는 디스크에도 기록해서 프로세스가 죽어도
+    다음 시작 때 이어서 저장하고, 정상 종료 시에는 atexit에서 모두 flush 합니다.
+
+    대기 op 파일은 프로세스마다 따로 쓰고(pending_saves/pending_<pid>_<rand>.json), 살아 있는 동안
+    같은 이름의 .lock을 잡고 있습니다. 시작할 때는 잠금을 잡을 수 있는(= 주인이 죽은) 파일만 가져와요.
+    그래서 여러 워커나 maintenance.py가 서로의 op를 덮어쓰거나 두 번 저장하지 않습니다.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}  # root -> ops
+        self._first: Dict[str, float] = {}
+        self._last: Dict[str, float] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._flushing: set = set()
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._dir = _cache_path(PENDING_SAVES_DIR)
+        os.makedirs(self._dir, exist_ok=True)
+        self._path = os.path.join(self._dir, f"pending_{os.getpid()}_{uuid.uuid4().hex[:8]}.json")
+        self._lock_file = _try_lock(f"{self._path}.lock")  # 이 파일의 주인 표시(프로세스가 끝나면 풀림)
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name="trip-save-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self._shutdown)
+
+    def _persist(self) -> None:
+        try:
+            _write_json_atomic(self._path, self._pending)
+        except OSError:
+            pass
+
+    def _adopt(self, recovered: Any) -> bool:
+        if not isinstance(recovered, dict):
+            return False
+        now = time.time()
+        adopted = False
+        for root, ops in recovered.items():
+            if ops:
+                self._pending.setdefault(root, []).extend(ops)
+                self._first[root] = self._last[root] = now - WRITE_BEHIND_MAX_WAIT_S
+                adopted = True
+        return adopted
+
+    def _recover(self) -> None:
+        """주인이 죽은 대기 op 파일을 가져옵니다. 내 파일에 먼저 기록한 뒤 원래 파일을 지워요."""
+        legacy = _cache_path("pending_saves.json")  # 예전 공용 파일: 이름을 바꿔 가져간 프로세스 하나만 씀
+        claimed = os.path.join(self._dir, f"legacy_{uuid.uuid4().hex[:8]}.json")
+        try:
+            os.replace(legacy, claimed)
+        except OSError:
+            claimed = None
+        if claimed:
+            if self._adopt(_read_json(claimed)):
+                self._persist()
+            _remove_quietly(claimed)
+        if fcntl is None:
+            return
+        for name in sorted(os.listdir(self._dir)):
+            path = os.path.join(self._dir, name)
+            if not name.startswith("pending_") or not name.endswith(".json") or path == self._path:
+                continue
+            lock = _try_lock(f"{path}.lock")
+            if lock is None:
+                continue  # 주인 프로세스가 살아 있음
+            try:
+                if self._adopt(_read_json(path)):
+                    self._persist()
+                _remove_quietly(path)
+                _remove_quietly(f"{path}.lock")
+            finally:
+                lock.close()
+
+    def _shutdown(self) -> None:
+        self.flush_all()
+        with self._cond:
+            if not self._pending:
+                _remove_quietly(self._path)
+                _remove_quietly(f"{self._path}.lock")
+
+    def enqueue(self, root_folder_id: str, ops: List[Dict[str, Any]]) -> None:
+        with self._cond:
+            now = time.time()
+            self._pending.setdefault(root_folder_id, []).extend(copy.deepcopy(ops))
+            self._first.setdefault(root_folder_id, now)
+            self._last[root_folder_id] = now
+            self._persist()
+            self._cond.notify_all()
+
+    def pending_ops(self, root_folder_id: str) -> List[Dict[str, Any]]:
+        with self._cond:
+            return copy.deepcopy(self._pending.get(root_folder_id) or [])
+
+    def _due(self, now: float) -> tuple:
+        """(지금 flush할 root 또는 None, 다음 확인까지 대기 시간)"""
+        wait = None
+        for root in self._pending:
+            if root in self._flushing:
+                continue
+            due = min(self._last[root] + WRITE_BEHIND_DELAY_S, self._first[root] + WRITE_BEHIND_MAX_WAIT_S)
+            due = max(due, self._retry_at.get(root, 0.0))
+            if due <= now:
+                return root, 0.0
+            wait = due - now if wait is None else min(wait, due - now)
+        return None, wait
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                root, wait = self._due(time.time())
+                if root is None:
+                    self._cond.wait(timeout=wait)
+                    continue
+            self.flush(root)
+
+    def flush(self, root_folder_id: str) -> None:
+        with self._cond:
+            ops = copy.deepcopy(self._pending.get(root_folder_id) or [])
+            if not ops or root_folder_id in self._flushing:
+                return
+            self._flushing.add(root_folder_id)
+            self._status[root_folder_id] = {**self._status.get(root_folder_id, {}), "state": "flushing"}
+        try:
+            outcome = _flush_ops(root_folder_id, ops)
+        except Exception as e:
+            with self._cond:
+                self._flushing.discard(root_folder_id)
+                self._retry_at[root_folder_id] = time.time() + WRITE_BEHIND_RETRY_S
+                self._status[root_folder_id] = {**self._status.get(root_folder_id, {}), "state": "error", "last_error": str(e)}
+                self._cond.notify_all()
+            return
+        with self._cond:
+            self._flushing.discard(root_folder_id)
+            self._retry_at.pop(root_folder_id, None)
+            rest = (self._pending.get(root_folder_id) or [])[len(ops):]  # flush 중에 새로 들어온 op는 유지
+            if rest:
+                self._pending[root_folder_id] = rest
+                self._first[root_folder_id] = time.time()
+            else:
+                self._pending.pop(root_folder_id, None)
+                self._first.pop(root_folder_id, None)
+                self._last.pop(root_folder_id, None)
+            self._persist()
+            prev = self._status.get(root_folder_id, {})
+            self._status[root_folder_id] = {
+                "state": "pending" if rest else "flushed",
+                "last_flush": time.time(),
+                "last_outcome": outcome,
+                "flushes": prev.get("flushes", 0) + (outcome == "saved"),
+                "skipped": prev.get("skipped", 0) + (outcome == "unchanged"),
+                "last_error": None,
+            }
+            self._cond.notify_all()
+
+    def flush_all(self, timeout: float = 30.0) -> None:
+        """종료 시: 워커가 저장 중인 root는 끝날 때까지 기다린 뒤, 그 사이 남은 op까지 저장합니다."""
+        deadline = time.time() + timeout
+        with self._cond:
+            roots = list(self._pending)
+        for root in roots:
+            with self._cond:
+                while root in self._flushing and time.time() < deadline:
+                    self._cond.wait(timeout=deadline - time.time())
+                if root in self._flushing:
+                    return
+            self.flush(root)
+
+    def status(self, root_folder_id: str) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._status.get(root_folder_id) or {"state": "flushed"})
+            n = len(self._pending.get(root_folder_id) or [])
+            out["pending_ops"] = n
+            if n and out.get("state") not in ("flushing", "error"):
+                out["state"] = "pending"
+            return out
+
+
+@st.cache_resource(show_spinner=False)
+def _save_queue() -> SaveQueue:
+    return SaveQueue()
+
+
+def _flush_ops(root_folder_id: str, ops: List[Dict[str, Any]]) -> str:
+    """큐에 모인 op를 최신 상태 위에 적용해 한 번에 저장. 결과가 그대로면 업로드하지 않아요."""
+    service = _drive_service()
+    state = _load_state(service, root_folder_id)
+    merged = db_ops.apply_ops(copy.deepcopy(state["db"]), ops)
+    if _dump_json(merged) == _dump_json(state["db"]):
+        return "unchanged"
+    db = TripDB(state["db"])
+    db.head = state["head"]
+    db.clear()
+    db.update(merged)
+    _save_db_now(root_folder_id, db)
+    return "saved"
+
+
+def save_status(root_folder_id: str) -> Dict[str, Any]:
+    """write-behind 저장 상태: {"enabled", "state": pending/flushing/flushed/error, "pending_ops", ...}"""
+    if not write_behind_enabled():
+        return {"enabled": False, "state": "flushed", "pending_ops": 0}
+    return {"enabled": True, **_save_queue().status(root_folder_id)}
+
+
+def save_status_label(status: Dict[str, Any]) -> str:
+    state = status.get("state")
+    if state == "pending":
+        return f"💾 저장 대기 중… ({status.get('pending_ops', 0)}건)"
+    if state == "flushing":
+        return "💾 저장 중…"
+    if state == "error":
+        return f"⚠️ 저장 재시도 예정: {status.get('last_error') or ''}"
+    return "✅ 모두 저장됨"
+
+
+def _state_rev(root_folder_id: str, state: Dict[str, Any]) -> str:
+    """저장소 리비전 식별자: 스냅샷(인덱스 파일 버전) + 그 위에 반영된 저널 op."""
+    version = state["index_meta"].get("version") or state["index_meta"].get("modifiedTime")
+    return f"drive:{root_folder_id}:{version}:{len(state['tail'])}:{state['head']}"
+
+
+def load_db(root_folder_id: str, trust: bool = True) -> Dict[str, Any]:
+    """trust=False면 변경 감시가 정상이어도 Drive에서 최신 여부를 다시 확인합니다(유지보수용)."""
+    try:
+        service = _drive_service()
+        _change_watcher()  # 설정돼 있으면 변경 감시 시작(프로세스당 1개)
+        state = _load_state(service, root_folder_id, trust=trust)
+        db = state["db"]
+        pending = _save_queue().pending_ops(root_folder_id) if write_behind_enabled() else []
+        if pending:
+            # 아직 저장되지 않은 내 변경도 화면에 보이도록 큐의 op를 얹어서 돌려줌
+            db = db_ops.apply_ops(db, pending)
+        out = TripDB(db)
+        out.head = state["head"]
+        if state["index_meta"] and not pending:
+            out.rev = _state_rev(root_folder_id, state)
+        return out
+    except Exception as e:
+        # 빈 DB로 돌려주면 그 위에 저장해서 실제 데이터를 덮어쓸 수 있으므로 구분되는 오류로 올림
+        raise StorageUnavailableError(f"여행 데이터를 불러오지 못했어요: {e}") from e
+
+
+def save_db(root_folder_id: str, db: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    DB 저장. write-behind 모드면 바뀐 op만 큐에 넣고 바로 돌아가며(save_status로 상태 확인),
+    아니면 _save_db_now로 바로 저장합니다.
+    """
+    if not write_behind_enabled():
+        return _save_db_now(root_folder_id, db)
+    base = db.base if isinstance(db, TripDB) else load_db(root_folder_id)
+    ops = db_ops.diff_db(base, db)
+    if ops:
+        _save_queue().enqueue(root_folder_id, ops)
+    if isinstance(db, TripDB):
+        db.rebase()
+    return {"ops": len(ops), "queued": True, "merged_ops": 0, "conflicts": []}
+
+
+def _save_db_now(root_folder_id: str, db: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    불러온 시점(base) 대비 바뀐 부분만 저널 op 파일 하나로 기록합니다(보통 수백 바이트).
+
+    낙관적 동시성: 저장 직전에 Drive의 최신 리비전(head)을 확인해서, 세션이 불러온 뒤 다른 사람이
+    저장했다면 base/상대/내 변경을 일정(id) 단위로 3-way merge 합니다. 저널은 덧붙이기만 하므로
+    서로 다른 일정을 동시에 고쳐도 기다리거나 잃어버리는 변경이 없어요. 세션의 db는 병합 결과로 갱신됩니다.
+    op가 JOURNAL_COMPACT_EVERY개 이상 쌓이면 스냅샷(여행별 샤드)으로 압축합니다.
+
+    Returns: {"ops": 내 op 수, "merged_ops": 함께 반영된 다른 세션 op 수, "conflicts": [...]}
+    """
+    service = _drive_service()
+    if isinstance(db, TripDB):
+        base, head = db.base, db.head
+    else:
+        st_ = _load_state(service, root_folder_id)
+        base, head = st_["db"], st_["head"]
+
+    ops = db_ops.diff_db(base, db)
+    result: Dict[str, Any] = {"ops": len(ops), "merged_ops": 0, "conflicts": []}
+    if not ops:
+        return result
+
+    for _attempt in range(SAVE_MAX_RETRIES):
+        state = _load_state(service, root_folder_id)
+        merged, theirs, conflicts = db_ops.merge_onto(base, state["db"], ops, concurrent=state["head"] != head)
+        result["merged_ops"], result["conflicts"] = len(theirs), conflicts
+
+        if state["index"] is None:
+            # 완전히 새 DB -> 저널 없이 첫 스냅샷(그 사이 다른 세션이 만들었으면 다시 시도)
+            try:
+                _save_sharded(service, root_folder_id, merged, None, expected_meta=None)
+            except ConcurrentUpdateError:
+                continue
+            new_head = ""
+            break
+
+        created = _append_journal(service, root_folder_id, ops)
+        tail = state["tail"] + [{"id": created["id"], "name": created["name"], "ops": ops}]
+        new_head = _journal_head(state["index"], tail)
+        if len(tail) >= JOURNAL_COMPACT_EVERY:
+            try:
+                _compact_journal(service, root_folder_id, {**state, "tail": tail})
+            except ConcurrentUpdateError:
+                pass  # 다른 세션이 압축 중 -> 다음 저장 때 다시
+        break
+    else:
+        raise ConcurrentUpdateError("다른 세션과 저장이 계속 겹쳐서 저장하지 못했어요.")
+
+    if isinstance(db, TripDB):
+        if theirs:
+            db.clear()
+            db.update(merged)
+        db.rebase()
+        db.head = new_head
+    return result
+
+
+def read_journal(root_folder_id: str, include_archived: bool = True) -> List[Dict[str, Any]]:
+    """저널 op 이력(이름=시간순). 이력 확인/재생용: db_ops.apply_ops로 스냅샷에 다시 적용할 수 있어요."""
     service = _drive_service()
-    upload_json(service, root_folder_id, DB_FILENAME, db)
+    journal_id = ensure_subfolder(service, root_folder_id, JOURNAL_FOLDER_NAME)
+    files = [f for f in _list_folder(service, journal_id) if f["name"].startswith("op_")]
+    if include_archived:
+        archive_id = ensure_subfolder(service, journal_id, JOURNAL_ARCHIVE_FOLDER_NAME)
+        files += [f for f in _list_folder(service, archive_id) if f["name"].startswith("op_")]
+    files.sort(key=lambda f: f["name"])
+    out = []
+    for f in files:
+        entry = _db_cache().get(f"op_{f['id']}", {"id": f["id"]})
+        if entry is None:
+            entry = download_json(service, f["id"])
+            _db_cache().put(f"op_{f['id']}", {"id": f["id"]}, entry)
+        out.append({"name": f["name"], "ts": entry.get("ts"), "ops": entry.get("ops") or []})
+    return out
 
 
 def get_image_bytes(image_file_id: str) -> Optional[bytes]:
     if not image_file_id:
         return None
+    cache = _image_cache()
+    data = cache.get(image_file_id)
+    if data is not None:
+        return data
     try:
         service = _drive_service()
-        return download_bytes(service, image_file_id)
+        data = download_bytes(service, image_file_id)
+        cache.put(image_file_id, data)
+        return data
+    except HttpError as e:
+        if _is_not_found(e):
+            _image_index().forget_id(image_file_id)
+            cache.forget(image_file_id)
+        return None
     except Exception:
         return None
 
 
+def get_images_bytes(image_file_ids: List[str], max_workers: int = IMAGE_MAX_WORKERS) -> Iterator[tuple]:
+    """
+    여러 이미지를 동시에 다운로드하면서, 끝나는 순서대로 (index, file_id, bytes|None)를 내보냅니다.
+    갤러리는 먼저 도착한 사진부터 바로 그릴 수 있어요.
+    """
+    ids = list(image_file_ids or [])
+    if not ids:
+        return
+    with _worker_pool(max(1, min(max_workers, len(ids)))) as pool:
+        futures = {pool.submit(get_image_bytes, fid): i for i, fid in enumerate(ids)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            yield i, ids[i], fut.result()
+
+
+def preview_image_ids(item: Dict[str, Any], size: str = "m") -> List[str]:
+    """일정의 사진들을 미리보기용(썸네일 우선) id 목록으로 바꿉니다. 원본은 image_file_ids."""
+    thumbs = item.get("image_thumbs") or {}
+    return [image_pipeline.pick_preview_id(fid, thumbs.get(fid), size) for fid in (item.get("image_file_ids") or [])]
+
+
+def backfill_thumbnails(root_folder_id: str, max_workers: int = IMAGE_MAX_WORKERS) -> Dict[str, int]:
+    """썸네일 없이 저장된 사진에 썸네일을 만들어 붙입니다(유지보수용, 한 번에 저장)."""
+    db = load_db(root_folder_id)
+    service = _drive_service()
+    folder_id = ensure_subfolder(service, root_folder_id, IMAGES_FOLDER_NAME)
+    index = _image_index()
+    known_thumbs = {e["id"]: e.get("thumbs") for e in index.entries().values() if e.get("id")}
+
+    todo: Dict[str, List[Dict[str, Any]]] = {}
+    for t in db.get("trips", []) or []:
+        for it in t.get("items", []) or []:
+            have = it.get("image_thumbs") or {}
+            for fid in it.get("image_file_ids") or []:
+                if fid not in have:
+                    todo.setdefault(fid, []).append(it)
+
+    def _one(fid: str) -> Optional[Dict[str, str]]:
+        if known_thumbs.get(fid):
+            return known_thumbs[fid]
+        raw = get_image_bytes(fid)
+        if not raw:
+            return None
+        digest = image_digest(raw)
+        thumbs = _upload_thumbnails(service, folder_id, f"{fid}.jpg", raw, digest)
+        index.put(digest, {"id": fid, "size": len(raw), "thumbs": thumbs})
+        return thumbs
+
+    stats = {"images": len(todo), "thumbnailed": 0, "small": 0, "failed": 0}
+    if not todo:
+        return stats
+    with _worker_pool(max(1, min(max_workers, len(todo)))) as pool:
+        futures = {pool.submit(_one, fid): fid for fid in todo}
+        for fut in as_completed(futures):
+            fid = futures[fut]
+            try:
+                thumbs = fut.result()
+            except Exception:
+                thumbs = None
+            if thumbs is None:
+                stats["failed"] += 1
+                continue
+            # 작은 원본은 썸네일이 없어도 '처리됨'으로 기록(빈 dict)해 다음 백필에서 건너뜀
+            for it in todo[fid]:
+                it.setdefault("image_thumbs", {})[fid] = thumbs
+            stats["thumbnailed" if thumbs else "small"] += 1
+    save_db(root_folder_id, db)
+    return stats
+
+
+def _parse_drive_time(value: Optional[str]) -> float:
+    try:
+        return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return time.time()  # 모르면 '방금 만든 파일'로 보고 남김
+
+
+def find_orphan_images(root_folder_id: str, grace_s: float = IMAGE_GC_GRACE_S) -> Dict[str, Any]:
+    """
+    images 폴더를 페이지 단위로 훑으며 어떤 일정도 참조하지 않는 파일을 찾습니다(삭제는 안 함).
+
+    남기는 파일:
+      - db(저장 대기 중인 op 포함)가 참조하는 원본/썸네일
+      - 참조되는 원본의 썸네일(appProperties.thumb_of) — 중복 업로드 재사용 때 다시 붙음
+      - 유예 기간 안에 만들었거나 재사용된 파일 — 업로드 후 아직 저장 전일 수 있음
+
+    Returns: {"orphans": [{"id", "name", "size", "created"}...], "listed", "referenced", "young", "orphan_bytes"}
+    """
+    db = load_db(root_folder_id, trust=False)
+    refs = referenced_image_ids(db)
+    service = _drive_service()
+    folder_id = ensure_subfolder(service, root_folder_id, IMAGES_FOLDER_NAME)
+    cutoff = time.time() - grace_s
+    recently_used = set()
+    for e in _image_index().entries().values():
+        if e.get("used", 0) >= cutoff:
+            recently_used.add(e.get("id"))
+            recently_used.update((e.get("thumbs") or {}).values())
+
+    listed = 0
+    referenced_digests = set()
+    candidates = []
+    young = 0
+    for f in _list_folder(service, folder_id, fields=IMAGE_GC_FIELDS):
+        listed += 1
+        props = f.get("appProperties") or {}
+        if f["id"] in refs:
+            if props.get("sha256"):
+                referenced_digests.add(props["sha256"])
+            continue
+        if f["id"] in recently_used or _parse_drive_time(f.get("createdTime")) >= cutoff:
+            young += 1
+            continue
+        candidates.append(f)
+    # 썸네일은 원본을 다 본 다음에 판단(목록이 이름순이라 원본보다 먼저 나올 수 있음)
+    orphans = [
+        {"id": f["id"], "name": f.get("name"), "size": int(f.get("size") or 0), "created": f.get("createdTime")}
+        for f in candidates
+        if (f.get("appProperties") or {}).get("thumb_of") not in referenced_digests
+    ]
+    return {
+        "orphans": orphans, "listed": listed, "referenced": listed - len(orphans) - young,
+        "young": young, "orphan_bytes": sum(o["size"] for o in orphans),
+    }
+
+
+def _batch_delete(service, file_ids: List[str]) -> tuple:
+    """file id들을 batch 요청(최대 IMAGE_GC_BATCH개씩)으로 삭제. (삭제된 id, {실패 id: 오류})"""
+    deleted: List[str] = []
+    failed: Dict[str, str] = {}
+    todo = list(file_ids)
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        retry: List[str] = []
+        for start in range(0, len(todo), IMAGE_GC_BATCH):
+            chunk = todo[start:start + IMAGE_GC_BATCH]
+
+            def _done(request_id, _response, exception):
+                fid = chunk[int(request_id)]
+                if exception is None or _is_not_found(exception):
+                    deleted.append(fid)
+                elif _retry_decision(exception)[0]:
+                    retry.append(fid)
+                else:
+                    failed[fid] = str(exception)
+
+            batch = service.new_batch_http_request(callback=_done)
+            for i, fid in enumerate(chunk):
+                batch.add(service.files().delete(fileId=fid), request_id=str(i))
+            _execute(batch)
+        if not retry:
+            break
+        # 배치 안의 일부가 속도 제한에 걸림 -> 그것만 백오프 후 다시
+        time.sleep(random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * (2 ** attempt))))
+        todo = retry
+    else:
+        failed.update({fid: "retries exhausted" for fid in retry})
+    return deleted, failed
+
+
+def collect_orphan_images(root_folder_id: str, dry_run: bool = True,
+                          grace_s: float = IMAGE_GC_GRACE_S) -> Dict[str, Any]:
+    """
+    참조되지 않는 사진 파일 정리. dry_run이면 보고만 합니다.
+    일정 삭제/사진 빼기는 db에서만 빠지므로, 남은 파일은 이걸로 주기적으로 지워요(maintenance.py gc-images).
+    """
+    found = find_orphan_images(root_folder_id, grace_s)
+    orphans = found.pop("orphans")
+    report = {
+        **found, "dry_run": dry_run, "orphans": len(orphans), "deleted": 0, "failed": {},
+        "sample": [o["name"] for o in orphans[:20]],
+    }
+    if dry_run or not orphans:
+        return report
+    # 목록을 훑는 사이 저장된 일정이 고아 후보를 다시 참조했을 수 있으므로 지우기 직전에 한 번 더 확인
+    refs = referenced_image_ids(load_db(root_folder_id, trust=False))
+    ids = [o["id"] for o in orphans if o["id"] not in refs]
+    deleted, failed = _batch_delete(_drive_service(), ids)
+    for fid in deleted:
+        _image_index().forget_id(fid)
+        _image_cache().forget(fid)
+    gone = set(deleted)
+    report.update(deleted=len(deleted), failed=failed,
+                  deleted_bytes=sum(o["size"] for o in orphans if o["id"] in gone))
+    return report
+
+
 def list_trip_names(db: Dict[str, Any]) -> List[str]:
     return [t.get("name", "") for t in db.get("trips", []) if t.get("name")]
 
@@ -0,0 +1,197 @@
+"""
+지오코딩 결과 영구 저장소(SQLite). 같은 서버의 모든 워커 프로세스가 파일 하나를 공유하고 재시작 후에도 남습니다.
+
+- 키: 정규화한 주소 + 언어. 공백/전각 문자/대소문자 차이는 같은 주소로 봐요.
+- 찾은 좌표는 만료 없이 보관(장소는 거의 안 움직임), 못 찾은 주소는 NEGATIVE_TTL_S 동안만 기억해서
+  잠깐의 실패나 나중에 등록된 장소는 다시 시도합니다. 네트워크 오류는 저장하지 않아요.
+- 적중/미스 횟수는 프로세스별로 세고, 주기적으로 파일에도 누적합니다.
+- 지도 단축 링크(maps.app.goo.gl) -> 펼친 URL도 같은 파일에 영구 보관합니다(단축 링크는 바뀌지 않음).
+
+secrets.toml:
+    [geocode]
+    cache_path = "/path/to/geo_cache.sqlite3"   # 기본: 캐시 폴더(TRIP_PLANNER_CACHE_DIR)/geo_cache.sqlite3
+    negative_ttl_h = 24
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app_runtime import CACHE_DIR, process_singleton, secret_num, secret_section
+
+NEGATIVE_TTL_S = 24 * 3600
+STATS_FLUSH_EVERY = 50  # 조회 N번마다 적중/미스 횟수를 파일에 누적
+
+Coord = Tuple[float, float]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    key TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    lat REAL,
+    lng REAL,
+    created REAL NOT NULL,
+    expires REAL
+);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS short_links (short TEXT PRIMARY KEY, expanded TEXT NOT NULL, created REAL NOT NULL);
+"""
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_address(addr: str) -> str:
+    """'  서울  강남구 ' / '서울 강남구' / 전각 문자 -> 같은 키."""
+    text = unicodedata.normalize("NFKC", addr or "")
+    return _WS.sub(" ", text).strip().casefold()
+
+
+def _config() -> Dict[str, Any]:
+    cfg = secret_section("geocode")
+    return {
+        "path": cfg.get("cache_path") or os.path.join(CACHE_DIR, "geo_cache.sqlite3"),
+        "negative_ttl_s": secret_num(cfg, "negative_ttl_h", NEGATIVE_TTL_S / 3600) * 3600,
+    }
+
+
+class GeoCache:
+    def __init__(self, path: str, negative_ttl_s: float = NEGATIVE_TTL_S):
+        self.path = path
+        self.negative_ttl_s = negative_ttl_s
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+        self._unflushed: Dict[str, int] = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # 연결은 스레드마다 하나. 여러 프로세스가 같은 파일을 쓰므로 WAL + 잠금 대기
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+            self._unflushed[name] = self._unflushed.get(name, 0) + 1
+            if sum(self._unflushed.values()) < STATS_FLUSH_EVERY:
+                return
+            pending, self._unflushed = self._unflushed, {}
+        self._flush_counters(pending)
+
+    def _flush_counters(self, pending: Dict[str, int]) -> None:
+        try:
+            self._conn().executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(pending.items()),
+            )
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _key(address: str, lang: str) -> str:
+        return f"{lang}|{normalize_address(address)}"
+
+    def get(self, address: str, lang: str) -> Tuple[bool, Optional[Coord]]:
+        """(저장돼 있는지, 좌표|None). 못 찾은 주소가 아직 유효하면 (True, None)."""
+        try:
+            row = self._conn().execute(
+                "SELECT lat, lng, expires FROM geocode WHERE key=?", (self._key(address, lang),)
+            ).fetchone()
+        except sqlite3.Error:
+            self._count("errors")
+            return False, None
+        if row is None or (row[2] is not None and row[2] < time.time()):
+            self._count("misses")
+            return False, None
+        if row[0] is None:
+            self._count("negative_hits")
+            return True, None
+        self._count("hits")
+        return True, (float(row[0]), float(row[1]))
+
+    def put(self, address: str, lang: str, coord: Optional[Coord]) -> None:
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO geocode (key, address, lang, lat, lng, created, expires)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(address, lang), address, lang,
+                    coord[0] if coord else None, coord[1] if coord else None,
+                    now, None if coord else now + self.negative_ttl_s,
+                ),
+            )
+            self._count("stores")
+        except sqlite3.Error:
+            self._count("errors")
+
+    def geocode_or_raise(self, address: str, lang: str, lookup: Callable[[str], Optional[Coord]]) -> Optional[Coord]:
+        """저장된 결과가 있으면 그대로, 없으면 lookup(address)로 찾아서 저장. lookup의 예외는 저장 없이 그대로 올림."""
+        found, coord = self.get(address, lang)
+        if found:
+            return coord
+        coord = lookup(address)
+        self.put(address, lang, coord)
+        return coord
+
+    def get_short_link(self, short: str) -> Optional[str]:
+        try:
+            row = self._conn().execute("SELECT expanded FROM short_links WHERE short=?", (short,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def put_short_link(self, short: str, expanded: str) -> None:
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO short_links (short, expanded, created) VALUES (?, ?, ?)",
+                (short, expanded, time.time()),
+            )
+        except sqlite3.Error:
+            self._count("errors")
+
+    def stats(self) -> Dict[str, Any]:
+        """{"process": 이 프로세스 집계, "total": 모든 프로세스 누적, "entries", "negative_entries"}"""
+        with self._lock:
+            process = dict(self._stats)
+            pending, self._unflushed = self._unflushed, {}
+        if pending:
+            self._flush_counters(pending)
+        try:
+            conn = self._conn()
+            total = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, negative = conn.execute(
+                "SELECT COUNT(*), COUNT(*) - COUNT(lat) FROM geocode"
+            ).fetchone()
+            short_links = conn.execute("SELECT COUNT(*) FROM short_links").fetchone()[0]
+        except sqlite3.Error:
+            total, entries, negative, short_links = {}, 0, 0, 0
+        lookups = process["hits"] + process["negative_hits"] + process["misses"]
+        return {
+            "process": {**process, "hit_ratio": (lookups - process["misses"]) / lookups if lookups else 0.0},
+            "total": total, "entries": entries, "negative_entries": negative, "short_links": short_links,
+        }
+
+
+def _new_geo_cache() -> GeoCache:
+    """프로세스 공용 GeoCache. Streamlit 밖(유지보수 스크립트)에서도 씁니다."""
+    cfg = _config()
+    return GeoCache(cfg["path"], cfg["negative_ttl_s"])
+
+
+geo_cache = process_singleton(_new_geo_cache)
+
+
+def geo_cache_stats() -> Dict[str, Any]:
+    return geo_cache().stats()
@@ -0,0 +1,190 @@
+"""
+Nominatim 지오코딩 대기열(프로세스당 1개).
+
+Nominatim 사용 정책(초당 1회)을 여기 한 곳에서 지킵니다. 워커 스레드 하나가 Nominatim 인스턴스 하나로
+대기 중인 주소를 차례로 조회하고, 결과는 geo_cache(SQLite)에 저장합니다.
+
+- 같은 주소(정규화 기준)는 한 번만 대기열에 들어가고, 기다리던 모든 화면이 같은 결과를 받아요.
+- 화면은 보이는 일정의 주소를 map_utils.resolve_coords로 한 번에 넣습니다(대기열 순서 = 넣은 순서).
+- resolve_many는 최대 timeout초만 기다리고, 그때까지 못 찾은 주소는 None(다음 재실행에 캐시에서 나옴).
+  초당 1건이라 주소가 많으면 오래 걸리므로 호출 쪽은 짧게만 기다립니다:
+  화면 그리기는 render_wait_s(그 화면이 넣은 주소가 끝나면 map_utils.refresh_when_geocoded가 새로고침),
+  저장 시 좌표 계산은 wait_s(못 끝낸 일정은 화면에서 계산하고 backfill-coords로 채움).
+
+secrets.toml:
+    [geocode]
+    min_interval_s = 1.0
+    wait_s = 3
+    render_wait_s = 0.5
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import streamlit as st
+
+from app_runtime import secret_num, secret_section
+from geo_cache import Coord, geo_cache, normalize_address
+
+MIN_INTERVAL_S = 1.0  # Nominatim 정책: 초당 최대 1회
+WAIT_S = 3.0  # 저장할 때 좌표 계산을 기다리는 최대 시간
+RENDER_WAIT_S = 0.5  # 화면을 그릴 때 기다리는 최대 시간
+
+
+def _config() -> Dict[str, float]:
+    cfg = secret_section("geocode")
+    return {
+        "min_interval_s": max(1.0, secret_num(cfg, "min_interval_s", MIN_INTERVAL_S)),
+        "wait_s": max(0.0, secret_num(cfg, "wait_s", WAIT_S)),
+        "render_wait_s": max(0.0, secret_num(cfg, "render_wait_s", RENDER_WAIT_S)),
+    }
+
+
+class GeocodeQueue:
+    """
+    lookup(address) -> (lat,lng)|None (못 찾음) / 예외(일시 오류). lookup은 워커 스레드에서만 불려요.
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[Coord]], lang: str, min_interval_s: float = MIN_INTERVAL_S):
+        self.lookup = lookup
+        self.lang = lang
+        self.min_interval_s = min_interval_s
+        self._cond = threading.Condition()
+        self._pending: "OrderedDict[str, tuple]" = OrderedDict()  # 정규화 키 -> (주소, Future)
+        self._inflight: Dict[str, Future] = {}
+        self._last_call = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"submitted": 0, "deduped": 0, "cached": 0, "lookups": 0, "errors": 0}
+
+    def submit(self, address: str) -> Future:
+        """주소 하나의 결과 Future. 캐시에 있으면 바로 끝난 Future, 이미 대기 중이면 같은 Future."""
+        key = normalize_address(address)
+        fut: Future = Future()
+        if not key:
+            fut.set_result(None)
+            return fut
+        with self._cond:
+            self.stats["submitted"] += 1
+            waiting = self._pending.get(key)
+            if waiting is not None or key in self._inflight:
+                self.stats["deduped"] += 1
+                return waiting[1] if waiting is not None else self._inflight[key]
+        found, coord = geo_cache().get(address, self.lang)
+        if found:
+            with self._cond:
+                self.stats["cached"] += 1
+            fut.set_result(coord)
+            return fut
+        with self._cond:
+            # 캐시를 보는 사이 다른 화면이 넣었으면 그걸 씀
+            waiting = self._pending.get(key)
+            if waiting is not None or key in self._inflight:
+                self.stats["deduped"] += 1
+                return waiting[1] if waiting is not None else self._inflight[key]
+            self._pending[key] = (address, fut)
+            self._ensure_worker()
+            self._cond.notify()
+        return fut
+
+    def submit_many(self, addresses: Iterable[str]) -> Dict[str, Future]:
+        return {a: self.submit(a) for a in dict.fromkeys(a for a in addresses if a)}
+
+    def resolve_many(self, addresses: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Optional[Coord]]:
+        """{주소: 좌표|None}. timeout초 안에 끝나지 않은 주소는 None."""
+        futures = self.submit_many(addresses)
+        if futures:
+            wait(list(futures.values()), timeout=timeout)
+        return {a: (f.result() if f.done() and not f.exception() else None) for a, f in futures.items()}
+
+    def waiting(self, addresses: Iterable[str]) -> List[str]:
+        """addresses 중 아직 대기 중이거나 조회 중인 주소(결과가 곧 geo_cache에 들어올 것들)."""
+        with self._cond:
+            busy = set(self._pending) | set(self._inflight)
+        return [a for a in dict.fromkeys(addresses) if a and normalize_address(a) in busy]
+
+    def depth(self) -> int:
+        """대기 중 + 조회 중인 주소 수."""
+        with self._cond:
+            return len(self._pending) + len(self._inflight)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="geocode-queue", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                key, (address, fut) = self._pending.popitem(last=False)
+                self._inflight[key] = fut
+            coord, error = None, None
+            try:
+                # 대기 중에 다른 프로세스가 캐시에 넣은 주소는 기다림 없이 바로 끝남
+                coord = geo_cache().geocode_or_raise(address, self.lang, self._spaced_lookup)
+            except Exception as e:
+                error = e
+            with self._cond:
+                self._inflight.pop(key, None)
+                self.stats["errors"] += int(error is not None)
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(coord)
+
+    def _spaced_lookup(self, address: str) -> Optional[Coord]:
+        """실제 네트워크 조회만 min_interval_s 간격을 지킵니다(캐시 적중은 geocode_or_raise가 먼저 돌려줌)."""
+        delay = self._last_call + self.min_interval_s - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            return self.lookup(address)
+        finally:
+            self._last_call = time.monotonic()
+            with self._cond:
+                self.stats["lookups"] += 1
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self.stats, "depth": len(self._pending) + len(self._inflight)}
+
+
+_queues: Dict[str, GeocodeQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def _make_queue(lookup: Callable[[str], Optional[Coord]], lang: str) -> GeocodeQueue:
+    with _queues_lock:
+        q = _queues.get(lang)
+        if q is None:
+            q = _queues[lang] = GeocodeQueue(lookup, lang, _config()["min_interval_s"])
+        return q
+
+
+@st.cache_resource(show_spinner=False)
+def _queue_resource(lang: str, _lookup: Callable[[str], Optional[Coord]]) -> GeocodeQueue:
+    return _make_queue(_lookup, lang)
+
+
+def geocode_queue(lookup: Callable[[str], Optional[Coord]], lang: str) -> GeocodeQueue:
+    """언어별 프로세스 공용 대기열(페이지가 다시 import돼도 같은 워커/속도 제한을 씀)."""
+    try:
+        return _queue_resource(lang, lookup)
+    except Exception:
+        return _make_queue(lookup, lang)
+
+
+def wait_s() -> float:
+    return _config()["wait_s"]
+
+
+def render_wait_s() -> float:
+    return _config()["render_wait_s"]
+
+
+def queue_status() -> List[Dict[str, Any]]:
+    with _queues_lock:
+        return [{"lang": lang, **q.status()} for lang, q in _queues.items()]
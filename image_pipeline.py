@@ -0,0 +1,150 @@
+import io
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# 미리보기용 썸네일 크기(긴 변 픽셀)
+THUMB_SIZES = {"s": 320, "m": 1024}
+THUMB_QUALITY = 80
+
+# 업로드 전 정규화 기본값. secrets.toml의 [images] 섹션으로 덮어쓸 수 있어요.
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "max_dim": 2560,  # 긴 변 최대 픽셀
+    "quality": 82,  # WebP/JPEG 품질
+    "formats": ["webp", "jpeg", "png"],  # 후보 포맷(가장 작은 결과를 선택)
+}
+
+MIME_EXT = {"image/webp": "webp", "image/jpeg": "jpg", "image/jpg": "jpg", "image/png": "png", "image/gif": "gif"}
+_FORMAT_MIME = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+def _open_upright(raw: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(raw))
+    return ImageOps.exif_transpose(img)
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    if img.mode in ("RGB", "L"):
+        return img
+    if img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
+        bg = Image.new("RGB", rgba.size, (255, 255, 255))
+        bg.paste(rgba, mask=rgba.split()[-1])
+        return bg
+    return img.convert("RGB")
+
+
+def ext_for_mime(mime: str) -> str:
+    return MIME_EXT.get((mime or "").lower(), "jpg")
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    if img.mode in ("RGBA", "LA"):
+        return img.getextrema()[-1][0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        _to_rgb(img).save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def normalize_image(raw: bytes, mime: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    업로드 전 이미지 정규화:
+    - EXIF 방향대로 회전, 긴 변을 max_dim 이하로 축소
+    - 후보 포맷(WebP/JPEG/PNG) 중 가장 작은 결과 선택(투명도가 있으면 JPEG 제외)
+    - 재인코딩으로 EXIF/GPS 등 메타데이터 제거
+
+    Returns: {"bytes", "mime", "ext", "orig_bytes", "stored_bytes", "width", "height"}
+    이미지를 열 수 없거나, 어떤 후보도 원본보다 작지 않으면 원본을 그대로 돌려줍니다.
+    """
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    mime = (mime or "image/png").lower()
+    passthrough = {
+        "bytes": raw, "mime": mime, "ext": ext_for_mime(mime),
+        "orig_bytes": len(raw), "stored_bytes": len(raw), "width": None, "height": None,
+    }
+    if not cfg.get("enabled", True):
+        return passthrough
+    try:
+        img = _open_upright(raw)
+        img.load()
+    except Exception:
+        return passthrough
+    orig_size = img.size
+
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if _has_alpha(img) else "RGB")
+    max_dim = int(cfg.get("max_dim") or 0)
+    if max_dim and max(img.size) > max_dim:
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+    alpha = _has_alpha(img)
+    if not alpha and img.mode in ("RGBA", "LA"):
+        img = img.convert("RGB" if img.mode == "RGBA" else "L")
+
+    best: Optional[Tuple[bytes, str]] = None
+    for fmt in cfg.get("formats") or DEFAULT_CONFIG["formats"]:
+        fmt = str(fmt).lower()
+        if fmt not in _FORMAT_MIME or (fmt == "jpeg" and alpha):
+            continue
+        try:
+            data = _encode(img, fmt, int(cfg.get("quality") or DEFAULT_CONFIG["quality"]))
+        except Exception:
+            continue
+        if best is None or len(data) < len(best[0]):
+            best = (data, fmt)
+    if best is None:
+        return passthrough
+
+    data, fmt = best
+    if len(data) >= len(raw):
+        # 이미 잘 압축된 작은 파일(예: 팔레트 PNG)은 재인코딩하면 오히려 커짐 -> 원본 유지
+        return {**passthrough, "width": orig_size[0], "height": orig_size[1]}
+    return {
+        "bytes": data, "mime": _FORMAT_MIME[fmt], "ext": ext_for_mime(_FORMAT_MIME[fmt]),
+        "orig_bytes": len(raw), "stored_bytes": len(data), "width": img.size[0], "height": img.size[1],
+    }
+
+
+def make_thumbnails(raw: bytes) -> Dict[str, Tuple[bytes, str]]:
+    """
+    원본 이미지 바이트 -> {"s": (jpeg bytes, mime), "m": (...)}.
+    원본이 썸네일보다 작으면 해당 크기는 만들지 않아요(원본을 그대로 쓰면 됨).
+    """
+    try:
+        img = _to_rgb(_open_upright(raw))
+    except Exception:
+        return {}
+
+    out: Dict[str, Tuple[bytes, str]] = {}
+    for key, size in THUMB_SIZES.items():
+        if max(img.size) <= size:
+            continue
+        thumb = img.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)
+        buf = io.BytesIO()
+        thumb.save(buf, format="JPEG", quality=THUMB_QUALITY, optimize=True)
+        out[key] = (buf.getvalue(), "image/jpeg")
+    return out
+
+
+def thumb_filename(filename: str, key: str) -> str:
+    base = filename.rsplit(".", 1)[0] if "." in filename else filename
+    return f"{base}_{key}.jpg"
+
+
+def pick_preview_id(file_id: str, thumbs: Optional[Dict[str, str]], size: str = "m") -> str:
+    """썸네일이 있으면 그 id, 없으면(작은 원본/백필 전) 원본 id."""
+    thumbs = thumbs or {}
+    if size == "s":
+        return thumbs.get("s") or thumbs.get("m") or file_id
+    return thumbs.get("m") or file_id
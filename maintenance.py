@@ -0,0 +1,94 @@
+"""
+유지보수 명령(Drive 데이터 일괄 작업). 앱과 같은 .streamlit/secrets.toml을 사용합니다.
+
+    python maintenance.py backfill-thumbs
+    python maintenance.py image-savings
+    python maintenance.py gc-images              # 지울 사진만 보고(dry-run)
+    python maintenance.py gc-images --apply      # 실제로 삭제
+    python maintenance.py backfill-coords        # 좌표(lat/lng) 없이 저장된 일정에 좌표 채우기
+    python maintenance.py stress-saves --writers 8 --saves 10   # 동시 저장 부하 시험(실제 데이터는 안 건드림)
+    python maintenance.py check-watcher          # 변경 감시가 필요한 세션만 새로고침하는지 오프라인 시험
+    python maintenance.py upload-timing --images 8 --latency-ms 150   # 사진 업로드: 하나씩 vs 동시(가짜 Drive)
+"""
+import argparse
+import json
+import sys
+
+import streamlit as st
+
+import drive_store
+import map_utils
+import storage
+import stress_saves
+import upload_timing
+import watch_check
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="가족 여행 플래너 유지보수")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("backfill-thumbs", help="썸네일 없이 저장된 사진에 썸네일 만들기")
+    sub.add_parser("image-savings", help="업로드 정규화로 줄어든 용량 집계")
+    gc = sub.add_parser("gc-images", help="어떤 일정도 참조하지 않는 사진 파일 정리(기본은 보고만)")
+    gc.add_argument("--apply", action="store_true", help="보고만 하지 않고 실제로 삭제")
+    gc.add_argument("--grace-days", type=float, default=drive_store.IMAGE_GC_GRACE_S / 86400,
+                    help="최근 N일 안에 올리거나 재사용한 사진은 남김")
+    sub.add_parser("backfill-coords", help="좌표 없이 저장된 일정에 lat/lng 채우기(주소는 초당 1건 지오코딩)")
+    stress = sub.add_parser("stress-saves", help="여러 세션의 동시 저장 시험(메모리 Drive 또는 임시 로컬 저장소)")
+    stress.add_argument("--backend", choices=("drive", "local"), default="drive")
+    stress.add_argument("--writers", type=int, default=8)
+    stress.add_argument("--saves", type=int, default=10, help="세션당 저장 횟수")
+    stress.add_argument("--think-ms", type=float, default=20, help="불러오기와 저장 사이 최대 대기(ms)")
+    stress.add_argument("--shared-every", type=int, default=3, help="N번째 저장마다 공용 일정을 함께 수정(0=안 함)")
+    sub.add_parser("check-watcher", help="가짜 변경 피드로 새로고침 대상 세션 확인(Drive 없이)")
+    timing = sub.add_parser("upload-timing", help="같은 사진 묶음의 순차/동시 업로드 시간 비교(지연 있는 가짜 Drive)")
+    timing.add_argument("--images", type=int, default=8)
+    timing.add_argument("--latency-ms", type=float, default=150, help="Drive 호출 1회 지연(ms)")
+    timing.add_argument("--workers", type=int, default=drive_store.IMAGE_MAX_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "stress-saves":
+        run = stress_saves.run_drive_stress if args.backend == "drive" else stress_saves.run_local_stress
+        result = run(writers=args.writers, saves=args.saves, think_s=args.think_ms / 1000,
+                     shared_every=args.shared_every)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        sys.exit(0 if result["ok"] else 1)
+
+    if args.cmd == "check-watcher":
+        result = watch_check.run_watch_check()
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        sys.exit(0 if result["ok"] else 1)
+
+    if args.cmd == "upload-timing":
+        result = upload_timing.run_upload_timing(images=args.images, latency_ms=args.latency_ms, workers=args.workers)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        sys.exit(0 if result["ok"] else 1)
+
+    if args.cmd == "backfill-coords":
+        # 선택된 저장소(Drive/로컬) 그대로 사용
+        root = storage.root_id()
+        db = storage.load_db(root)
+        result = map_utils.backfill_coords(db)
+        if result["updated"]:
+            storage.save_db(root, db)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    root_folder_id = st.secrets["drive"]["root_folder_id"]
+
+    if args.cmd == "backfill-thumbs":
+        result = drive_store.backfill_thumbnails(root_folder_id)
+    elif args.cmd == "image-savings":
+        result = drive_store.image_savings_report()
+    elif args.cmd == "gc-images":
+        result = drive_store.collect_orphan_images(
+            root_folder_id, dry_run=not args.apply, grace_s=args.grace_days * 86400,
+        )
+    else:
+        parser.error(f"알 수 없는 명령: {args.cmd}")
+        return
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
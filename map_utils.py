@@ -1,102 +1,154 @@
+from functools import lru_cache
 from typing import Optional
 
 import re
+import time
 from urllib.parse import urlparse, parse_qs, unquote
 
 import streamlit as st
 
+from geo_cache import geo_cache
+from geocode_queue import geocode_queue, render_wait_s, wait_s
+from short_links import is_short_link, resolver
+
+
+def resolve_short_links(urls: list[str]) -> dict:
+    """Expand many short links concurrently: {short: expanded}. Known ones cost no network call."""
+    try:
+        return resolver().resolve_many(urls)
+    except Exception:
+        return {}
+
 try:
-    import requests  # type: ignore
+    from geopy.geocoders import Nominatim  # type: ignore
 except Exception:
-    requests = None
+    Nominatim = None
+
+
+GEOCODE_LANGUAGE = "ko"
 
 
-@st.cache_data(show_spinner=False, ttl=60 * 60 * 24)
-def _resolve_short_url_cached(url: str) -> str:
-    return _resolve_short_url(url)
+_nominatim = None
 
 
-def _resolve_short_url(url: str) -> str:
+def _geocode_lookup(addr: str):
     """
-    Resolve maps.app.goo.gl / goo.gl/maps short links to the final expanded URL.
+    One Nominatim lookup. Returns (lat,lng) or None when the address is not found.
+    Network/service errors are raised so the persistent cache does not record them as 'not found'.
+    Only called from the geocode_queue worker thread, which enforces the 1 request/second policy.
     """
-    if not url or not requests:
-        return url
+    global _nominatim
+    if _nominatim is None:
+        _nominatim = Nominatim(user_agent="family-trip-planner", timeout=10)
+    loc = _nominatim.geocode(addr, language=GEOCODE_LANGUAGE)
+    if loc:
+        return (float(loc.latitude), float(loc.longitude))
+    return None
+
+
+def _geocode_queue():
+    return geocode_queue(_geocode_lookup, GEOCODE_LANGUAGE)
+
+
+def geocode_addresses(addrs: list[str], timeout: Optional[float] = None) -> dict:
+    """
+    Batch geocoding: {address: (lat,lng) or None}.
+    Known addresses come from geo_cache (SQLite); the rest are queued (deduped across sessions)
+    and waited for up to `timeout` seconds. Unfinished ones are None and show up on a later rerun.
+    """
+    addrs = [a for a in dict.fromkeys(addrs or []) if a]
+    if not addrs or not Nominatim:
+        return {a: None for a in addrs}
     try:
-        resp = requests.get(url, allow_redirects=True, timeout=8, headers={"User-Agent": "Mozilla/5.0"})
-        return resp.url or url
+        return _geocode_queue().resolve_many(addrs, timeout=wait_s() if timeout is None else timeout)
     except Exception:
-        return url
+        return {a: None for a in addrs}
 
-try:
-    from geopy.geocoders import Nominatim  # type: ignore
-except Exception:
-    Nominatim = None
 
+def geocode_waiting(addrs: list[str]) -> list[str]:
+    """The given addresses that are still queued (or being looked up) in this process."""
+    try:
+        return _geocode_queue().waiting(addrs) if Nominatim and addrs else []
+    except Exception:
+        return []
 
-def _geocode_address(addr: str):
-    """Geocode with OpenStreetMap Nominatim (best-effort). Cached to avoid rate limits."""
-    if not addr or not Nominatim:
-        return None
+
+def geocode_queue_depth() -> int:
+    """Addresses waiting for (or in) a Nominatim lookup in this process."""
     try:
-        geolocator = Nominatim(user_agent="family-trip-planner")
-        loc = geolocator.geocode(addr, language="ko")
-        if loc:
-            return (float(loc.latitude), float(loc.longitude))
+        return _geocode_queue().depth() if Nominatim else 0
     except Exception:
-        return None
-    return None
+        return 0
+
 
+GEOCODE_POLL_S = 2  # seconds between queue checks while addresses are pending
+GEOCODE_MAX_REFRESH = 5  # consecutive auto refreshes before giving up (Nominatim down)
+_REFRESH_KEY = "_geocode_refreshes"
 
-@st.cache_data(show_spinner=False, ttl=60 * 60 * 24)
-def _geocode_address_cached(addr: str):
-    return _geocode_address(addr)
 
+@st.fragment(run_every=GEOCODE_POLL_S)
+def _geocode_refresh_fragment(queued: tuple) -> None:
+    if not geocode_waiting(list(queued)):
+        st.session_state[_REFRESH_KEY] = st.session_state.get(_REFRESH_KEY, 0) + 1
+        st.rerun(scope="app")  # this page's addresses are now in geo_cache -> redraw with them
 
-def extract_latlng_from_google_maps_url(url: str):
+
+def refresh_when_geocoded(queued: list[str]) -> None:
     """
-    Best-effort extraction:
-    - URLs containing '@lat,lng,' pattern
-    - query params q=lat,lng or query=lat,lng
-    - query params q=<address> -> returns ('addr', address) for geocoding
-    Returns:
-      - ('latlng', (lat,lng)) or ('addr', '...') or None
+    Page helper: call with the addresses resolve_coords_pending left queued. The page renders without
+    waiting for Nominatim; poll only those addresses and rerun the page once none of them is waiting.
     """
-    if not url:
-        return None
-    u = url.strip()
+    queued = geocode_waiting(queued)
+    if not queued:
+        st.session_state.pop(_REFRESH_KEY, None)
+        return
+    if st.session_state.get(_REFRESH_KEY, 0) >= GEOCODE_MAX_REFRESH:
+        return
+    _geocode_refresh_fragment(tuple(queued))
 
-    # Resolve Google short links (maps.app.goo.gl / goo.gl) to expanded URL
-    try:
-        parsed0 = urlparse(u)
-        host0 = (parsed0.netloc or '').lower()
-        if host0.endswith('maps.app.goo.gl') or host0.endswith('goo.gl'):
-            u = _resolve_short_url_cached(u)
-    except Exception:
-        pass
 
-    m = re.search(r"@(-?\d+\.\d+),\s*(-?\d+\.\d+)", u)
+# Precompiled patterns (one parser for every view)
+_AT_LATLNG_RE = re.compile(r"@(-?\d+\.\d+),\s*(-?\d+\.\d+)")
+_LATLNG_RE = re.compile(r"^\s*(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)\s*$")
+_SEARCH_RE = re.compile(r"/search/([^/?#]+)")
+
+COORD_FIELDS = ("lat", "lng", "coord_source", "coord_ts", "coord_for")
+
+
+@lru_cache(maxsize=4096)
+def parse_map_url(url: str):
+    """
+    Offline parsing of an (expanded) Google Maps URL:
+    - '@lat,lng,' in the path
+    - query params q=lat,lng / query=lat,lng, or q=<address>
+    - /search/<lat,lng or address>
+    Returns ('latlng', (lat,lng)) or ('addr', '...') or None. Short links must be expanded first.
+    """
+    u = (url or "").strip()
+    if not u:
+        return None
+
+    m = _AT_LATLNG_RE.search(u)
     if m:
         return ("latlng", (float(m.group(1)), float(m.group(2))))
 
     try:
-        parsed = urlparse(u)
-        qs = parse_qs(parsed.query)
-        for key in ("q", "query"):
-            if key in qs and qs[key]:
-                v = unquote(qs[key][0]).strip()
-                m2 = re.match(r"^\s*(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)\s*$", v)
-                if m2:
-                    return ("latlng", (float(m2.group(1)), float(m2.group(2))))
-                if v:
-                    return ("addr", v)
+        qs = parse_qs(urlparse(u).query)
     except Exception:
-        pass
-
-    m3 = re.search(r"/search/([^/]+)", u)
+        qs = {}
+    for key in ("q", "query"):
+        if qs.get(key):
+            v = unquote(qs[key][0]).strip()
+            m2 = _LATLNG_RE.match(v)
+            if m2:
+                return ("latlng", (float(m2.group(1)), float(m2.group(2))))
+            if v:
+                return ("addr", v)
+
+    m3 = _SEARCH_RE.search(u)
     if m3:
         v = unquote(m3.group(1)).replace("+", " ").strip()
-        m3b = re.match(r"^\s*(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)\s*$", v)
+        m3b = _LATLNG_RE.match(v)
         if m3b:
             return ("latlng", (float(m3b.group(1)), float(m3b.group(2))))
         if v:
@@ -105,41 +157,156 @@ def extract_latlng_from_google_maps_url(url: str):
     return None
 
 
-def get_coord_from_map_url(map_url: str):
-    """Return (lat,lng) if possible; supports google maps links or address text."""
-    parsed = extract_latlng_from_google_maps_url(map_url)
-    if not parsed:
-        return None
-    kind, val = parsed
-    if kind == "latlng":
-        return val
-    if kind == "addr":
-        return _geocode_address_cached(val)
-    return None
+def stored_coord(item: dict):
+    """
+    Coordinates saved on the item (see resolve_item_coords).
+    Returns (True, (lat,lng) or None) when they were resolved for the item's current map_url,
+    (False, None) when the item has none yet or map_url changed since.
+    """
+    url = (item.get("map_url") or "").strip()
+    if not url:
+        return True, None
+    if item.get("coord_for") != url:
+        return False, None
+    if item.get("lat") is None or item.get("lng") is None:
+        return item.get("coord_source") == "none", None
+    try:
+        return True, (float(item["lat"]), float(item["lng"]))
+    except (TypeError, ValueError):
+        return False, None
 
 
-def collect_day_points(day_items: list[dict]):
-    """Collect (lat,lng,title) list from schedule items."""
-    pts = []
-    for it in day_items:
-        title = (it.get("title") or "").strip() or "장소"
-        map_url = (it.get("map_url") or "").strip()
-        if not map_url:
-            continue
-
-        parsed = extract_latlng_from_google_maps_url(map_url)
-        if not parsed:
-            continue
-        kind, val = parsed
-        if kind == "latlng":
-            lat, lng = val
-            pts.append((lat, lng, title))
-            continue
-        if kind == "addr":
-            coord = _geocode_address_cached(val)
+def _known_miss(addr: str) -> bool:
+    try:
+        return geo_cache().get(addr, GEOCODE_LANGUAGE) == (True, None)
+    except Exception:
+        return False
+
+
+def _resolve_urls(urls: list[str], timeout: Optional[float] = None) -> tuple:
+    """
+    ({url: (coord or None, source or None)}, queued addresses) for distinct map URLs.
+    1) offline fast path (parse_map_url), 2) short links expanded concurrently,
+    3) remaining addresses geocoded as one queued batch (waits up to `timeout`).
+    source is None when the answer is not final yet (address still queued / expansion failed);
+    queued lists the addresses that are still waiting in the geocode queue.
+    """
+    urls = [u for u in dict.fromkeys(urls) if u]
+    expanded = resolve_short_links([u for u in urls if is_short_link(u)])
+    parsed = {}
+    unexpanded = set()
+    for u in urls:
+        if is_short_link(u):
+            target = expanded.get(u)
+            if not target or target == u:
+                unexpanded.add(u)  # expansion failed this time -> retried later, not final
+                parsed[u] = None
+                continue
+            parsed[u] = parse_map_url(target)
+        else:
+            parsed[u] = parse_map_url(u)
+    addrs = [p[1] for p in parsed.values() if p and p[0] == "addr"]
+    geocoded = geocode_addresses(addrs, timeout=timeout) if addrs else {}
+    queued = geocode_waiting([a for a in geocoded if not geocoded[a]])
+
+    out = {}
+    for u, p in parsed.items():
+        if p is None:
+            out[u] = (None, None if u in unexpanded else "none")
+        elif p[0] == "latlng":
+            out[u] = (p[1], "short_link" if is_short_link(u) else "url")
+        elif geocoded.get(p[1]):
+            out[u] = (geocoded[p[1]], "geocode")
+        else:
+            # None can mean 'not found' or 'still queued'; only a cached miss is final
+            out[u] = (None, "none" if _known_miss(p[1]) else None)
+    return out, queued
+
+
+def resolve_coords_pending(items: list[dict], timeout: Optional[float] = None) -> tuple:
+    """
+    Batch coordinate resolution shared by every view: ([(lat,lng) or None per item], queued addresses).
+    Saved lat/lng are used as-is; the rest are deduped by URL and resolved in one pass
+    (see _resolve_urls). Page render only waits `timeout` (default render_wait_s) for the geocode queue;
+    addresses still queued are None now and show up on a later rerun (see refresh_when_geocoded).
+    """
+    if timeout is None:
+        timeout = render_wait_s()
+    coords = [None] * len(items)
+    queued: list = []
+    todo: dict = {}
+    for i, it in enumerate(items):
+        ok, coord = stored_coord(it)
+        if ok:
+            coords[i] = coord
+        else:
+            todo.setdefault((it.get("map_url") or "").strip(), []).append(i)
+    if todo:
+        resolved, queued = _resolve_urls(list(todo), timeout=timeout)
+        for url, idxs in todo.items():
+            for i in idxs:
+                coords[i] = resolved.get(url, (None, None))[0]
+    return coords, queued
+
+
+def resolve_coords(items: list[dict], timeout: Optional[float] = None) -> list:
+    """(lat,lng) or None per item, aligned with items (see resolve_coords_pending)."""
+    return resolve_coords_pending(items, timeout)[0]
+
+
+def _needs_coords(item: dict) -> bool:
+    if not (item.get("map_url") or "").strip():
+        return "coord_for" in item  # map removed -> clear old coordinates
+    return not stored_coord(item)[0]
+
+
+def resolve_item_coords(items: list[dict], timeout: Optional[float] = None, force: bool = False) -> int:
+    """
+    Save-time resolution: writes lat/lng + coord_source ('url' | 'short_link' | 'geocode' | 'none'),
+    coord_ts and coord_for (the map_url they belong to) on each item whose map_url changed.
+    Items whose lookup did not finish in time (default wait_s) are left as-is
+    (resolved live, picked up by the backfill). Returns the number of items updated.
+    """
+    todo = [it for it in items if force or _needs_coords(it)]
+    if not todo:
+        return 0
+    resolved, _ = _resolve_urls([(it.get("map_url") or "").strip() for it in todo], timeout=timeout)
+    changed = 0
+    now = int(time.time())
+    for it in todo:
+        url = (it.get("map_url") or "").strip()
+        coord, source = resolved.get(url, (None, None))
+        if url and source is None:
+            continue  # geocoding still pending / short link not expanded yet
+        for k in COORD_FIELDS:
+            it.pop(k, None)
+        if url:
             if coord:
-                lat, lng = coord
-                pts.append((lat, lng, title))
+                it["lat"], it["lng"] = round(float(coord[0]), 7), round(float(coord[1]), 7)
+            it.update({"coord_source": source, "coord_ts": now, "coord_for": url})
+        changed += 1
+    return changed
+
+
+def backfill_coords(db: dict, timeout: Optional[float] = None) -> dict:
+    """One-shot backfill for items saved before coordinates were stored (maintenance.py backfill-coords)."""
+    items = [it for t in db.get("trips", []) or [] for it in t.get("items", []) or []]
+    todo = [it for it in items if _needs_coords(it)]
+    if timeout is None:
+        timeout = 60 + 2.0 * len(todo)  # addresses are geocoded at 1/s; wait for the whole batch
+    updated = resolve_item_coords(todo, timeout=timeout)
+    return {"items": len(items), "needed": len(todo), "updated": updated, "pending": len(todo) - updated}
+
+
+def collect_day_points(day_items: list[dict], coords: Optional[list] = None):
+    """Collect (lat,lng,title) list from schedule items. coords: precomputed resolve_coords(day_items)."""
+    if coords is None:
+        coords = resolve_coords(day_items)
+    pts = []
+    for it, coord in zip(day_items, coords):
+        if coord:
+            title = (it.get("title") or "").strip() or "장소"
+            pts.append((coord[0], coord[1], title))
     return pts
 
 
@@ -152,6 +319,7 @@ def render_day_map(day_items: list[dict], height: int = 520, **kwargs):
 
     kwargs:
       - key: (optional) unique key to avoid multi-map collisions
+      - coords: (optional) precomputed resolve_coords(day_items), shared with the other views
     """
     key: Optional[str] = kwargs.get("key")
 
@@ -163,8 +331,11 @@ def render_day_map(day_items: list[dict], height: int = 520, **kwargs):
         st.error("지도 표시를 위해 folium 패키지가 필요해요. requirements.txt를 확인해 주세요.")
         return
 
-    pts = collect_day_points(day_items)
-    st.caption(f"지도 포인트: {len(pts)}개")  # 작은 디버그 힌트(사용자에게도 도움)
+    pts = collect_day_points(day_items, kwargs.get("coords"))
+    pending = geocode_queue_depth()
+    st.caption(
+        f"지도 포인트: {len(pts)}개" + (f" · 주소 {pending}곳 위치 확인 중(잠시 후 새로고침)" if pending else "")
+    )  # 작은 디버그 힌트(사용자에게도 도움)
 
     if len(pts) == 0:
         st.info(
@@ -225,30 +396,3 @@ def render_day_map(day_items: list[dict], height: int = 520, **kwargs):
         except Exception:
             st.error("지도 렌더링 중 문제가 발생했어요. (folium/leaflet 리소스 차단 가능성도 있어요)")
             return
-
-
-def _get_coord_from_map_url_uncached(map_url: str):
-    """
-    Uncached coordinate extraction.
-
-    Returns (lat,lng) if 가능한 경우.
-    - short link resolve (maps.app.goo.gl) handled inside extract_latlng_from_google_maps_url via _resolve_short_url
-    - address geocoding via Nominatim (best-effort)
-    """
-    if not map_url:
-        return None
-    info = extract_latlng_from_google_maps_url(map_url)
-    if not info:
-        return None
-    kind, val = info
-    if kind == "latlng":
-        return val
-    if kind == "addr":
-        return _geocode_address(val)
-    return None
-
-
-@st.cache_data(show_spinner=False, ttl=60 * 60 * 24 * 30)
-def get_coord_from_map_url(map_url: str):
-    """Cached wrapper for coordinate extraction to speed up schedule view."""
-    return _get_coord_from_map_url_uncached(map_url)
\ No newline at end of file
@@ -9,9 +9,13 @@ import streamlit as st
 from PIL import Image
 from streamlit_paste_button import paste_image_button
 
-import drive_store
-from drive_store import load_db, save_db, get_trip, list_trip_names
+import drive_metrics
+import storage
+from storage import load_db_or_stop, save_db, list_trip_names
+import session_memory
+import trip_index
 from calendar_ui import render_month_calendar
+from map_utils import resolve_item_coords
 
 
 # (표보기 링크 등) query params로 수정 모드 진입 지원
@@ -41,8 +45,9 @@ if _qp_trip or _qp_edit:
         pass
 
 st.set_page_config(page_title="일정 추가", page_icon="📝", layout="centered")
+drive_metrics.start_rerun()
 
-ROOT_FOLDER_ID = st.secrets["drive"]["root_folder_id"]
+ROOT_FOLDER_ID = storage.root_id()
 
 st.title("📝 일정 추가/수정")
 
@@ -51,11 +56,13 @@ jump_date_str = st.query_params.get("jump", "")
 
 st.caption("PC: 캡쳐 후 '붙여넣기' 버튼 / 폰: 사진 업로드(여러 장 가능)")
 
-db = load_db(ROOT_FOLDER_ID)
+db = load_db_or_stop(ROOT_FOLDER_ID)
+storage.show_upload_warning()
+storage.show_save_conflicts()
 trip_names = list_trip_names(db)
 
 if "draft_images" not in st.session_state:
-    st.session_state["draft_images"] = []  # list of (bytes, mime)
+    st.session_state["draft_images"] = []  # list of (bytes 또는 임시 파일 경로, mime)
 if "last_paste_sig" not in st.session_state:
     st.session_state["last_paste_sig"] = None
 
@@ -67,6 +74,11 @@ with st.sidebar:
     st.subheader("여행 선택/생성")
     if st.button("🔄 새로고침", width='stretch'):
         st.rerun()
+    _save_st = storage.save_status(ROOT_FOLDER_ID)
+    if _save_st["enabled"]:
+        st.caption(storage.save_status_label(_save_st))
+    drive_metrics.render_debug_panel(storage.debug_stats())
+    storage.watch_changes()
     new_trip = st.text_input("새 여행 이름", placeholder="예: 2026 오사카")
     if st.button("➕ 여행 만들기", width='stretch', disabled=not new_trip.strip()):
         db["trips"].append({"name": new_trip.strip(), "items": []})
@@ -85,7 +97,8 @@ if _edit_trip and _edit_trip in trip_names:
     st.session_state["add_trip_select"] = _edit_trip
 
 trip_name = st.selectbox("여행", options=trip_names, key="add_trip_select")
-trip = get_trip(db, trip_name)
+tv = trip_index.view(db)
+trip = tv.get_trip(trip_name)
 if not trip:
     st.error("여행을 찾을 수 없어. 새로고침 후 다시 시도해줘.")
     st.stop()
@@ -95,10 +108,7 @@ if not trip:
 edit_id = st.session_state.get("edit_id")
 edit_item = None
 if edit_id:
-    for _it in (trip.get("items", []) or []):
-        if _it.get("id") == edit_id:
-            edit_item = _it
-            break
+    _, edit_item = tv.find_item(trip_name, edit_id)
 
 if edit_id and not edit_item:
     st.warning("수정할 일정을 찾지 못했어. (이미 삭제되었을 수 있어) 추가 모드로 전환할게.")
@@ -181,13 +191,16 @@ delete_ids = set()
 if edit_item and existing_ids:
     st.caption("기존 사진(삭제할 사진을 체크)")
     cols_prev = st.columns(3)
+    slots = []
     for i, fid in enumerate(existing_ids):
-        b = drive_store.get_image_bytes(fid)
         col = cols_prev[i % 3]
-        if b:
-            col.image(b, width='stretch')
+        slots.append(col.empty())
         if col.checkbox("삭제", key=f"del_img_{fid}"):
             delete_ids.add(fid)
+    # 동시에 받아서 도착하는 순서대로 채움
+    for i, _fid, b in storage.get_images_bytes(storage.preview_image_ids(edit_item, size="s")):
+        if b:
+            slots[i].image(b, width='stretch')
     st.divider()
 
 
@@ -208,7 +221,7 @@ if paste_result is not None and getattr(paste_result, "image_data", None) is not
     if raw:
         sig = hashlib.sha1(raw).hexdigest()
         if sig != st.session_state["last_paste_sig"]:
-            st.session_state["draft_images"].append((raw, mime))
+            session_memory.add_draft("draft_images", raw, mime)
             st.session_state["last_paste_sig"] = sig
             pasted_or_uploaded_now = True
         else:
@@ -221,8 +234,9 @@ uploaded_files = st.file_uploader(
 )
 if uploaded_files:
     for uf in uploaded_files:
-        st.session_state["draft_images"].append((uf.getvalue(), uf.type or "image/png"))
-    pasted_or_uploaded_now = True
+        # 이미 추가된 사진은 건너뜀(재실행마다 같은 파일이 다시 들어오지 않게)
+        if session_memory.add_draft("draft_images", uf.getvalue(), uf.type or "image/png"):
+            pasted_or_uploaded_now = True
 
 # 핵심: 추가 직후 rerun → 같은 화면에서 미리보기 즉시 노출
 if pasted_or_uploaded_now:
@@ -234,7 +248,7 @@ if st.session_state["draft_images"]:
     for i, (b, _) in enumerate(st.session_state["draft_images"][:9]):
         cols[i % 3].image(b, width='stretch')
     if st.button("🧹 이미지 선택 전부 비우기", width='stretch'):
-        st.session_state["draft_images"] = []
+        session_memory.clear_drafts("draft_images")
         st.session_state["last_paste_sig"] = None
         st.rerun()
 else:
@@ -249,19 +263,15 @@ btn1, btn2 = st.columns([1, 1], gap="small")
 
 if edit_item:
     if btn1.button("💾 수정 저장", type="primary", width='stretch', disabled=not can_save):
-        service = drive_store._drive_service()
-        images_folder_id = drive_store.ensure_subfolder(service, ROOT_FOLDER_ID, drive_store.IMAGES_FOLDER_NAME)
-
         kept_ids = [fid for fid in (edit_item.get("image_file_ids") or []) if fid not in delete_ids]
 
-        new_ids = []
-        for (img_bytes, mime) in st.session_state["draft_images"]:
-            ts = int(time.time() * 1000)
-            ext = "png" if (mime or "").lower().endswith("png") else "jpg"
-            safe_trip = trip_name.replace(" ", "_")
-            filename = f"{safe_trip}_{date_str}_{ts}_{uuid.uuid4().hex[:6]}.{ext}"
-            fid = drive_store.upload_image_bytes(service, images_folder_id, filename, img_bytes, mime or "image/png")
-            new_ids.append(fid)
+        files = [
+            (storage.make_image_filename(trip_name, date_str, mime), session_memory.draft_bytes(img_bytes), mime or "image/png")
+            for (img_bytes, mime) in st.session_state["draft_images"]
+        ]
+        up = storage.upload_images_bytes(ROOT_FOLDER_ID, files)
+        new_ids = [fid for fid in up["ids"] if fid]
+        storage.remember_upload_failures(up)
 
         edit_item.update({
             "date": date_str,
@@ -271,8 +281,13 @@ if edit_item:
             "map_text": map_text,
             "map_url": map_url,
             "image_file_ids": kept_ids + new_ids,
+            "image_thumbs": {
+                **{fid: th for fid, th in (edit_item.get("image_thumbs") or {}).items() if fid in kept_ids},
+                **up["thumbs_by_id"],
+            },
             "ts": int(time.time()),
         })
+        resolve_item_coords([edit_item])  # 지도 링크가 바뀌었으면 좌표를 다시 계산해서 함께 저장
 
         def _sort_key(x):
             t = x.get("time") or ""
@@ -281,7 +296,7 @@ if edit_item:
 
         save_db(ROOT_FOLDER_ID, db)
 
-        st.session_state["draft_images"] = []
+        session_memory.clear_drafts("draft_images")
         st.session_state["last_paste_sig"] = None
         st.session_state.pop("edit_id", None)
         st.session_state.pop("edit_trip_name", None)
@@ -295,23 +310,19 @@ if edit_item:
     if btn2.button("➕ 추가 모드", width='stretch'):
         st.session_state.pop("edit_id", None)
         st.session_state.pop("edit_trip_name", None)
-        st.session_state["draft_images"] = []
+        session_memory.clear_drafts("draft_images")
         st.session_state["last_paste_sig"] = None
         st.rerun()
 
 else:
     if btn1.button("✅ 저장", type="primary", width='stretch', disabled=not can_save):
-        service = drive_store._drive_service()
-        images_folder_id = drive_store.ensure_subfolder(service, ROOT_FOLDER_ID, drive_store.IMAGES_FOLDER_NAME)
-
-        image_file_ids = []
-        for (img_bytes, mime) in st.session_state["draft_images"]:
-            ts = int(time.time() * 1000)
-            ext = "png" if (mime or "").lower().endswith("png") else "jpg"
-            safe_trip = trip_name.replace(" ", "_")
-            filename = f"{safe_trip}_{date_str}_{ts}_{uuid.uuid4().hex[:6]}.{ext}"
-            fid = drive_store.upload_image_bytes(service, images_folder_id, filename, img_bytes, mime or "image/png")
-            image_file_ids.append(fid)
+        files = [
+            (storage.make_image_filename(trip_name, date_str, mime), session_memory.draft_bytes(img_bytes), mime or "image/png")
+            for (img_bytes, mime) in st.session_state["draft_images"]
+        ]
+        up = storage.upload_images_bytes(ROOT_FOLDER_ID, files)
+        image_file_ids = [fid for fid in up["ids"] if fid]
+        storage.remember_upload_failures(up)
 
         item = {
             "id": uuid.uuid4().hex,
@@ -322,8 +333,10 @@ else:
             "map_text": map_text,
             "map_url": map_url,
             "image_file_ids": image_file_ids,
+            "image_thumbs": up["thumbs_by_id"],
             "ts": int(time.time()),
         }
+        resolve_item_coords([item])  # 좌표(lat/lng)를 저장 시 한 번만 계산해 둠
         trip["items"].append(item)
 
         def _sort_key(x):
@@ -333,7 +346,7 @@ else:
 
         save_db(ROOT_FOLDER_ID, db)
 
-        st.session_state["draft_images"] = []
+        session_memory.clear_drafts("draft_images")
         st.session_state["last_paste_sig"] = None
 
         st.success("저장되었습니다. 일정 보기로 이동합니다…")
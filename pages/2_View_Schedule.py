@@ -1,6 +1,5 @@
 import io
 import time
-import uuid
 import hashlib
 from datetime import date
 from urllib.parse import quote_plus, urlparse, parse_qs, unquote_plus
@@ -10,47 +9,44 @@ import streamlit as st
 # === INLINE EDIT (View Schedule에서 바로 수정) ===
 import io
 import time
-import uuid
 import hashlib
 from urllib.parse import quote_plus
 
 from PIL import Image
 from streamlit_paste_button import paste_image_button
 
-import drive_store
-from drive_store import save_db
+import drive_metrics
+import storage
+from storage import save_db
 from PIL import Image
 from streamlit_paste_button import paste_image_button
 
-import drive_store
-from drive_store import load_db, save_db, list_trip_names, get_trip, get_image_bytes
+import storage
+from storage import load_db_or_stop, save_db, list_trip_names, get_images_bytes
+import session_memory
+import trip_index
 from calendar_ui import render_month_calendar
-from map_utils import render_day_map
+from geo_cache import geo_cache_stats
+from geocode_queue import queue_status
+from map_utils import refresh_when_geocoded, render_day_map, resolve_coords_pending, resolve_item_coords
+from short_links import short_link_stats
 from routing_utils import format_date_with_dow_kr, driving_km_between, compute_day_driving_km
 
 st.set_page_config(page_title="일정 보기", page_icon="👀", layout="wide")
+drive_metrics.start_rerun()
 
 # v3_15: 사진은 일정별로 버튼을 눌렀을 때만 불러옵니다(지연 로딩).
 if "photo_open" not in st.session_state:
     st.session_state.photo_open = {}  # item_id -> bool
-if "photo_data" not in st.session_state:
-    st.session_state.photo_data = {}  # item_id -> list[bytes]
+# 불러온 사진 바이트는 session_memory가 관리(세션/전체 예산, 오래 안 본 갤러리부터 정리)
+if "photo_full" not in st.session_state:
+    st.session_state.photo_full = {}  # item_id -> bool (True면 원본 화질)
 
 
-ROOT_FOLDER_ID = st.secrets["drive"]["root_folder_id"]
+ROOT_FOLDER_ID = storage.root_id()
 
 def _find_item_by_id(db: dict, trip_name: str, item_id: str):
-    trip = None
-    for t in (db.get("trips") or []):
-        if t.get("name") == trip_name:
-            trip = t
-            break
-    if not trip:
-        return None, None
-    for it in (trip.get("items") or []):
-        if it.get("id") == item_id:
-            return trip, it
-    return trip, None
+    return trip_index.view(db).find_item(trip_name, item_id)
 
 
 def _make_map_url(map_text: str) -> tuple[str, str]:
@@ -81,7 +77,7 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
             st.session_state[key_prefix + "title"] = item.get("title") or ""
             st.session_state[key_prefix + "memo"] = item.get("memo") or ""
             st.session_state[key_prefix + "map_text"] = item.get("map_text") or (item.get("map_url") or "")
-            st.session_state[key_prefix + "draft_images"] = []
+            session_memory.clear_drafts(key_prefix + "draft_images")
             st.session_state[key_prefix + "last_paste_sig"] = None
             st.session_state[init_flag] = True
 
@@ -117,22 +113,23 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
             with st.expander(f"기존 사진 {len(existing_ids)}장 미리보기(필요할 때만 다운로드)", expanded=False):
                 # 삭제 체크는 미리보기와 무관하게 가능하게 함(이미지 다운로드 없이도 체크 가능)
                 cols_prev = st.columns(3)
+                show_img = st.session_state.get(preview_key, False)
+                slots = []
                 for i, fid in enumerate(existing_ids):
                     col = cols_prev[i % 3]
-                    show_img = st.session_state.get(preview_key, False)
-
-                    if show_img:
-                        b = drive_store.get_image_bytes(fid)
-                        if b:
-                            col.image(b, use_container_width=True)
-                        else:
-                            col.caption("(이미지 로드 실패)")
-                    else:
-                        col.caption(f"사진 #{i+1}")
+                    slots.append(col.empty())
+                    slots[i].caption(f"사진 #{i+1}")
 
                     if col.checkbox("삭제", key=key_prefix + f"del_{fid}"):
                         delete_ids.add(fid)
 
+                if show_img:
+                    for i, _fid, b in storage.get_images_bytes(storage.preview_image_ids(item, size="s")):
+                        if b:
+                            slots[i].image(b, use_container_width=True)
+                        else:
+                            slots[i].caption("(이미지 로드 실패)")
+
                 if not st.session_state.get(preview_key, False):
                     if st.button("⬇️ 미리보기 로드", key=key_prefix + "prev_load_btn", use_container_width=True):
                         st.session_state[preview_key] = True
@@ -155,7 +152,7 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
             if raw:
                 sig = hashlib.sha1(raw).hexdigest()
                 if sig != st.session_state[key_prefix + "last_paste_sig"]:
-                    st.session_state[key_prefix + "draft_images"].append((raw, mime))
+                    session_memory.add_draft(key_prefix + "draft_images", raw, mime)
                     st.session_state[key_prefix + "last_paste_sig"] = sig
                     pasted_or_uploaded_now = True
                 else:
@@ -169,8 +166,8 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
         )
         if uploaded_files:
             for uf in uploaded_files:
-                st.session_state[key_prefix + "draft_images"].append((uf.getvalue(), uf.type or "image/png"))
-            pasted_or_uploaded_now = True
+                if session_memory.add_draft(key_prefix + "draft_images", uf.getvalue(), uf.type or "image/png"):
+                    pasted_or_uploaded_now = True
 
         if pasted_or_uploaded_now:
             st.rerun()
@@ -182,7 +179,7 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
             for i, (b, _) in enumerate(drafts[:9]):
                 cols[i % 3].image(b, width='stretch')
             if st.button("🧹 추가 이미지 비우기", width='stretch', key=key_prefix + "clear_drafts"):
-                st.session_state[key_prefix + "draft_images"] = []
+                session_memory.clear_drafts(key_prefix + "draft_images")
                 st.session_state[key_prefix + "last_paste_sig"] = None
                 st.rerun()
 
@@ -192,18 +189,14 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
             date_str = new_date.strftime("%Y-%m-%d")
             map_text, map_url = _make_map_url(new_map_text)
 
-            service = drive_store._drive_service()
-            images_folder_id = drive_store.ensure_subfolder(service, ROOT_FOLDER_ID, drive_store.IMAGES_FOLDER_NAME)
-
             kept_ids = [fid for fid in existing_ids if fid not in delete_ids]
-            new_ids = []
-            for (img_bytes, mime) in (st.session_state.get(key_prefix + "draft_images") or []):
-                ts = int(time.time() * 1000)
-                ext = "png" if (mime or "").lower().endswith("png") else "jpg"
-                safe_trip = trip_name.replace(" ", "_")
-                filename = f"{safe_trip}_{date_str}_{ts}_{uuid.uuid4().hex[:6]}.{ext}"
-                fid = drive_store.upload_image_bytes(service, images_folder_id, filename, img_bytes, mime or "image/png")
-                new_ids.append(fid)
+            files = [
+                (storage.make_image_filename(trip_name, date_str, mime), session_memory.draft_bytes(img_bytes), mime or "image/png")
+                for (img_bytes, mime) in (st.session_state.get(key_prefix + "draft_images") or [])
+            ]
+            up = storage.upload_images_bytes(ROOT_FOLDER_ID, files)
+            new_ids = [fid for fid in up["ids"] if fid]
+            storage.remember_upload_failures(up)
 
             item.update({
                 "date": date_str,
@@ -213,8 +206,13 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
                 "map_text": map_text,
                 "map_url": map_url,
                 "image_file_ids": kept_ids + new_ids,
+                "image_thumbs": {
+                    **{fid: th for fid, th in (item.get("image_thumbs") or {}).items() if fid in kept_ids},
+                    **up["thumbs_by_id"],
+                },
                 "ts": int(time.time()),
             })
+            resolve_item_coords([item])  # 지도 링크가 바뀌었으면 좌표를 다시 계산해서 함께 저장
 
             def _sort_key(x):
                 t = x.get("time") or ""
@@ -247,7 +245,9 @@ def _inline_edit_dialog(db: dict, trip_name: str, item: dict):
 
 st.title("👀 일정 보기")
 
-db = load_db(ROOT_FOLDER_ID)
+db = load_db_or_stop(ROOT_FOLDER_ID)
+storage.show_upload_warning()
+storage.show_save_conflicts()
 trip_names = list_trip_names(db)
 
 # v3.7: 달력에서 날짜 클릭 시 trip/jump를 query param으로 유지
@@ -272,13 +272,14 @@ trip_name = st.selectbox("여행 선택", options=trip_names, index=default_inde
 if st.session_state.get("photo_trip") != trip_name:
     st.session_state["photo_trip"] = trip_name
     st.session_state.photo_open = {}
-    st.session_state.photo_data = {}
+    session_memory.current().clear_galleries()
+    st.session_state.photo_full = {}
 
 # (Inline edit) 이전 세션에서 남아있는 상태 때문에 의도치 않게 사진/파일을 미리 불러와 느려지는 경우가 있어
 # 이 페이지에서는 자동으로 다이얼로그를 띄우지 않고 상태만 정리합니다.
 st.session_state.pop("inline_edit_id", None)
 st.session_state.pop("inline_edit_trip", None)
-trip = get_trip(db, trip_name)
+trip = trip_index.view(db).get_trip(trip_name)
 if not trip:
     st.error("여행을 찾을 수 없어. 새로고침 후 다시 시도해줘.")
     st.stop()
@@ -320,9 +321,9 @@ for idx, it in enumerate(items):
 
 
 def _get_item_title_for_confirm(item_id: str) -> str:
-    for x in (trip.get("items") or []):
-        if x.get("id") == item_id:
-            return x.get("title") or "(제목 없음)"
+    _, x = _find_item_by_id(db, trip_name, item_id)
+    if x is not None:
+        return x.get("title") or "(제목 없음)"
     return "(알 수 없는 일정)"
 
 
@@ -366,6 +367,15 @@ with st.sidebar:
     st.subheader("보기 옵션 · v3_15")
     view_mode = st.radio("보기", ["카드", "표", "타임라인"], index=0)
     keyword = st.text_input("키워드(제목/메모)", placeholder="예: 맛집 / 공항 / 호텔")
+    _save_st = storage.save_status(ROOT_FOLDER_ID)
+    if _save_st["enabled"]:
+        st.caption(storage.save_status_label(_save_st))
+    st.caption(session_memory.usage_label())
+    drive_metrics.render_debug_panel({
+        **storage.debug_stats(), "지오코딩 캐시": geo_cache_stats(), "지오코딩 대기열": queue_status(),
+        "단축 링크": short_link_stats(),
+    })
+    storage.watch_changes()
 
 def _match(it):
     if not keyword.strip():
@@ -374,11 +384,12 @@ def _match(it):
     blob = f"{it.get('title','')} {it.get('memo','')}".lower()
     return k in blob
 
+# 날짜별 묶기/정렬은 인덱스에서(하위 호환 보정으로 바뀐 내용이 있으면 그 여행만 다시 색인)
 grouped = {}
-for it in items:
-    d = it.get("date", "미정")
-    if _match(it):
-        grouped.setdefault(d, []).append(it)
+for d, day_items in trip_index.view(db).items_by_day(trip_name).items():
+    matched = [it for it in day_items if _match(it)]
+    if matched:
+        grouped[d] = matched
 
 dates_sorted = sorted(grouped.keys())
 if not dates_sorted:
@@ -387,6 +398,17 @@ if not dates_sorted:
 
 day_map = {d: i + 1 for i, d in enumerate(dates_sorted)}
 
+# 좌표는 보이는 일정 전체를 한 번에 계산(저장된 lat/lng → 링크 파싱 → 단축 링크/주소만 네트워크)하고
+# 표/타임라인/카드의 거리 계산과 지도가 모두 같은 결과를 씀
+_visible_items = [it for d in dates_sorted for it in grouped[d]]
+_visible_coords, _queued_addrs = resolve_coords_pending(_visible_items)
+_coord_by_item = {id(it): c for it, c in zip(_visible_items, _visible_coords)}
+refresh_when_geocoded(_queued_addrs)  # 주소 조회를 기다리지 않고 그린 뒤, 이 화면의 주소가 끝나면 다시 그림
+
+
+def _day_coords(day_items: list) -> list:
+    return [_coord_by_item.get(id(it)) for it in day_items]
+
 # Calendar events + month nav
 events = {}
 for d in dates_sorted:
@@ -476,23 +498,15 @@ def _delete_item(item_id: str):
     save_db(ROOT_FOLDER_ID, db)
 
 def _update_item(item_id: str, patch: dict):
-    for x in trip.get("items", []):
-        if x.get("id") == item_id:
-            x.update(patch)
-            break
+    _, x = _find_item_by_id(db, trip_name, item_id)
+    if x is not None:
+        x.update(patch)
     def _sort_key(x):
         t = x.get("time") or ""
         return (x.get("date") or "", t, x.get("ts") or 0)
     trip["items"] = sorted(trip.get("items", []), key=_sort_key)
     save_db(ROOT_FOLDER_ID, db)
 
-def _sort_key(x):
-    t = x.get("time") or ""
-    return (x.get("date") or "", t, x.get("ts") or 0)
-
-for d in dates_sorted:
-    grouped[d] = sorted(grouped[d], key=_sort_key)
-
 if view_mode == "표":
     # 표 보기(모바일 가로 스크롤): _id는 표에 표시하지 않고 내부로만 보관
     rows = []
@@ -501,13 +515,9 @@ if view_mode == "표":
         day_items = grouped[d]
         prev_coord = None
 
-        from map_utils import collect_day_points
-        pts = collect_day_points(day_items)
-        title_to_coord = {title: (lat, lng) for lat, lng, title in pts if title}
-
-        for it in day_items:
+        # 저장된 lat/lng를 그대로 읽음(없는 예전 일정만 지도 링크에서 계산)
+        for it, coord in zip(day_items, _day_coords(day_items)):
             title = (it.get("title") or "").strip()
-            coord = title_to_coord.get(title)
 
             km_from_prev = None
             if prev_coord and coord:
@@ -577,7 +587,7 @@ if view_mode == "타임라인":
     circ = "①②③④⑤⑥⑦⑧⑨⑩"
     for d in dates_sorted:
         day_items = grouped[d]
-        seg_km, total_km = compute_day_driving_km(day_items)
+        seg_km, total_km = compute_day_driving_km(day_items, _day_coords(day_items))
         st.markdown(f"<div id='day-anchor-{d}'></div>", unsafe_allow_html=True)
         st.subheader(f"Day {day_map[d]} · 📅 {format_date_with_dow_kr(d)}")
         st.caption(f"🚗 예상 운전거리(도로): **{total_km} km** (좌표가 있는 일정 기준)")
@@ -590,16 +600,13 @@ if view_mode == "타임라인":
 
         with st.expander("🗺️ 그날 전체 지도(번호 표시) 보기", expanded=False):
             _mk = f"day_map_load_{trip_name}_{d}"
-            if _mk not in st.session_state:
-                st.session_state[_mk] = False
-
-            if not st.session_state[_mk]:
+            if not session_memory.current().map_loaded(_mk):
                 if st.button("🗺️ 지도 불러오기", key=_mk + "_btn", use_container_width=True):
-                    st.session_state[_mk] = True
+                    session_memory.current().set_map_loaded(_mk)
                     st.rerun()
                 st.caption("버튼을 누르면 해당 날짜의 지도/마커를 생성해요(기본 화면에서는 네트워크 호출을 하지 않아요).")
             else:
-                render_day_map(day_items, height=560)
+                render_day_map(day_items, height=560, coords=_day_coords(day_items))
 
         for idx2, it in enumerate(day_items, start=1):
             t = (it.get("time") or "").strip()
@@ -627,7 +634,7 @@ if view_mode == "타임라인":
 # Card view
 for d in dates_sorted:
     day_items = grouped[d]
-    seg_km, total_km = compute_day_driving_km(day_items)
+    seg_km, total_km = compute_day_driving_km(day_items, _day_coords(day_items))
 
     st.markdown(f"<div id='day-anchor-{d}'></div>", unsafe_allow_html=True)
     st.subheader(f"Day {day_map[d]} · 📅 {format_date_with_dow_kr(d)}")
@@ -639,16 +646,13 @@ for d in dates_sorted:
 
     with st.expander("🗺️ 그날 전체 지도(번호 표시) 보기", expanded=False):
         _mk = f"day_map_load_{trip_name}_{d}"
-        if _mk not in st.session_state:
-            st.session_state[_mk] = False
-
-        if not st.session_state[_mk]:
+        if not session_memory.current().map_loaded(_mk):
             if st.button("🗺️ 지도 불러오기", key=_mk + "_btn", use_container_width=True):
-                st.session_state[_mk] = True
+                session_memory.current().set_map_loaded(_mk)
                 st.rerun()
             st.caption("버튼을 누르면 해당 날짜의 지도/마커를 생성해요(기본 화면에서는 네트워크 호출을 하지 않아요).")
         else:
-            render_day_map(day_items, height=560)
+            render_day_map(day_items, height=560, coords=_day_coords(day_items))
 
     st.caption("구글맵에서 경유지가 입력된 순서(시간순)대로 잡혀요.")
 
@@ -689,27 +693,44 @@ for d in dates_sorted:
                     st.caption(f"사진 {len(image_ids)}장 (열고 '불러오기'를 눌러야 다운로드돼요)")
                 else:
                     # 2) 열려 있어도 자동 다운로드하지 않고, 명시적으로 "불러오기"를 눌렀을 때만 가져옵니다.
-                    cached = item_id in st.session_state.photo_data
+                    cached = session_memory.current().has_gallery(item_id)
 
-                    cA, cB = st.columns([1, 1], gap="small")
+                    # 기본은 썸네일(m), '원본 보기'를 누른 일정만 원본을 받습니다.
+                    full = st.session_state.photo_full.get(item_id, False)
+                    load_ids = image_ids if full else storage.preview_image_ids(it, size="m")
+
+                    cA, cB, cC = st.columns([1, 1, 1], gap="small")
+                    load_now = False
                     if not cached:
-                        if cA.button("⬇️ 사진 불러오기", key=f"photo_load_{_sid}", use_container_width=True):
-                            with st.spinner("사진 불러오는 중..."):
-                                imgs = []
-                                for fid in image_ids:
-                                    b = get_image_bytes(fid)
-                                    if b:
-                                        imgs.append(b)
-                                st.session_state.photo_data[item_id] = imgs
-                            st.rerun()
+                        load_now = cA.button("⬇️ 사진 불러오기", key=f"photo_load_{_sid}", use_container_width=True)
                     else:
-                        cA.caption("✅ 사진 캐시됨")
+                        cA.caption("✅ 사진 캐시됨" + (" (원본)" if full else ""))
+
+                    if not full and cC.button("🔍 원본 보기", key=f"photo_full_{_sid}", use_container_width=True):
+                        st.session_state.photo_full[item_id] = True
+                        load_ids = image_ids
+                        load_now = True
+
+                    if load_now:
+                        # 동시에 받으면서 먼저 도착한 사진부터 바로 보여줌
+                        prog = st.progress(0.0, text="사진 불러오는 중...")
+                        gcols = st.columns(3)
+                        slots = [gcols[i % 3].empty() for i in range(len(load_ids))]
+                        got = [None] * len(load_ids)
+                        for n, (i, _fid, b) in enumerate(get_images_bytes(load_ids), start=1):
+                            got[i] = b
+                            if b:
+                                slots[i].image(b, use_container_width=True)
+                            prog.progress(n / len(load_ids), text=f"사진 불러오는 중... {n}/{len(load_ids)}")
+                        session_memory.current().put_gallery(item_id, [b for b in got if b])
+                        st.rerun()
 
                     if cB.button("🧹 사진 캐시 지우기", key=f"photo_clear_{_sid}", use_container_width=True):
-                        st.session_state.photo_data.pop(item_id, None)
+                        session_memory.current().drop_gallery(item_id)
+                        st.session_state.photo_full.pop(item_id, None)
                         st.rerun()
 
-                    imgs = st.session_state.photo_data.get(item_id, [])
+                    imgs = session_memory.current().gallery(item_id) or []
                     if imgs:
                         st.caption("📷 사진")
                         st.image(imgs, use_container_width=True)
@@ -1,3 +1,4 @@
+from typing import Optional
 from urllib.parse import urlencode
 
 import streamlit as st
@@ -54,22 +55,19 @@ def driving_km_between(p1: tuple[float, float], p2: tuple[float, float]):
     return m / 1000.0
 
 
-def compute_day_driving_km(day_items: list[dict]):
+def compute_day_driving_km(day_items: list[dict], coords: Optional[list] = None):
     """
     Returns (segment_km_list, total_km)
     - segment_km_list aligns with day_items: first is None, others are km from previous coord
     - total_km sums available segments (rounded 1 decimal)
+    - coords: precomputed map_utils.resolve_coords(day_items) (resolved here when omitted)
     """
-    try:
-        from map_utils import get_coord_from_map_url
-    except Exception:
-        get_coord_from_map_url = None
-
-    coords = []
-    for it in day_items:
-        url = (it.get("map_url") or "").strip()
-        coord = get_coord_from_map_url(url) if get_coord_from_map_url else None
-        coords.append(coord)
+    if coords is None:
+        try:
+            from map_utils import resolve_coords
+            coords = resolve_coords(day_items)
+        except Exception:
+            coords = [None] * len(day_items)
 
     seg = [None] * len(day_items)
     total = 0.0
@@ -0,0 +1,305 @@
+"""
+세션별 메모리 관리(사진 바이트가 세션 상태에 쌓여 공용 인스턴스가 OOM 나는 것 방지).
+
+- 갤러리(일정별로 불러온 사진): 세션 예산을 넘으면 가장 오래 안 본 갤러리부터 비웁니다
+  (다시 열면 이미지 디스크 캐시에서 빠르게 다시 받아요).
+- 프로세스 전체 예산을 넘으면, 모든 세션의 오래 안 본 갤러리부터 임시 파일로 내립니다(spill).
+  st.image는 파일 경로도 받기 때문에 화면 코드는 그대로 씁니다.
+- 업로드 대기 사진(draft_images): 큰 사진은 처음부터 임시 파일로 두고, 업로드할 때 draft_bytes로 읽습니다.
+- 일정/날짜별 '지도 불러오기' 표시는 세션당 최근 MAX_MAP_FLAGS개만 기억합니다.
+
+secrets.toml:
+    [memory]
+    session_mb = 64
+    global_mb = 512
+    spill_kb = 512
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+import streamlit as st
+
+from app_runtime import process_singleton, secret_num, secret_section
+
+SESSION_BUDGET_MB = 64
+GLOBAL_BUDGET_MB = 512
+SPILL_MIN_KB = 512  # 이보다 큰 업로드 대기 사진은 바로 임시 파일로
+MAX_MAP_FLAGS = 32
+
+Blob = Union[bytes, str]  # 메모리의 바이트 또는 임시 파일 경로
+
+
+def _config() -> Dict[str, Any]:
+    cfg = secret_section("memory")
+    return {
+        "session_bytes": int(secret_num(cfg, "session_mb", SESSION_BUDGET_MB) * 1024 * 1024),
+        "global_bytes": int(secret_num(cfg, "global_mb", GLOBAL_BUDGET_MB) * 1024 * 1024),
+        "spill_bytes": int(secret_num(cfg, "spill_kb", SPILL_MIN_KB) * 1024),
+    }
+
+
+def _blob_size(b: Blob) -> int:
+    if isinstance(b, (bytes, bytearray)):
+        return len(b)
+    try:
+        return os.path.getsize(b)
+    except OSError:
+        return 0
+
+
+def draft_bytes(data: Blob) -> bytes:
+    """업로드 대기 사진(바이트 또는 임시 파일 경로) -> 바이트."""
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    with open(data, "rb") as f:
+        return f.read()
+
+
+class SessionMemory:
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._lock = threading.RLock()
+        self._galleries: "OrderedDict[str, List[Blob]]" = OrderedDict()  # 오래 안 본 것이 앞
+        self._viewed: Dict[str, float] = {}
+        self._drafts: Dict[str, tuple] = {}  # key -> (id(list), 메모리에 있는 바이트 수)
+        self._map_flags: "OrderedDict[str, bool]" = OrderedDict()
+        self._dir = tempfile.mkdtemp(prefix="trip-session-")
+        self.evictions = 0
+        self.spills = 0
+        # 세션이 끝나서 이 객체가 사라지면 임시 파일도 같이 정리
+        weakref.finalize(self, shutil.rmtree, self._dir, True)
+
+    # --- 임시 파일 ---
+    def _spill(self, data: bytes) -> str:
+        path = os.path.join(self._dir, uuid.uuid4().hex)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.spills += 1
+        return path
+
+    def _discard(self, blobs: List[Blob]) -> None:
+        for b in blobs:
+            if isinstance(b, str) and b.startswith(self._dir):
+                try:
+                    os.remove(b)
+                except OSError:
+                    pass
+
+    # --- 갤러리 ---
+    def put_gallery(self, item_id: str, blobs: List[bytes]) -> None:
+        with self._lock:
+            self._discard(self._galleries.pop(item_id, []))
+            self._galleries[item_id] = list(blobs)
+            self._viewed[item_id] = time.time()
+            self._enforce_session(keep=item_id)
+        _registry().enforce()
+
+    def gallery(self, item_id: str) -> Optional[List[Blob]]:
+        with self._lock:
+            blobs = self._galleries.get(item_id)
+            if blobs is None:
+                return None
+            self._galleries.move_to_end(item_id)
+            self._viewed[item_id] = time.time()
+            return list(blobs)
+
+    def has_gallery(self, item_id: str) -> bool:
+        with self._lock:
+            return item_id in self._galleries
+
+    def drop_gallery(self, item_id: str) -> None:
+        with self._lock:
+            self._discard(self._galleries.pop(item_id, []))
+            self._viewed.pop(item_id, None)
+
+    def clear_galleries(self) -> None:
+        with self._lock:
+            for item_id in list(self._galleries):
+                self.drop_gallery(item_id)
+
+    def _enforce_session(self, keep: Optional[str] = None) -> None:
+        # 세션 예산 초과 -> 오래 안 본 갤러리부터 비움(방금 불러온 갤러리는 유지)
+        while self.memory_bytes() > self.config["session_bytes"]:
+            victim = next((k for k in self._galleries if k != keep), None)
+            if victim is None:
+                break
+            self.drop_gallery(victim)
+            self.evictions += 1
+
+    def spill_oldest_gallery(self) -> Optional[float]:
+        """메모리에 남은 가장 오래 안 본 갤러리를 임시 파일로 내립니다. 내린 게 없으면 None."""
+        with self._lock:
+            for item_id, blobs in self._galleries.items():
+                if any(isinstance(b, (bytes, bytearray)) for b in blobs):
+                    self._galleries[item_id] = [
+                        self._spill(b) if isinstance(b, (bytes, bytearray)) else b for b in blobs
+                    ]
+                    return self._viewed.get(item_id, 0.0)
+        return None
+
+    def oldest_in_memory(self) -> Optional[float]:
+        with self._lock:
+            for item_id, blobs in self._galleries.items():
+                if any(isinstance(b, (bytes, bytearray)) for b in blobs):
+                    return self._viewed.get(item_id, 0.0)
+        return None
+
+    # --- 업로드 대기 사진 ---
+    def note_drafts(self, key: str, drafts: List[tuple]) -> None:
+        with self._lock:
+            self._drafts[key] = (id(drafts), sum(len(d) for d, _ in drafts if isinstance(d, (bytes, bytearray))))
+
+    def draft_blob(self, raw: bytes) -> Blob:
+        """큰 사진이거나 세션 예산을 넘었으면 임시 파일로."""
+        with self._lock:
+            if len(raw) >= self.config["spill_bytes"] or self.memory_bytes() + len(raw) > self.config["session_bytes"]:
+                return self._spill(raw)
+            return raw
+
+    def forget_drafts(self, key: str, drafts: List[tuple]) -> None:
+        with self._lock:
+            self._discard([d for d, _ in drafts])
+            self._drafts.pop(key, None)
+
+    # --- 지도 불러오기 표시 ---
+    def map_loaded(self, key: str) -> bool:
+        with self._lock:
+            return self._map_flags.get(key, False)
+
+    def set_map_loaded(self, key: str) -> None:
+        with self._lock:
+            self._map_flags[key] = True
+            self._map_flags.move_to_end(key)
+            while len(self._map_flags) > MAX_MAP_FLAGS:
+                self._map_flags.popitem(last=False)
+
+    # --- 사용량 ---
+    def memory_bytes(self) -> int:
+        with self._lock:
+            galleries = sum(len(b) for blobs in self._galleries.values() for b in blobs if isinstance(b, (bytes, bytearray)))
+            return galleries + sum(n for _, n in self._drafts.values())
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            all_blobs = [b for blobs in self._galleries.values() for b in blobs]
+            return {
+                "memory_bytes": self.memory_bytes(),
+                "spilled_bytes": sum(_blob_size(b) for b in all_blobs if isinstance(b, str)),
+                "galleries": len(self._galleries),
+                "draft_bytes": sum(n for _, n in self._drafts.values()),
+                "map_flags": len(self._map_flags),
+                "budget_bytes": self.config["session_bytes"],
+                "evictions": self.evictions,
+                "spills": self.spills,
+            }
+
+
+class _Registry:
+    """살아 있는 세션들의 SessionMemory(약한 참조)와 전체 예산."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: "weakref.WeakSet[SessionMemory]" = weakref.WeakSet()
+        self.spills = 0
+
+    def add(self, mem: SessionMemory) -> None:
+        with self._lock:
+            self._sessions.add(mem)
+
+    def enforce(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions)
+            if not sessions:
+                return
+            budget = sessions[0].config["global_bytes"]
+            total = sum(m.memory_bytes() for m in sessions)
+            while total > budget:
+                candidates = [(m.oldest_in_memory(), i) for i, m in enumerate(sessions)]
+                candidates = [(t, i) for t, i in candidates if t is not None]
+                if not candidates:
+                    break
+                victim = sessions[min(candidates)[1]]
+                before = victim.memory_bytes()
+                victim.spill_oldest_gallery()
+                self.spills += 1
+                total -= before - victim.memory_bytes()
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions)
+            return {
+                "sessions": len(sessions),
+                "memory_bytes": sum(m.memory_bytes() for m in sessions),
+                "budget_bytes": sessions[0].config["global_bytes"] if sessions else _config()["global_bytes"],
+                "spills": self.spills,
+            }
+
+
+def _new_registry() -> _Registry:
+    return _Registry()
+
+
+_registry = process_singleton(_new_registry)
+
+
+def _new_default_memory() -> SessionMemory:
+    """세션이 없을 때(유지보수 스크립트 등) 함께 쓰는 메모리 관리자."""
+    mem = SessionMemory(_config())
+    _registry().add(mem)
+    return mem
+
+
+_default_memory = process_singleton(_new_default_memory)
+
+
+def current() -> SessionMemory:
+    """이 세션의 메모리 관리자."""
+    try:
+        mem = st.session_state.get("_session_memory")
+        if mem is None:
+            mem = st.session_state["_session_memory"] = SessionMemory(_config())
+            _registry().add(mem)
+        return mem
+    except Exception:
+        return _default_memory()
+
+
+def add_draft(key: str, raw: bytes, mime: str) -> bool:
+    """st.session_state[key] 목록에 업로드 대기 사진을 추가합니다. 이미 같은 사진이 있으면 False."""
+    mem = current()
+    drafts = st.session_state.setdefault(key, [])
+    size = len(raw)
+    for data, _m in drafts:
+        if _blob_size(data) == size and draft_bytes(data) == raw:
+            return False
+    drafts.append((mem.draft_blob(raw), mime))
+    mem.note_drafts(key, drafts)
+    return True
+
+
+def clear_drafts(key: str) -> None:
+    mem = current()
+    mem.forget_drafts(key, st.session_state.get(key) or [])
+    st.session_state[key] = []
+
+
+def usage() -> Dict[str, Any]:
+    """{"session": 이 세션 사용량, "global": 프로세스 전체 사용량}"""
+    return {"session": current().usage(), "global": _registry().usage()}
+
+
+def usage_label() -> str:
+    u = usage()
+    mb = 1024 * 1024
+    return (
+        f"🧠 메모리 {u['session']['memory_bytes'] / mb:.1f}/{u['session']['budget_bytes'] / mb:.0f}MB"
+        f" · 전체 {u['global']['memory_bytes'] / mb:.0f}/{u['global']['budget_bytes'] / mb:.0f}MB"
+        f" ({u['global']['sessions']}세션)"
+    )
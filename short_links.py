@@ -0,0 +1,140 @@
+"""
+지도 단축 링크(maps.app.goo.gl, goo.gl/maps) 펼치기.
+
+- 프로세스 공용 requests.Session 하나(연결 풀/keep-alive)로, 리다이렉트를 직접 따라가며 HEAD만 보냅니다.
+  Google 지도 HTML 본문은 받지 않아요. 단축 링크 호스트를 벗어나는 첫 Location에서 멈춥니다.
+- HEAD를 거부하는 서버(405/501)만 GET(stream=True)으로 헤더까지만 읽고 연결을 닫습니다.
+- 펼친 결과는 geo_cache(SQLite)에 영구 저장합니다. 실패는 저장하지 않아요(다음에 다시 시도).
+- resolve_many는 여러 링크를 동시에 펼칩니다.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import urljoin, urlparse
+
+from app_runtime import process_singleton
+from geo_cache import geo_cache
+
+try:
+    import requests  # type: ignore
+    from requests.adapters import HTTPAdapter  # type: ignore
+except Exception:
+    requests = None
+
+MAX_REDIRECTS = 8
+TIMEOUT_S = 6
+MAX_WORKERS = 8
+SHORT_HOSTS = ("maps.app.goo.gl", "goo.gl")
+_USER_AGENT = "Mozilla/5.0"
+
+
+def is_short_link(url: str) -> bool:
+    try:
+        host = (urlparse((url or "").strip()).netloc or "").lower()
+    except Exception:
+        return False
+    return any(host == h or host.endswith("." + h) for h in SHORT_HOSTS)
+
+
+class ShortLinkResolver:
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._memo: Dict[str, str] = {}
+        self.stats = {"memory_hits": 0, "store_hits": 0, "resolved": 0, "failed": 0, "requests": 0}
+        self._session = None
+        if requests is not None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = _USER_AGENT
+            self._session = session
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    def cached(self, url: str) -> Optional[str]:
+        """네트워크 없이 알고 있는 펼친 URL(메모리 -> SQLite), 없으면 None."""
+        with self._lock:
+            hit = self._memo.get(url)
+        if hit:
+            self._count("memory_hits")
+            return hit
+        hit = geo_cache().get_short_link(url)
+        if hit:
+            self._count("store_hits")
+            with self._lock:
+                self._memo[url] = hit
+        return hit
+
+    def _follow(self, url: str) -> Optional[str]:
+        current = url
+        for _ in range(MAX_REDIRECTS):
+            self._count("requests")
+            resp = self._session.head(current, allow_redirects=False, timeout=TIMEOUT_S)
+            if resp.status_code in (405, 501):
+                # HEAD 미지원: 헤더만 받고 본문은 읽지 않은 채 닫음
+                resp = self._session.get(current, allow_redirects=False, timeout=TIMEOUT_S, stream=True)
+                resp.close()
+            location = resp.headers.get("Location")
+            if not (300 <= resp.status_code < 400 and location):
+                return current if current != url else None
+            current = urljoin(current, location)
+            if not is_short_link(current):
+                return current  # 펼친 지도 URL에 도착(그 뒤의 동의/리다이렉트 페이지는 필요 없음)
+        return None
+
+    def resolve(self, url: str) -> str:
+        """펼친 URL. 단축 링크가 아니거나 펼치지 못하면 url 그대로."""
+        url = (url or "").strip()
+        if not url or not is_short_link(url):
+            return url
+        hit = self.cached(url)
+        if hit:
+            return hit
+        if self._session is None:
+            return url
+        try:
+            expanded = self._follow(url)
+        except Exception:
+            expanded = None
+        if not expanded:
+            self._count("failed")
+            return url
+        self._count("resolved")
+        with self._lock:
+            self._memo[url] = expanded
+        geo_cache().put_short_link(url, expanded)
+        return expanded
+
+    def resolve_many(self, urls: Iterable[str]) -> Dict[str, str]:
+        """{단축 링크: 펼친 URL}. 저장소에 없는 링크만 동시에 펼칩니다."""
+        todo = [u for u in dict.fromkeys((u or "").strip() for u in urls) if u and is_short_link(u)]
+        out = {}
+        missing = []
+        for u in todo:
+            hit = self.cached(u)
+            if hit:
+                out[u] = hit
+            else:
+                missing.append(u)
+        if len(missing) == 1:
+            out[missing[0]] = self.resolve(missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                for u, expanded in zip(missing, pool.map(self.resolve, missing)):
+                    out[u] = expanded
+        return out
+
+
+def _new_resolver() -> ShortLinkResolver:
+    return ShortLinkResolver()
+
+
+resolver = process_singleton(_new_resolver)
+
+
+def short_link_stats() -> Dict[str, int]:
+    return dict(resolver().stats)
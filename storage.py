@@ -0,0 +1,550 @@
+"""
+저장소 선택. 페이지는 drive_store 대신 이 모듈을 통해 DB/사진을 읽고 씁니다.
+
+secrets.toml:
+    [storage]
+    backend = "drive"      # 기본값. Google Drive (drive_store)
+    # backend = "local"    # 로컬 SQLite(DB) + 디렉터리(사진). Drive 인증 없이 동작
+    # local_dir = "trip_data"
+    # watch_changes = true     # 변경 감시: 다른 세션/기기의 저장을 알아채서 열린 화면을 새로고침
+    # watch_interval_s = 10
+
+로컬 백엔드는 Drive 없이 쓰는 작은 설치, 그리고 Drive 지연 없이 성능/부하 테스트를 할 때 씁니다.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import streamlit as st
+
+import db_ops
+import drive_store
+import image_pipeline
+from change_feed import ChangeWatcher, FakeChangeFeed
+from db_ops import TripDB
+# 저장소와 무관한 DB/사진 도우미는 drive_store에 있지만, 페이지는 이 모듈만 보도록 함께 내보냄
+from drive_store import (
+    StorageUnavailableError, list_trip_names, make_image_filename, preview_image_ids, save_status_label,
+)
+
+__all__ = [
+    "StorageBackend", "DriveBackend", "LocalBackend", "StorageUnavailableError", "get_backend",
+    "root_id", "load_db", "load_db_or_stop", "save_db", "save_status", "save_status_label",
+    "upload_images_bytes", "get_image_bytes", "get_images_bytes", "remember_upload_failures", "show_upload_warning",
+    "show_save_conflicts",
+    "list_trip_names", "make_image_filename", "preview_image_ids", "debug_stats", "watch_changes",
+]
+
+DEFAULT_LOCAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trip_data")
+LOCAL_ROOT_ID = "local"
+UPLOAD_WARNING_KEY = "_upload_warning"  # 저장 직후 재실행/페이지 이동 뒤에 보여줄 업로드 실패 안내
+CONFLICT_NOTICE_KEY = "_save_conflicts"  # 같은 방식으로 보여줄 동시 수정 충돌 안내
+WATCH_NUDGE_S = 5  # 세션이 변경 감시 세대 번호를 확인하는 주기(초, 메모리만 읽음)
+
+
+class StorageBackend:
+    """저장소 인터페이스. root_id는 Drive에선 루트 폴더 id, 로컬에선 무시됩니다."""
+
+    name = ""
+
+    def default_root_id(self) -> str:
+        raise NotImplementedError
+
+    def load_db(self, root_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def save_db(self, root_id: str, db: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def upload_image_bytes(self, root_id: str, filename: str, img_bytes: bytes, mime: str) -> str:
+        """사진 한 장. 여러 장과 같은 경로(정규화/썸네일/중복 제거)로 올리고 file id만 돌려줍니다."""
+        result = self.upload_images_bytes(root_id, [(filename, img_bytes, mime)])
+        if result["failed"]:
+            raise RuntimeError(result["failed"][0][1])
+        return result["ids"][0]
+
+    def get_image_bytes(self, image_file_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def upload_images_bytes(self, root_id: str, files: List[tuple]) -> Dict[str, Any]:
+        """files: [(filename, bytes, mime), ...] -> drive_store.upload_images_bytes와 같은 모양의 결과."""
+        raise NotImplementedError
+
+    def get_images_bytes(self, image_file_ids: List[str]) -> Iterator[tuple]:
+        """(index, file_id, bytes|None)를 내보냅니다(끝나는 순서대로일 수 있음)."""
+        for i, fid in enumerate(image_file_ids or []):
+            yield i, fid, self.get_image_bytes(fid)
+
+    def save_status(self, root_id: str) -> Dict[str, Any]:
+        return {"enabled": False, "state": "flushed", "pending_ops": 0}
+
+    def change_generation(self) -> Optional[int]:
+        """다른 세션의 저장이 감지될 때마다 늘어나는 번호. 변경 감시가 꺼져 있으면 None."""
+        return None
+
+    def generation_of(self, db: Dict[str, Any]) -> Optional[int]:
+        """
+        이 db가 이미 반영하고 있는 세대 번호(알 수 있으면). 세션이 방금 불러오거나 저장한 내용 때문에
+        자기 자신을 다시 새로고침하지 않도록 씁니다. 모르면 None(불러오기 전 세대 번호를 씀).
+        """
+        return None
+
+    def debug_stats(self) -> Dict[str, Any]:
+        """디버그 패널에 함께 보여줄 캐시/클라이언트 통계."""
+        return {}
+
+
+class DriveBackend(StorageBackend):
+    name = "drive"
+
+    def default_root_id(self) -> str:
+        return st.secrets["drive"]["root_folder_id"]
+
+    def load_db(self, root_id: str) -> Dict[str, Any]:
+        return drive_store.load_db(root_id)
+
+    def save_db(self, root_id: str, db: Dict[str, Any]) -> Dict[str, Any]:
+        return drive_store.save_db(root_id, db)
+
+    def _images_folder(self, root_id: str) -> tuple:
+        service = drive_store._drive_service()
+        return service, drive_store.ensure_subfolder(service, root_id, drive_store.IMAGES_FOLDER_NAME)
+
+    def get_image_bytes(self, image_file_id: str) -> Optional[bytes]:
+        return drive_store.get_image_bytes(image_file_id)
+
+    def upload_images_bytes(self, root_id: str, files: List[tuple]) -> Dict[str, Any]:
+        service, folder_id = self._images_folder(root_id)
+        return drive_store.upload_images_bytes(service, folder_id, files)
+
+    def get_images_bytes(self, image_file_ids: List[str]) -> Iterator[tuple]:
+        return drive_store.get_images_bytes(image_file_ids)
+
+    def save_status(self, root_id: str) -> Dict[str, Any]:
+        return drive_store.save_status(root_id)
+
+    def change_generation(self) -> Optional[int]:
+        return drive_store.change_generation()
+
+    def debug_stats(self) -> Dict[str, Any]:
+        return {
+            "DB 캐시": drive_store.db_cache_stats(),
+            "사진 캐시": drive_store.image_cache_stats(),
+            "Drive 클라이언트": drive_store.drive_client_stats(),
+            "변경 감시": drive_store.change_watcher_status(),
+        }
+
+
+_LOCAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS trips (
+    id TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    md5 TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    id TEXT PRIMARY KEY,
+    sha256 TEXT,
+    filename TEXT,
+    mime TEXT,
+    size INTEGER,
+    orig_size INTEGER,
+    thumbs TEXT,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images(sha256);
+CREATE TABLE IF NOT EXISTS image_digests (
+    sha256 TEXT PRIMARY KEY,
+    id TEXT NOT NULL
+);
+INSERT OR IGNORE INTO image_digests (sha256, id) SELECT sha256, id FROM images WHERE sha256 IS NOT NULL;
+"""
+
+
+class LocalBackend(StorageBackend):
+    """
+    로컬 저장소: <local_dir>/trips.sqlite3 (여행 1개 = 1행, 리비전 번호) + <local_dir>/blobs/ (사진).
+
+    - 저장은 BEGIN IMMEDIATE 트랜잭션 안에서 Drive와 같은 방식(diff -> merge_onto)으로 합치고,
+      내용(md5)이 바뀐 여행 행만 다시 씁니다.
+    - 사진 id는 저장된 바이트의 sha256 앞부분이라 같은 사진은 한 번만 저장돼요. 원본 sha256 -> 사진 id는
+      image_digests에 따로 두어서, 정규화 결과가 같은 서로 다른 원본도 각자 중복 제거됩니다.
+    - 변경 감시는 메모리 변경 피드(FakeChangeFeed)로 합니다: 저장할 때마다 새 리비전 번호를 넣어서
+      Drive 없이도 다른 세션 새로고침 흐름을 그대로 시험할 수 있어요. 세대 번호 = 감시가 본 최신 리비전이라,
+      이미 그 리비전을 불러왔거나 직접 저장한 세션은 새로고침하지 않습니다.
+    """
+
+    name = "local"
+
+    def __init__(self, root_dir: str, watch: Optional[Dict[str, Any]] = None):
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir, "blobs")
+        self.db_path = os.path.join(root_dir, "trips.sqlite3")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_LOCAL_SCHEMA)
+        self.changes = FakeChangeFeed()
+        self._watcher: Optional[ChangeWatcher] = None
+        self._latest_rev = int(self._revision(self._conn()))
+        if watch and watch.get("enabled"):
+            self._watcher = ChangeWatcher(self.changes, self._on_changes, watch["interval_s"]).start()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 연결은 스레드 간 공유가 안 되므로 스레드마다 하나씩
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def default_root_id(self) -> str:
+        return LOCAL_ROOT_ID
+
+    @staticmethod
+    def _revision(conn: sqlite3.Connection) -> str:
+        row = conn.execute("SELECT value FROM meta WHERE key='revision'").fetchone()
+        return row[0] if row else "0"
+
+    @staticmethod
+    def _read_trips(conn: sqlite3.Connection) -> Dict[str, Any]:
+        rows = conn.execute("SELECT doc FROM trips ORDER BY pos").fetchall()
+        return db_ops.ensure_ids({"trips": [json.loads(doc) for (doc,) in rows]})
+
+    def load_db(self, root_id: str) -> Dict[str, Any]:
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                data, rev = self._read_trips(conn), self._revision(conn)
+            finally:
+                conn.execute("COMMIT")
+            out = TripDB(data)
+            out.head = rev
+            out.rev = f"local:{self.db_path}:{rev}"
+            return out
+        except sqlite3.Error as e:
+            raise StorageUnavailableError(f"로컬 DB를 읽지 못했어요: {e}") from e
+
+    @staticmethod
+    def _write_trips(conn: sqlite3.Connection, db: Dict[str, Any]) -> None:
+        existing = dict(conn.execute("SELECT id, md5 FROM trips").fetchall())
+        keep = set()
+        for pos, t in enumerate(db.get("trips", []) or []):
+            doc = json.dumps(t, ensure_ascii=False, separators=(",", ":"))
+            md5 = hashlib.md5(doc.encode("utf-8")).hexdigest()
+            keep.add(t["id"])
+            if existing.get(t["id"]) == md5:
+                conn.execute("UPDATE trips SET pos=? WHERE id=? AND pos<>?", (pos, t["id"], pos))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO trips (id, pos, md5, doc) VALUES (?, ?, ?, ?)",
+                    (t["id"], pos, md5, doc),
+                )
+        for tid in set(existing) - keep:
+            conn.execute("DELETE FROM trips WHERE id=?", (tid,))
+
+    def save_db(self, root_id: str, db: Dict[str, Any]) -> Dict[str, Any]:
+        if isinstance(db, TripDB):
+            base, head = db.base, db.head
+        else:
+            fresh = self.load_db(root_id)
+            base, head = fresh, getattr(fresh, "head", "0")
+
+        ops = db_ops.diff_db(base, db)
+        result: Dict[str, Any] = {"ops": len(ops), "merged_ops": 0, "conflicts": []}
+        if not ops:
+            return result
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # 쓰기 잠금: 동시에 저장해도 한 번에 하나씩 병합
+        try:
+            rev = self._revision(conn)
+            merged, theirs, conflicts = db_ops.merge_onto(base, self._read_trips(conn), ops, concurrent=rev != head)
+            result["merged_ops"], result["conflicts"] = len(theirs), conflicts
+            self._write_trips(conn, merged)
+            new_rev = str(int(rev) + 1)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (new_rev,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if isinstance(db, TripDB):
+            if theirs:
+                db.clear()
+                db.update(merged)
+            db.rebase()
+            db.head = new_rev
+        self.changes.push("trips", name=new_rev)
+        return result
+
+    def _on_changes(self, changes: List[Dict[str, Any]]) -> bool:
+        """감시 스레드 콜백: 이미 본 리비전보다 새 저장이 있을 때만 관련 변경."""
+        revs = [int(c["name"]) for c in changes if c.get("file_id") == "trips" and str(c.get("name")).isdigit()]
+        if not revs or max(revs) <= self._latest_rev:
+            return False
+        self._latest_rev = max(revs)
+        return True
+
+    def change_generation(self) -> Optional[int]:
+        return self._latest_rev if self._watcher is not None else None
+
+    def generation_of(self, db: Dict[str, Any]) -> Optional[int]:
+        head = getattr(db, "head", "")
+        return int(head) if str(head).isdigit() else None
+
+    def debug_stats(self) -> Dict[str, Any]:
+        return {"변경 감시": self._watcher.status() if self._watcher is not None else {"enabled": False}}
+
+    def _blob_path(self, image_file_id: str) -> str:
+        safe = os.path.basename(image_file_id)
+        return os.path.join(self.blob_dir, safe[:2], safe)
+
+    def _put_blob(self, data: bytes) -> str:
+        fid = hashlib.sha256(data).hexdigest()[:32]
+        path = self._blob_path(fid)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return fid
+
+    def get_image_bytes(self, image_file_id: str) -> Optional[bytes]:
+        if not image_file_id:
+            return None
+        try:
+            with open(self._blob_path(image_file_id), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def upload_images_bytes(self, root_id: str, files: List[tuple]) -> Dict[str, Any]:
+        """Drive 버전과 같은 정규화/썸네일/중복 제거를 로컬에서 합니다."""
+        t_start = time.perf_counter()
+        conn = self._conn()
+        config = drive_store._image_config()
+        ids: List[Optional[str]] = [None] * len(files)
+        thumbs_by_id: Dict[str, Dict[str, str]] = {}
+        failed = []
+        deduped = bytes_skipped = orig_total = stored_total = 0
+
+        for i, (filename, raw, mime) in enumerate(files):
+            digest = drive_store.image_digest(raw)
+            try:
+                row = conn.execute(
+                    "SELECT d.id, i.thumbs FROM image_digests d LEFT JOIN images i ON i.id = d.id WHERE d.sha256=?",
+                    (digest,),
+                ).fetchone()
+                if row:
+                    ids[i] = row[0]
+                    if row[1]:
+                        thumbs_by_id[row[0]] = json.loads(row[1])
+                    deduped += 1
+                    bytes_skipped += len(raw)
+                    continue
+                norm = image_pipeline.normalize_image(raw, mime or "image/png", config)
+                fid = self._put_blob(norm["bytes"])
+                thumbs = {key: self._put_blob(tb) for key, (tb, _m) in image_pipeline.make_thumbnails(norm["bytes"]).items()}
+                # 같은 바이트로 정규화된 다른 원본이 이미 있으면 그 행(첫 원본의 정보)은 그대로 둠
+                conn.execute(
+                    "INSERT OR IGNORE INTO images (id, sha256, filename, mime, size, orig_size, thumbs, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fid, digest, f"{filename.rsplit('.', 1)[0]}.{norm['ext']}", norm["mime"],
+                     norm["stored_bytes"], norm["orig_bytes"], json.dumps(thumbs), time.time()),
+                )
+                conn.execute("INSERT OR IGNORE INTO image_digests (sha256, id) VALUES (?, ?)", (digest, fid))
+                ids[i] = fid
+                if thumbs:
+                    thumbs_by_id[fid] = thumbs
+                orig_total += norm["orig_bytes"]
+                stored_total += norm["stored_bytes"]
+            except Exception as e:
+                failed.append((i, str(e)))
+
+        return {
+            "ids": ids, "thumbs_by_id": thumbs_by_id, "failed": failed,
+            "deduped": deduped, "bytes_skipped": bytes_skipped,
+            "orig_bytes": orig_total, "stored_bytes": stored_total,
+            "elapsed_s": time.perf_counter() - t_start,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_backend() -> StorageBackend:
+    cfg = drive_store._storage_config()
+    kind = str(cfg.get("backend", "drive")).lower()
+    if kind == "local":
+        return LocalBackend(cfg.get("local_dir") or DEFAULT_LOCAL_DIR, drive_store.watch_config())
+    if kind != "drive":
+        raise ValueError(f"알 수 없는 storage backend: {kind}")
+    return DriveBackend()
+
+
+# 페이지에서 쓰는 함수들(선택된 백엔드로 전달)
+def root_id() -> str:
+    return get_backend().default_root_id()
+
+
+def load_db(root_folder_id: str) -> Dict[str, Any]:
+    return get_backend().load_db(root_folder_id)
+
+
+def load_db_or_stop(root_folder_id: str) -> Dict[str, Any]:
+    """
+    페이지용 load_db. 불러오기에 실패하면 오류와 '다시 시도'만 보여주고 페이지를 멈춥니다
+    (빈 목록으로 착각해서 그 위에 저장하면 실제 데이터를 덮어쓰게 되므로).
+    """
+    # 불러오기 전에 세대 번호를 기억(불러오는 중에 들어온 변경도 놓치지 않게)
+    st.session_state["_seen_change_generation"] = _change_generation()
+    try:
+        db = load_db(root_folder_id)
+        _mark_seen(db)
+        return db
+    except StorageUnavailableError as e:
+        st.error("여행 데이터를 불러오지 못했어. 잠시 후 다시 시도해줘. (저장된 데이터는 그대로 있어요)")
+        st.caption(str(e))
+        if st.button("🔄 다시 시도"):
+            st.rerun()
+        st.stop()
+
+
+def save_db(root_folder_id: str, db: Dict[str, Any]) -> Dict[str, Any]:
+    names = _conflict_names(db)  # 저장 뒤에는 내가 지운 일정의 이름을 알 수 없으므로 미리
+    result = get_backend().save_db(root_folder_id, db)
+    _mark_seen(db)  # 내 저장으로 올라간 세대 번호 때문에 내 화면을 다시 새로고침하지 않게
+    if result.get("conflicts"):
+        _remember_conflicts(result["conflicts"], names)
+    return result
+
+
+def _conflict_names(db: Dict[str, Any]) -> Dict[str, str]:
+    names: Dict[str, str] = {}
+    for t in db.get("trips", []) or []:
+        names[t.get("id")] = t.get("name") or "여행"
+        for it in t.get("items", []) or []:
+            names[it.get("id")] = it.get("title") or "일정"
+    return names
+
+
+_FIELD_LABELS = {
+    "title": "제목", "date": "날짜", "time": "시간", "memo": "메모", "map_url": "지도 링크", "map_text": "장소",
+    "image_file_ids": "사진", "image_thumbs": "사진", "name": "여행 이름",
+}
+
+
+def _conflict_message(c: Dict[str, Any], names: Dict[str, str]) -> str:
+    trip = names.get(c.get("trip_id"), "여행")
+    label = f"{trip} · {names.get(c.get('item_id'), '일정')}" if c.get("item_id") else trip
+    if c.get("kind") == "same_field":
+        fields = ", ".join(dict.fromkeys(_FIELD_LABELS.get(f, f) for f in c.get("fields") or []))
+        return f"{label}: {fields}을(를) 다른 사람도 동시에 고쳤어요. 내 값으로 저장됐어요."
+    if c.get("kind") == "delete_vs_update":
+        return f"{label}: 한쪽에서 삭제해서 수정한 내용은 반영되지 않았어요."
+    return f"{label}: 여행이 다른 곳에서 삭제돼서 이 변경은 반영되지 않았어요."
+
+
+def _remember_conflicts(conflicts: List[Dict[str, Any]], names: Dict[str, str]) -> None:
+    try:
+        msgs = st.session_state.get(CONFLICT_NOTICE_KEY) or []
+        st.session_state[CONFLICT_NOTICE_KEY] = msgs + [_conflict_message(c, names) for c in conflicts]
+    except Exception:
+        pass
+
+
+def show_save_conflicts() -> None:
+    """저장할 때 다른 세션의 동시 수정과 겹친 부분을 다음 화면에 한 번 보여줍니다."""
+    msgs = st.session_state.pop(CONFLICT_NOTICE_KEY, None)
+    if msgs:
+        st.warning("다른 사람과 동시에 고친 부분이 있어:\n\n" + "\n".join(f"- {m}" for m in dict.fromkeys(msgs)))
+
+
+def save_status(root_folder_id: str) -> Dict[str, Any]:
+    return get_backend().save_status(root_folder_id)
+
+
+def upload_images_bytes(root_folder_id: str, files: List[tuple]) -> Dict[str, Any]:
+    return get_backend().upload_images_bytes(root_folder_id, files)
+
+
+def get_image_bytes(image_file_id: str) -> Optional[bytes]:
+    return get_backend().get_image_bytes(image_file_id)
+
+
+def remember_upload_failures(result: Dict[str, Any]) -> None:
+    """업로드 실패 안내를 다음 화면에 보여주도록 기억(저장 뒤 바로 st.rerun/switch_page하면 지금 띄운 경고는 사라짐)."""
+    if result.get("failed"):
+        st.session_state[UPLOAD_WARNING_KEY] = f"사진 {len(result['failed'])}장은 업로드에 실패했어. (나머지는 저장돼요)"
+
+
+def show_upload_warning() -> None:
+    msg = st.session_state.pop(UPLOAD_WARNING_KEY, None)
+    if msg:
+        st.warning(msg)
+
+
+def get_images_bytes(image_file_ids: List[str]) -> Iterator[tuple]:
+    return get_backend().get_images_bytes(image_file_ids)
+
+
+def debug_stats() -> Dict[str, Any]:
+    try:
+        return get_backend().debug_stats()
+    except Exception:
+        return {}
+
+
+def _change_generation() -> Optional[int]:
+    try:
+        return get_backend().change_generation()
+    except Exception:
+        return None
+
+
+def _seen_with(seen: Optional[int], gen: Optional[int]) -> Optional[int]:
+    """본 세대 번호에 gen(불러오거나 저장한 db가 반영한 번호)을 더한 값."""
+    if gen is None:
+        return seen
+    return gen if seen is None else max(seen, gen)
+
+
+def _needs_refresh(gen: Optional[int], seen: Optional[int]) -> bool:
+    """감시가 본 세대 번호가 이 세션이 본 것보다 새로우면 새로고침."""
+    return gen is not None and seen is not None and gen > seen
+
+
+def _mark_seen(db: Dict[str, Any]) -> None:
+    """db가 이미 반영한 세대 번호까지는 본 것으로 기록(백엔드가 알려줄 수 있을 때만)."""
+    try:
+        seen = st.session_state.get("_seen_change_generation")
+        st.session_state["_seen_change_generation"] = _seen_with(seen, get_backend().generation_of(db))
+    except Exception:
+        pass
+
+
+@st.fragment(run_every=WATCH_NUDGE_S)
+def _watch_fragment() -> None:
+    gen = _change_generation()
+    seen = st.session_state.get("_seen_change_generation")
+    if _needs_refresh(gen, seen):
+        st.session_state["_seen_change_generation"] = gen
+        st.rerun(scope="app")  # 다른 세션이 저장함 -> 바뀐 것만 다시 받아서 화면 갱신
+
+
+def watch_changes() -> None:
+    """
+    페이지에서 호출: 변경 감시가 켜져 있으면 몇 초마다 세대 번호만 확인하고(Drive 호출 없음),
+    다른 세션/기기의 저장이 감지되면 페이지를 다시 실행합니다. load_db_or_stop 다음에 부르세요.
+    """
+    if _change_generation() is not None:
+        _watch_fragment()
+
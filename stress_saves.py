@@ -0,0 +1,349 @@
+"""
+동시 저장 부하 시험: 여러 세션(스레드)이 같은 여행에 동시에 저장해도 일정이 사라지지 않는지 확인합니다.
+
+    python maintenance.py stress-saves --writers 8 --saves 10              # 메모리 Drive(저널 경로)
+    python maintenance.py stress-saves --backend local --writers 8         # 로컬 SQLite 백엔드
+
+- 세션마다 불러오기 -> (잠깐 편집) -> 저장을 반복합니다. 각 저장은 자기만의 새 일정 하나를 더하고,
+  shared_every번째 저장마다 모두가 함께 쓰는 일정의 같은 필드를 고칩니다(충돌 보고 확인용).
+- 끝나면 캐시를 비우고 다시 불러와서, 추가한 일정이 모두 있는지와 충돌이 보고됐는지 확인합니다.
+- drive 모드는 실제 Drive 대신 MemoryDrive(메모리에 흉내 낸 Drive v3)로 drive_store의 저널/병합/압축
+  경로를 그대로 돌립니다. Drive 인증도 실제 캐시 폴더도 쓰지 않아요(임시 폴더를 쓰고 끝나면 되돌림).
+"""
+import contextlib
+import hashlib
+import itertools
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import drive_store
+import storage
+from googleapiclient.errors import HttpError
+
+STRESS_TRIP = "stress"
+SHARED_ITEM_ID = "stress_shared"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+class _Resp(dict):
+    def __init__(self, status: int):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = "not found"
+
+
+class _Request:
+    def __init__(self, fn, file_id: Optional[str] = None, latency_s: float = 0.0):
+        self._fn = fn
+        self.file_id = file_id
+        self._latency_s = latency_s
+
+    def execute(self, http=None):
+        if self._latency_s:
+            time.sleep(self._latency_s)  # 네트워크 왕복 흉내(잠금 밖에서 기다려서 동시 호출은 겹침)
+        return self._fn()
+
+
+class MemoryDrive:
+    """drive_store가 쓰는 만큼만 흉내 낸 Drive v3 files() API. 스레드 안전. latency_s: 호출마다 지연."""
+
+    def __init__(self, latency_s: float = 0.0):
+        self._lock = threading.Lock()
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+        self.calls = 0
+        self.latency_s = latency_s
+
+    def _request(self, fn, file_id: Optional[str] = None) -> _Request:
+        return _Request(fn, file_id, self.latency_s)
+
+    def files(self) -> "MemoryDrive":
+        return self
+
+    def add_folder(self, file_id: str, parent: str = "root") -> str:
+        """시험용 루트 폴더를 id를 정해서 만듭니다."""
+        with self._lock:
+            self._files[file_id] = {
+                "id": file_id, "name": file_id, "mimeType": FOLDER_MIME, "parents": [parent], "content": b"",
+                "version": 1, "appProperties": {}, "trashed": False, "created": "", "modified": "",
+            }
+        return file_id
+
+    @staticmethod
+    def _not_found():
+        raise HttpError(_Resp(404), b"File not found")
+
+    @staticmethod
+    def _meta(f: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f["id"], "name": f["name"], "mimeType": f["mimeType"], "parents": list(f["parents"]),
+            "version": str(f["version"]), "md5Checksum": hashlib.md5(f["content"]).hexdigest(),
+            "modifiedTime": f["modified"], "createdTime": f["created"],
+            "appProperties": dict(f.get("appProperties") or {}),
+        }
+
+    def _file(self, file_id: str) -> Dict[str, Any]:
+        f = self._files.get(file_id)
+        if f is None or f["trashed"]:
+            self._not_found()
+        return f
+
+    def list(self, q: str = "", fields: str = "", pageSize: int = 100, pageToken: Optional[str] = None,
+             orderBy: Optional[str] = None, **_kw) -> _Request:
+        parent = re.search(r"'([^']+)' in parents", q)
+        name = re.search(r"name='([^']+)'", q)
+        mime = re.search(r"mimeType='([^']+)'", q)
+
+        def run():
+            with self._lock:
+                self.calls += 1
+                out = [
+                    self._meta(f) for f in self._files.values()
+                    if not f["trashed"]
+                    and (parent is None or parent.group(1) in f["parents"])
+                    and (name is None or f["name"] == name.group(1))
+                    and (mime is None or f["mimeType"] == mime.group(1))
+                ]
+            out.sort(key=lambda m: m["name"])
+            start = int(pageToken or 0)
+            page = out[start:start + pageSize]
+            res: Dict[str, Any] = {"files": page}
+            if start + pageSize < len(out):
+                res["nextPageToken"] = str(start + pageSize)
+            return res
+
+        return self._request(run)
+
+    def get(self, fileId: str, fields: str = "", **_kw) -> _Request:
+        def run():
+            with self._lock:
+                self.calls += 1
+                return self._meta(self._file(fileId))
+
+        return self._request(run)
+
+    def get_media(self, fileId: str, **_kw) -> _Request:
+        def run():
+            with self._lock:
+                self.calls += 1
+                return self._file(fileId)["content"]
+
+        return self._request(run, fileId)
+
+    def generateIds(self, count: int = 10, space: str = "drive", fields: str = "", **_kw) -> _Request:
+        def run():
+            with self._lock:
+                self.calls += 1
+                return {"ids": [f"mem{next(self._ids)}" for _ in range(count)], "space": space}
+
+        return self._request(run)
+
+    def create(self, body: Dict[str, Any], media_body=None, fields: str = "", **_kw) -> _Request:
+        def run():
+            content = media_body.getbytes(0, media_body.size()) if media_body is not None else b""
+            now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+            with self._lock:
+                self.calls += 1
+                for p in body.get("parents") or []:
+                    if p != "root" and p not in self._files:
+                        self._not_found()
+                fid = body.get("id") or f"mem{next(self._ids)}"
+                if fid in self._files:
+                    raise HttpError(_Resp(409), b"A file already exists with the provided ID")
+                self._files[fid] = {
+                    "id": fid, "name": body["name"], "mimeType": body.get("mimeType") or "application/json",
+                    "parents": list(body.get("parents") or ["root"]), "content": content, "version": 1,
+                    "appProperties": dict(body.get("appProperties") or {}), "trashed": False,
+                    "created": now, "modified": now,
+                }
+                return self._meta(self._files[fid])
+
+        return self._request(run)
+
+    def update(self, fileId: str, media_body=None, fields: str = "", body=None,
+               addParents: Optional[str] = None, removeParents: Optional[str] = None, **_kw) -> _Request:
+        def run():
+            content = media_body.getbytes(0, media_body.size()) if media_body is not None else None
+            with self._lock:
+                self.calls += 1
+                f = self._file(fileId)
+                if addParents or removeParents:
+                    f["parents"] = [p for p in f["parents"] if p != removeParents] + ([addParents] if addParents else [])
+                if content is not None:
+                    f["content"] = content
+                f.update(body or {})
+                f["version"] += 1
+                f["modified"] = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+                return self._meta(f)
+
+        return self._request(run)
+
+    def delete(self, fileId: str, **_kw) -> _Request:
+        def run():
+            with self._lock:
+                self.calls += 1
+                self._file(fileId)
+                del self._files[fileId]
+
+        return self._request(run)
+
+
+_CACHED_SINGLETONS = ("_db_cache", "_id_registry", "_image_index", "_image_cache", "_save_queue", "_file_ids")
+
+
+@contextlib.contextmanager
+def memory_drive(compact_min_age_s: float = 0.0, latency_s: float = 0.0) -> Iterator[MemoryDrive]:
+    """drive_store가 이 블록 안에서만 MemoryDrive와 임시 캐시 폴더를 쓰게 합니다."""
+    drive = MemoryDrive(latency_s)
+    saved = {name: getattr(drive_store, name) for name in (
+        "_drive_service", "_execute", "download_bytes", "_change_watcher", "write_behind_enabled",
+        "CACHE_DIR", "JOURNAL_COMPACT_MIN_AGE_S",
+    )}
+    cache_dir = tempfile.mkdtemp(prefix="trip-stress-")
+
+    def _clear():
+        for name in _CACHED_SINGLETONS:
+            try:
+                getattr(drive_store, name).clear()
+            except Exception:
+                pass
+
+    _clear()
+    drive_store._drive_service = lambda: drive
+    drive_store._execute = lambda req: req.execute()
+    drive_store.download_bytes = lambda service, file_id: service.files().get_media(fileId=file_id).execute()
+    drive_store._change_watcher = lambda: None
+    drive_store.write_behind_enabled = lambda: False  # 저널 경로(_save_db_now)를 직접 시험
+    drive_store.CACHE_DIR = cache_dir
+    drive_store.JOURNAL_COMPACT_MIN_AGE_S = compact_min_age_s
+    try:
+        yield drive
+    finally:
+        for name, value in saved.items():
+            setattr(drive_store, name, value)
+        _clear()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _stress_trip(db: Dict[str, Any]) -> Dict[str, Any]:
+    for t in db.get("trips", []) or []:
+        if t.get("name") == STRESS_TRIP:
+            return t
+    raise RuntimeError("시험용 여행이 없습니다")
+
+
+def _run_writers(load, save, writers: int, saves: int, think_s: float, shared_every: int) -> Dict[str, Any]:
+    start = threading.Barrier(writers)
+    lock = threading.Lock()
+    results: Dict[str, Any] = {"saved": 0, "merged_ops": 0, "conflicts": [], "shared_values": [], "errors": []}
+
+    def _writer(w: int) -> None:
+        rnd = random.Random(w)
+        start.wait()
+        for s in range(saves):
+            try:
+                db = load()
+                trip = _stress_trip(db)
+                time.sleep(rnd.uniform(0, think_s))  # 화면에서 고치는 동안 다른 세션이 저장할 수 있음
+                trip["items"].append({"id": f"w{w}_s{s}", "date": "2026-01-01", "time": f"{s % 24:02d}:00",
+                                      "title": f"writer {w} save {s}", "ts": int(time.time())})
+                shared_value = None
+                if shared_every and s % shared_every == 0:
+                    shared_value = f"w{w}_s{s}"
+                    for it in trip["items"]:
+                        if it.get("id") == SHARED_ITEM_ID:
+                            it["title"] = shared_value
+                res = save(db)
+            except Exception as e:
+                with lock:
+                    results["errors"].append(f"w{w}_s{s}: {e}")
+                continue
+            with lock:
+                results["saved"] += 1
+                results["merged_ops"] += res.get("merged_ops", 0)
+                results["conflicts"].extend(res.get("conflicts") or [])
+                if shared_value:
+                    results["shared_values"].append(shared_value)
+
+    threads = [threading.Thread(target=_writer, args=(w,), name=f"stress-writer-{w}") for w in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    return results
+
+
+def _seed(load, save) -> None:
+    db = load()
+    db.setdefault("trips", []).append({
+        "id": "stress_trip", "name": STRESS_TRIP,
+        "items": [{"id": SHARED_ITEM_ID, "date": "2026-01-01", "time": "00:00", "title": "shared", "ts": 0}],
+    })
+    save(db)
+    # 첫 저장은 스냅샷 -> 한 번 더 저장해서 저널 폴더까지 만든 뒤 시작(모두 저널 경로로 저장)
+    db = load()
+    _stress_trip(db)["title_note"] = "seeded"
+    save(db)
+
+
+def _check(final: Dict[str, Any], results: Dict[str, Any], writers: int, saves: int) -> Dict[str, Any]:
+    items = {it.get("id"): it for it in _stress_trip(final).get("items", []) or []}
+    expected = {f"w{w}_s{s}" for w in range(writers) for s in range(saves)}
+    lost = sorted(expected - set(items))
+    shared = (items.get(SHARED_ITEM_ID) or {}).get("title")
+    checks = {
+        "no_items_lost": not lost,
+        "no_duplicates": len(items) == len(_stress_trip(final).get("items", []) or []),
+        "shared_item_is_a_written_value": shared in results["shared_values"] or not results["shared_values"],
+        "conflicts_reported": bool(results["conflicts"]) or writers < 2 or not results["shared_values"],
+        "no_errors": not results["errors"],
+    }
+    return {
+        "ok": all(checks.values()), "checks": checks, "lost": lost[:20],
+        "saved": results["saved"], "merged_ops": results["merged_ops"],
+        "conflicts": len(results["conflicts"]), "errors": results["errors"][:10],
+        "elapsed_s": results["elapsed_s"], "items": len(items),
+    }
+
+
+def run_drive_stress(writers: int = 8, saves: int = 10, think_s: float = 0.02, shared_every: int = 3,
+                     compact_min_age_s: float = 0.0) -> Dict[str, Any]:
+    """MemoryDrive 위에서 drive_store의 저널/3-way merge/압축 경로로 동시 저장을 시험합니다."""
+    root = "stress_root"
+    with memory_drive(compact_min_age_s) as drive:
+        drive.add_folder(root)
+        load = lambda: drive_store.load_db(root)  # noqa: E731
+        save = lambda db: drive_store.save_db(root, db)  # noqa: E731
+        _seed(load, save)
+        results = _run_writers(load, save, writers, saves, think_s, shared_every)
+        for name in _CACHED_SINGLETONS:  # 캐시 없이 Drive 내용만으로 다시 읽어서 확인
+            getattr(drive_store, name).clear()
+        final = drive_store.load_db(root, trust=False)
+        journal = drive_store.read_journal(root, include_archived=False)
+        report = _check(final, results, writers, saves)
+        report.update({"backend": "drive(memory)", "journal_tail": len(journal), "drive_calls": drive.calls})
+    return report
+
+
+def run_local_stress(writers: int = 8, saves: int = 10, think_s: float = 0.02, shared_every: int = 3) -> Dict[str, Any]:
+    """임시 폴더의 LocalBackend(SQLite)로 같은 시험을 합니다. 스레드마다 자기 SQLite 연결을 씁니다."""
+    root_dir = tempfile.mkdtemp(prefix="trip-stress-local-")
+    try:
+        backend = storage.LocalBackend(root_dir)
+        root = backend.default_root_id()
+        load = lambda: backend.load_db(root)  # noqa: E731
+        save = lambda db: backend.save_db(root, db)  # noqa: E731
+        _seed(load, save)
+        results = _run_writers(load, save, writers, saves, think_s, shared_every)
+        report = _check(storage.LocalBackend(root_dir).load_db(root), results, writers, saves)
+        report["backend"] = "local"
+        return report
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
@@ -0,0 +1,174 @@
+"""
+동시 저장 병합 시험(pytest): 같은 base에서 출발한 세션들의 저장이 서로 섞여도 일정이 사라지지 않고,
+같은 필드/삭제-수정 충돌은 보고되는지 확인합니다.
+
+    python -m pytest -q tests
+"""
+import copy
+import os
+import random
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_ops  # noqa: E402
+from db_ops import TripDB  # noqa: E402
+
+TRIP_ID = "t1"
+
+
+def _base():
+    return {"trips": [{
+        "id": TRIP_ID, "name": "제주",
+        "items": [
+            {"id": "shared", "date": "2026-01-01", "time": "09:00", "title": "공항"},
+            {"id": "doomed", "date": "2026-01-01", "time": "12:00", "title": "점심"},
+        ],
+    }]}
+
+
+def _trip(db):
+    return next(t for t in db["trips"] if t["id"] == TRIP_ID)
+
+
+def _item(db, item_id):
+    return next((it for it in _trip(db)["items"] if it["id"] == item_id), None)
+
+
+class _Store:
+    """저장소 흉내: 최신 상태 + 리비전. save는 db_ops.merge_onto로 병합(LocalBackend/Drive와 같은 규칙)."""
+
+    def __init__(self, db):
+        self.db = copy.deepcopy(db)
+        self.rev = 0
+
+    def load(self):
+        out = TripDB(copy.deepcopy(self.db))
+        out.head = self.rev
+        return out
+
+    def save(self, session):
+        ops = db_ops.diff_db(session.base, session)
+        merged, theirs, conflicts = db_ops.merge_onto(session.base, self.db, ops, concurrent=session.head != self.rev)
+        self.db = merged
+        self.rev += 1
+        return ops, theirs, conflicts
+
+
+def test_different_items_both_survive():
+    store = _Store(_base())
+    a, b = store.load(), store.load()
+    _trip(a)["items"].append({"id": "a1", "date": "2026-01-02", "title": "A"})
+    _trip(b)["items"].append({"id": "b1", "date": "2026-01-02", "title": "B"})
+    store.save(a)
+    _, theirs, conflicts = store.save(b)
+    assert theirs and not conflicts
+    assert _item(store.db, "a1") and _item(store.db, "b1")
+
+
+def test_same_field_conflict_reported_last_writer_wins():
+    store = _Store(_base())
+    a, b = store.load(), store.load()
+    _item(a, "shared")["title"] = "A 공항"
+    _item(b, "shared")["title"] = "B 공항"
+    _item(b, "shared")["time"] = "10:00"
+    store.save(a)
+    _, _, conflicts = store.save(b)
+    assert conflicts == [{"trip_id": TRIP_ID, "item_id": "shared", "kind": "same_field", "fields": ["title"]}]
+    assert _item(store.db, "shared")["title"] == "B 공항"
+    assert _item(store.db, "shared")["time"] == "10:00"
+
+
+def test_different_fields_of_same_item_merge_without_conflict():
+    store = _Store(_base())
+    a, b = store.load(), store.load()
+    _item(a, "shared")["title"] = "A 공항"
+    _item(b, "shared")["time"] = "10:00"
+    store.save(a)
+    _, _, conflicts = store.save(b)
+    assert not conflicts
+    assert _item(store.db, "shared")["title"] == "A 공항" and _item(store.db, "shared")["time"] == "10:00"
+
+
+def test_delete_vs_update_conflict_reported_delete_wins():
+    store = _Store(_base())
+    a, b = store.load(), store.load()
+    _trip(a)["items"] = [it for it in _trip(a)["items"] if it["id"] != "doomed"]
+    _item(b, "doomed")["title"] = "저녁"
+    store.save(a)
+    _, _, conflicts = store.save(b)
+    assert [c["kind"] for c in conflicts] == ["delete_vs_update"]
+    assert _item(store.db, "doomed") is None
+
+
+def test_find_conflicts_trip_deleted():
+    ours = [{"op": "item_add", "trip_id": TRIP_ID, "item": {"id": "x"}}]
+    theirs = [{"op": "trip_delete", "trip_id": TRIP_ID}]
+    assert db_ops.find_conflicts(theirs, ours) == [{"trip_id": TRIP_ID, "item_id": "x", "kind": "trip_deleted"}]
+
+
+def test_random_interleavings_lose_nothing():
+    rnd = random.Random(11)
+    for _ in range(20):
+        store = _Store(_base())
+        sessions = {w: store.load() for w in range(5)}
+        added, shared_values = set(), []
+        for step in range(40):
+            w = rnd.randrange(5)
+            s = sessions[w]
+            if rnd.random() < 0.3:
+                sessions[w] = store.load()  # 새로고침
+                continue
+            item_id = f"w{w}_s{step}"
+            _trip(s)["items"].append({"id": item_id, "date": "2026-01-03", "title": item_id})
+            if rnd.random() < 0.3:
+                _item(s, "shared")["title"] = item_id
+                shared_values.append(item_id)
+            store.save(s)
+            added.add(item_id)
+            s.rebase()  # 저장한 세션은 계속 같은 화면에서 편집(저장소의 save_db와 같음)
+            s.head = store.rev
+            s.clear()
+            s.update(copy.deepcopy(store.db))
+            s.rebase()
+        ids = [it["id"] for it in _trip(store.db)["items"]]
+        assert added <= set(ids)
+        assert len(ids) == len(set(ids))
+        assert _item(store.db, "shared")["title"] in shared_values + ["공항"]
+
+
+def test_local_backend_concurrent_threads(tmp_path):
+    storage = __import__("storage")
+    backend = storage.LocalBackend(str(tmp_path))
+    root = backend.default_root_id()
+    db = backend.load_db(root)
+    db.setdefault("trips", []).append(copy.deepcopy(_base()["trips"][0]))
+    backend.save_db(root, db)
+
+    writers, saves = 6, 8
+    start = threading.Barrier(writers)
+    conflicts, errors = [], []
+
+    def _writer(w):
+        start.wait()
+        for s in range(saves):
+            try:
+                mine = backend.load_db(root)
+                _trip(mine)["items"].append({"id": f"w{w}_s{s}", "date": "2026-01-04", "title": f"{w}/{s}"})
+                _item(mine, "shared")["title"] = f"w{w}_s{s}"
+                conflicts.extend(backend.save_db(root, mine)["conflicts"])
+            except Exception as e:  # pragma: no cover - 실패 시 메시지 확인용
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=_writer, args=(w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    final = storage.LocalBackend(str(tmp_path)).load_db(root)
+    ids = {it["id"] for it in _trip(final)["items"]}
+    assert {f"w{w}_s{s}" for w in range(writers) for s in range(saves)} <= ids
+    assert any(c["kind"] == "same_field" for c in conflicts)
@@ -0,0 +1,224 @@
+"""
+여행/일정 조회용 SQLite 인덱스(메모리).
+
+페이지는 여행 이름/일정 id 찾기, 날짜별 묶기, 기간 조회를 리스트를 훑는 대신 인덱스로 합니다.
+인덱스는 db의 내용 식별자(TripDB.rev)마다 한 번만 만듭니다. 저장소의 같은 리비전을 불러온 세션들은
+프로세스 공용 인덱스를 함께 쓰고(재실행마다 다시 만들지 않음), 저장/병합으로 내용이 바뀐 db는
+그 db 객체에 붙은 인덱스를 새로 만들어요.
+
+조회 결과는 (여행 위치, 일정 위치)이고 호출한 쪽의 db에서 실제 dict를 꺼내므로,
+돌려받은 일정을 그대로 고쳐서 save_db 하면 됩니다. 저장 전에 db를 제자리에서 고쳐 위치가 어긋나면
+해당 조회만 리스트 검색으로 찾습니다.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app_runtime import process_singleton
+from db_ops import SESSION_REV_PREFIX
+
+_SCHEMA = """
+CREATE TABLE trips (
+    id TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    name TEXT
+);
+CREATE INDEX trips_name ON trips(name, pos);
+CREATE TABLE items (
+    trip_id TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    id TEXT,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    ts INTEGER NOT NULL
+);
+CREATE INDEX items_trip_date ON items(trip_id, date, time, ts);
+CREATE INDEX items_id ON items(id, trip_id);
+"""
+
+# 일정 정렬 기준(페이지의 _sort_key와 같음): 날짜, 시간, 입력 시각
+_ORDER = "ORDER BY date, time, ts, pos"
+SHARED_MAX = 8  # 프로세스 공용으로 들고 있는 저장소 리비전별 인덱스 수
+
+
+class TripIndex:
+    """db 한 버전의 인덱스. 만든 뒤에는 읽기만 하므로 여러 세션이 함께 써도 됩니다."""
+
+    def __init__(self, db: Dict[str, Any]):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.queries = 0
+        self._build(db)
+
+    def _build(self, db: Dict[str, Any]) -> None:
+        trips, items, seen = [], [], set()
+        self.item_counts: Dict[str, int] = {}
+        for pos, t in enumerate(db.get("trips", []) or []):
+            tid = t.get("id") or f"_pos{pos}"
+            if tid in seen:  # 같은 id가 두 번 있으면 뒤쪽은 위치로 구분
+                tid = f"{tid}_pos{pos}"
+            seen.add(tid)
+            trips.append((tid, pos, t.get("name")))
+            self.item_counts[tid] = len(t.get("items", []) or [])
+            items.extend(
+                (tid, i, it.get("id"), it.get("date") or "", it.get("time") or "", int(it.get("ts") or 0))
+                for i, it in enumerate(t.get("items", []) or [])
+            )
+        conn = self._conn
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO trips (id, pos, name) VALUES (?, ?, ?)", trips)
+        conn.executemany("INSERT INTO items (trip_id, pos, id, date, time, ts) VALUES (?, ?, ?, ?, ?, ?)", items)
+        conn.execute("COMMIT")
+        self.size = (len(trips), len(items))
+
+    def _query(self, sql: str, args: tuple = ()) -> List[tuple]:
+        with self._lock:
+            self.queries += 1
+            return self._conn.execute(sql, args).fetchall()
+
+    def trip_ref(self, trip_name: str) -> Optional[Tuple[str, int]]:
+        rows = self._query("SELECT id, pos FROM trips WHERE name=? ORDER BY pos LIMIT 1", (trip_name,))
+        return rows[0] if rows else None
+
+    def item_pos(self, trip_id: str, item_id: str) -> Optional[int]:
+        rows = self._query("SELECT pos FROM items WHERE id=? AND trip_id=? LIMIT 1", (item_id, trip_id))
+        return rows[0][0] if rows else None
+
+    def item_positions(self, trip_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[tuple]:
+        """[(date, 일정 위치, 일정 id), ...] 날짜/시간순. date_from/date_to는 'YYYY-MM-DD'(포함)."""
+        sql, args = "SELECT date, pos, id FROM items WHERE trip_id=?", [trip_id]
+        if date_from:
+            sql += " AND date>=?"
+            args.append(date_from)
+        if date_to:
+            sql += " AND date<=?"
+            args.append(date_to)
+        return self._query(f"{sql} {_ORDER}", tuple(args))
+
+
+
+class _SharedIndexes:
+    """저장소 리비전(rev) -> TripIndex. 최근 SHARED_MAX개만 보관."""
+
+    def __init__(self, max_entries: int = SHARED_MAX):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, TripIndex]" = OrderedDict()
+        self.stats = {"hits": 0, "builds": 0, "session_builds": 0}
+
+    def get(self, rev: str, db: Dict[str, Any]) -> TripIndex:
+        with self._lock:
+            idx = self._entries.get(rev)
+            if idx is not None:
+                self._entries.move_to_end(rev)
+                self.stats["hits"] += 1
+                return idx
+        idx = TripIndex(db)  # 잠금 밖에서 만듦(같은 rev를 동시에 만들면 먼저 넣은 쪽을 씀)
+        with self._lock:
+            self.stats["builds"] += 1
+            idx = self._entries.setdefault(rev, idx)
+            self._entries.move_to_end(rev)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return idx
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "shared": len(self._entries),
+                    "queries": sum(idx.queries for idx in self._entries.values())}
+
+
+def _new_shared() -> _SharedIndexes:
+    return _SharedIndexes()
+
+
+_shared = process_singleton(_new_shared)
+
+
+class TripView:
+    """인덱스 + 그 db. 같은 재실행 안에서 여러 번 조회할 때 씁니다."""
+
+    def __init__(self, db: Dict[str, Any], index: TripIndex):
+        self.db = db
+        self.index = index
+
+    def _trip_at(self, ref: Optional[Tuple[str, int]], trip_name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        trips = self.db.get("trips", []) or []
+        if ref is not None and ref[1] < len(trips) and trips[ref[1]].get("name") == trip_name:
+            return ref[0], trips[ref[1]]
+        # 인덱스를 만든 뒤 db가 제자리에서 바뀜 -> 리스트에서 직접 찾음
+        for t in trips:
+            if t.get("name") == trip_name:
+                return (ref[0] if ref else None), t
+        return None, None
+
+    def get_trip(self, trip_name: str) -> Optional[Dict[str, Any]]:
+        return self._trip_at(self.index.trip_ref(trip_name), trip_name)[1]
+
+    def find_item(self, trip_name: str, item_id: str) -> tuple:
+        """(trip, item). 여행이 없으면 (None, None), 일정이 없으면 (trip, None)."""
+        tid, trip = self._trip_at(self.index.trip_ref(trip_name), trip_name)
+        if trip is None:
+            return None, None
+        items = trip.get("items", []) or []
+        pos = self.index.item_pos(tid, item_id) if tid else None
+        if pos is not None and pos < len(items) and items[pos].get("id") == item_id:
+            return trip, items[pos]
+        return trip, next((it for it in items if it.get("id") == item_id), None)
+
+    def items_by_day(self, trip_name: str, date_from: Optional[str] = None,
+                     date_to: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """{날짜: [일정, ...]} 날짜순, 하루 안은 시간순. 날짜 없는 일정은 '미정'."""
+        tid, trip = self._trip_at(self.index.trip_ref(trip_name), trip_name)
+        if trip is None or tid is None:
+            return {}
+        items = trip.get("items", []) or []
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        if len(items) == self.index.item_counts.get(tid):
+            for d, pos, item_id in self.index.item_positions(tid, date_from, date_to):
+                if pos >= len(items) or items[pos].get("id") != item_id:
+                    break
+                out.setdefault(d or "미정", []).append(items[pos])
+            else:
+                return out
+        # 인덱스를 만든 뒤 일정이 제자리에서 추가/삭제됨 -> 리스트를 직접 정렬
+        return _group_by_day(items, date_from, date_to)
+
+
+def _group_by_day(items: List[Dict[str, Any]], date_from: Optional[str],
+                  date_to: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    picked = [
+        (it.get("date") or "", it.get("time") or "", int(it.get("ts") or 0), pos, it)
+        for pos, it in enumerate(items)
+        if not (date_from and (it.get("date") or "") < date_from) and not (date_to and (it.get("date") or "") > date_to)
+    ]
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for d, _t, _ts, _pos, it in sorted(picked, key=lambda r: r[:4]):
+        out.setdefault(d or "미정", []).append(it)
+    return out
+
+
+def view(db: Dict[str, Any]) -> TripView:
+    """
+    db의 조회용 뷰. 인덱스는 db.rev마다 한 번만 만듭니다: 저장소 리비전 그대로면 공용 인덱스,
+    저장/병합으로 세션에서만 바뀐 내용이면 db 객체에 붙여 둔 인덱스. rev가 없는 dict는 매번 만들어요.
+    """
+    rev = getattr(db, "rev", None)
+    if rev is None:
+        return TripView(db, TripIndex(db))
+    if not rev.startswith(SESSION_REV_PREFIX):
+        return TripView(db, _shared().get(rev, db))
+    cached = getattr(db, "_trip_index", None)
+    if cached is None or cached[0] != rev:
+        cached = (rev, TripIndex(db))
+        db._trip_index = cached
+        shared = _shared()
+        with shared._lock:
+            shared.stats["session_builds"] += 1
+    return TripView(db, cached[1])
+
+
+def trip_index_stats() -> Dict[str, Any]:
+    return _shared().status()
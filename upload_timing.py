@@ -0,0 +1,62 @@
+"""
+사진 업로드 시간 비교: 같은 사진 묶음을 하나씩(max_workers=1) 올릴 때와 동시에(IMAGE_MAX_WORKERS) 올릴 때.
+
+    python maintenance.py upload-timing --images 8 --latency-ms 150
+
+- 실제 Drive 대신 호출마다 latency_ms만큼 기다리는 MemoryDrive(stress_saves)를 씁니다.
+  정규화/썸네일 만들기(CPU)는 실제 코드 그대로라 두 측정에 똑같이 들어가요.
+- 측정마다 새 MemoryDrive와 임시 캐시를 써서, 두 번째 측정이 중복 제거(sha256)로 건너뛰지 않게 합니다.
+"""
+import io
+import random
+from typing import Any, Dict, List
+
+from PIL import Image
+
+import drive_store
+import stress_saves
+
+
+def _sample_images(count: int, size: tuple = (1400, 1050), seed: int = 7) -> List[tuple]:
+    """서로 다른 JPEG 사진 count장: [(filename, bytes, mime), ...]"""
+    rnd = random.Random(seed)
+    files = []
+    for i in range(count):
+        # 사진처럼 부드러운 그라데이션 + 색 블록(잡음 이미지는 인코딩이 비정상적으로 느림)
+        img = Image.merge("RGB", [Image.linear_gradient("L").resize(size).rotate(rnd.randrange(360)) for _ in range(3)])
+        for _ in range(12):
+            x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+            img.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (x, y, x + 120, y + 90))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=90)
+        files.append((f"timing_{i}.jpg", buf.getvalue(), "image/jpeg"))
+    return files
+
+
+def _timed_upload(files: List[tuple], workers: int, latency_s: float) -> Dict[str, Any]:
+    with stress_saves.memory_drive(latency_s=latency_s) as drive:
+        folder = drive.add_folder("timing_images")
+        result = drive_store.upload_images_bytes(drive, folder, files, max_workers=workers)
+        return {
+            "workers": workers,
+            "elapsed_s": round(result["elapsed_s"], 3),
+            "uploaded": sum(1 for fid in result["ids"] if fid),
+            "failed": len(result["failed"]),
+            "drive_calls": drive.calls,
+        }
+
+
+def run_upload_timing(images: int = 8, latency_ms: float = 150,
+                      workers: int = drive_store.IMAGE_MAX_WORKERS) -> Dict[str, Any]:
+    files = _sample_images(images)
+    latency_s = latency_ms / 1000
+    serial = _timed_upload(files, 1, latency_s)
+    parallel = _timed_upload(files, workers, latency_s)
+    return {
+        "ok": not serial["failed"] and not parallel["failed"] and serial["uploaded"] == parallel["uploaded"] == images,
+        "images": images,
+        "latency_ms": latency_ms,
+        "serial": serial,
+        "parallel": parallel,
+        "speedup": round(serial["elapsed_s"] / parallel["elapsed_s"], 2) if parallel["elapsed_s"] else None,
+    }
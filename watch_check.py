@@ -0,0 +1,141 @@
+"""
+변경 감시 오프라인 시험: 가짜 변경(FakeChangeFeed)을 넣고, 새로고침돼야 할 세션만 새로고침되는지 확인합니다.
+
+    python maintenance.py check-watcher
+
+- 세션은 storage와 같은 규칙으로 흉내 냅니다: 불러올 때 감시의 세대 번호를 기억하고(+ db가 반영한 번호),
+  저장하면 자기 저장분까지 본 것으로 기록하고, 감시 번호가 더 크면 새로고침(storage._needs_refresh).
+- local: LocalBackend(임시 폴더)의 리비전 변경 피드와 _on_changes.
+- drive: MemoryDrive 위에서 drive_store._apply_changes(관련 파일/폴더만 DB 변경으로 침).
+- 감시 스레드는 띄우지 않고 poll_once()를 직접 불러서 순서가 항상 같게 합니다.
+"""
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+import drive_store
+import storage
+import stress_saves
+from change_feed import ChangeWatcher, FakeChangeFeed
+
+
+class _Session:
+    """브라우저 세션 하나의 '본 세대 번호'(st.session_state["_seen_change_generation"] 대신)."""
+
+    def __init__(self, name: str, generation: Callable[[], Optional[int]],
+                 generation_of: Callable[[Dict[str, Any]], Optional[int]]):
+        self.name = name
+        self._generation = generation
+        self._generation_of = generation_of
+        self.seen: Optional[int] = None
+
+    def loaded(self, db: Dict[str, Any], gen_before: Optional[int]) -> Dict[str, Any]:
+        self.seen = storage._seen_with(gen_before, self._generation_of(db))
+        return db
+
+    def saved(self, db: Dict[str, Any]) -> None:
+        self.seen = storage._seen_with(self.seen, self._generation_of(db))
+
+    def nudged(self) -> bool:
+        return storage._needs_refresh(self._generation(), self.seen)
+
+
+class _Checker:
+    def __init__(self, sessions: List[_Session]):
+        self.sessions = sessions
+        self.steps: List[Dict[str, Any]] = []
+
+    def expect(self, step: str, nudged: List[str]) -> None:
+        got = sorted(s.name for s in self.sessions if s.nudged())
+        self.steps.append({"step": step, "expected": sorted(nudged), "nudged": got, "ok": got == sorted(nudged)})
+
+    def report(self, backend: str, watcher: ChangeWatcher) -> Dict[str, Any]:
+        return {"backend": backend, "ok": all(s["ok"] for s in self.steps), "steps": self.steps,
+                "watcher": watcher.stats}
+
+
+def check_local() -> Dict[str, Any]:
+    """LocalBackend: 저장한 세션은 그대로, 다른 세션만 새로고침. 관계없는/지난 변경은 무시."""
+    root_dir = tempfile.mkdtemp(prefix="trip-watch-local-")
+    try:
+        backend = storage.LocalBackend(root_dir)
+        watcher = ChangeWatcher(backend.changes, backend._on_changes)
+        backend._watcher = watcher  # 스레드 없이 poll_once로만 확인
+        root = backend.default_root_id()
+        sessions = {n: _Session(n, backend.change_generation, backend.generation_of) for n in "abc"}
+        chk = _Checker(list(sessions.values()))
+
+        def load(s: _Session) -> Dict[str, Any]:
+            return s.loaded(backend.load_db(root), backend.change_generation())
+
+        dbs = {n: load(s) for n, s in sessions.items()}
+        watcher.poll_once()
+        chk.expect("모두 같은 리비전을 불러옴", [])
+
+        dbs["a"].setdefault("trips", []).append({"id": "watch_trip", "name": "watch", "items": []})
+        backend.save_db(root, dbs["a"])
+        sessions["a"].saved(dbs["a"])
+        chk.expect("a 저장, 감시가 아직 못 봄", [])
+        watcher.poll_once()
+        chk.expect("a 저장을 감시가 봄", ["b", "c"])
+
+        dbs["b"] = load(sessions["b"])
+        chk.expect("b 새로고침", ["c"])
+
+        backend.changes.push("other", name="not-a-revision")
+        backend.changes.push("trips", name="1")  # 이미 지난 리비전이 늦게 도착
+        watcher.poll_once()
+        chk.expect("관계없는/지난 변경", ["c"])
+
+        dbs["c"] = load(sessions["c"])
+        chk.expect("c 새로고침", [])
+        return chk.report("local", watcher)
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+def check_drive() -> Dict[str, Any]:
+    """MemoryDrive: DB 파일/폴더 변경만 세대 번호를 올리고, 사진/다른 폴더 변경은 무시."""
+    root = "watch_root"
+    with stress_saves.memory_drive() as drive:
+        drive.add_folder(root)
+        feed = FakeChangeFeed()
+        watcher = ChangeWatcher(feed, drive_store._apply_changes)
+        generation = lambda: watcher.generation  # noqa: E731  (drive_store.change_generation과 같은 값)
+        generation_of = storage.StorageBackend().generation_of  # Drive는 db에 세대 번호가 없음
+        sessions = {n: _Session(n, generation, generation_of) for n in "ab"}
+        chk = _Checker(list(sessions.values()))
+
+        db = drive_store.load_db(root)
+        db.setdefault("trips", []).append({"id": "watch_trip", "name": "watch", "items": []})
+        drive_store.save_db(root, db)
+        images = drive_store.ensure_subfolder(drive, root, drive_store.IMAGES_FOLDER_NAME)
+        known = drive_store._id_registry().known_ids()
+        index_id = next(fid for fid, use in known.items() if use == f"file:{drive_store.INDEX_FILENAME}")
+
+        for s in sessions.values():
+            s.loaded(drive_store.load_db(root), generation())
+        watcher.poll_once()
+        chk.expect("시작", [])
+
+        feed.push("elsewhere_file", parents=["elsewhere_folder"], name="x.json")
+        feed.push("unknown_removed", removed=True)
+        watcher.poll_once()
+        chk.expect("다른 폴더 파일 / 모르는 파일 삭제", [])
+
+        feed.push("photo_1", parents=[images], name="photo.jpg")
+        watcher.poll_once()
+        chk.expect("사진 폴더에 사진 추가", [])
+
+        feed.push(index_id, parents=[root], name=drive_store.INDEX_FILENAME)
+        watcher.poll_once()
+        chk.expect("다른 기기가 색인 저장", ["a", "b"])
+
+        sessions["a"].loaded(drive_store.load_db(root), generation())
+        chk.expect("a 새로고침", ["b"])
+        return chk.report("drive(memory)", watcher)
+
+
+def run_watch_check() -> Dict[str, Any]:
+    results = [check_local(), check_drive()]
+    return {"ok": all(r["ok"] for r in results), "results": results}